@@ -0,0 +1,90 @@
+"""
+Measures how long interactive handlers take while bulk jobs keep the process
+busy, with bulk jobs yielding to them and without. The handlers and the steps
+of the bulk jobs are CPU bound, like rendering reports and building requests.
+
+    python -m benchmarks.priority_scheduling --requests 300 --bulk-jobs 2
+"""
+
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+
+from lessons_reporter_bot.scheduler import PriorityScheduler
+
+
+def burn(seconds: float) -> None:
+    deadline = time.thread_time() + seconds
+    while time.thread_time() < deadline:
+        pass
+
+
+def bulk_job(stop_event: threading.Event, step_seconds: float) -> Iterator[None]:
+    while not stop_event.is_set():
+        burn(step_seconds)
+        yield
+
+
+def measure(
+    max_yield_seconds: float,
+    requests: int,
+    bulk_jobs: int,
+    handler_seconds: float,
+    step_seconds: float,
+    interval_seconds: float,
+) -> list[float]:
+    scheduler = PriorityScheduler(
+        bulk_workers=bulk_jobs, max_yield_seconds=max_yield_seconds
+    )
+    stop_event = threading.Event()
+    for index in range(bulk_jobs):
+        scheduler.submit_bulk(bulk_job(stop_event, step_seconds), name=f'bulk-{index}')
+
+    def handle(received_at: float) -> None:
+        burn(handler_seconds)
+        latencies.append(time.perf_counter() - received_at)
+
+    latencies = []
+    with ThreadPoolExecutor(max_workers=4) as interactive_executor:
+        for _ in range(requests):
+            # Counted from arrival, as the bot does when it dispatches an update
+            interactive_executor.submit(
+                scheduler.interactive_task(handle), time.perf_counter()
+            )
+            time.sleep(interval_seconds)
+
+    stop_event.set()
+    scheduler.shutdown()
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--bulk-jobs', type=int, default=2)
+    parser.add_argument('--handler-ms', type=float, default=2)
+    parser.add_argument('--step-ms', type=float, default=2)
+    parser.add_argument('--interval-ms', type=float, default=20)
+    args = parser.parse_args()
+
+    for label, max_yield_seconds in (('without yielding', 0), ('with yielding', 1)):
+        latencies = measure(
+            max_yield_seconds,
+            requests=args.requests,
+            bulk_jobs=args.bulk_jobs,
+            handler_seconds=args.handler_ms / 1000,
+            step_seconds=args.step_ms / 1000,
+            interval_seconds=args.interval_ms / 1000,
+        )
+        percentiles = statistics.quantiles(latencies, n=100)
+        print(
+            f'{label:>16}: p50 {percentiles[49] * 1000:6.2f} ms,'
+            f' p99 {percentiles[98] * 1000:6.2f} ms'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Renders the progress charts of every student, as the monthly digest does,
+with one chart worker and with one per core, then once more with nothing
+changed, when every chart comes from the cache.
+
+    python -m benchmarks.progress_charts --students 200 --reports-per-student 60
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlmodel import Session, SQLModel, create_engine
+
+from lessons_reporter_bot.chart_storage import ChartStorage
+from lessons_reporter_bot.charts import ProgressCharts
+from lessons_reporter_bot.models import Report, Student, Topic
+from lessons_reporter_bot.report_storage import ReportStorage
+
+
+def fill_database(engine, students: int, reports_per_student: int) -> list[int]:
+    random.seed(0)
+    with Session(engine) as session:
+        topic = Topic(topic='Topic')
+        session.add(topic)
+        session.flush()
+        student_ids = []
+        for index in range(students):
+            student = Student(name=f'Student {index}', parent_id=index)
+            session.add(student)
+            session.flush()
+            student_ids.append(student.student_id)
+            for count in range(reports_per_student):
+                session.add(
+                    Report(
+                        lesson_date=date.today() - timedelta(days=count * 6),
+                        lesson_count=count,
+                        topic_id=topic.topic_id,
+                        student_id=student.student_id,
+                        homework_status=random.randint(0, 2),
+                        is_proactive=random.random() < 0.5,
+                        is_paid=True,
+                        is_sent=True,
+                    )
+                )
+        session.commit()
+    return student_ids
+
+
+def measure(
+    database_url: str, directory: str, student_ids: list[int], workers: int
+) -> tuple[float, float]:
+    engine = create_engine(database_url)
+    progress_charts = ProgressCharts(
+        report_storage=ReportStorage(engine),
+        chart_storage=ChartStorage(engine),
+        directory=directory,
+        workers=workers,
+    )
+    try:
+        # Worker processes are started before the clock does
+        progress_charts._get_executor().submit(int).result()
+        started_at = time.perf_counter()
+        progress_charts.prepare_charts(student_ids)
+        rendered_seconds = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        progress_charts.prepare_charts(student_ids)
+        cached_seconds = time.perf_counter() - started_at
+    finally:
+        progress_charts.shutdown()
+    return rendered_seconds, cached_seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--reports-per-student', type=int, default=60)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for label, workers in (('1 worker', 1), ('per core', os.cpu_count())):
+            database_url = f'sqlite:///{directory}/{workers}.sqlite3'
+            engine = create_engine(database_url)
+            SQLModel.metadata.create_all(engine)
+            student_ids = fill_database(engine, args.students, args.reports_per_student)
+            rendered_seconds, cached_seconds = measure(
+                database_url,
+                os.path.join(directory, f'charts-{workers}'),
+                student_ids,
+                workers,
+            )
+            print(
+                f'{label:>8} ({workers}): rendered {rendered_seconds:.2f}s,'
+                f' unchanged {cached_seconds:.2f}s'
+                f' for {len(student_ids)} students'
+            )
+
+
+if __name__ == '__main__':
+    main()
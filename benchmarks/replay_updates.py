@@ -0,0 +1,155 @@
+"""
+Replays updates recorded with UPDATE_LOG_DIR through the bot's handlers,
+against a stubbed Telegram and a copy of a SQLite database, and reports how
+long each kind of update took. Run it before and after a BotService change to
+compare them on real traffic. Updates are fed as fast as they are handled, or
+with their original spacing divided by --speed.
+
+    python -m benchmarks.replay_updates updates-main-20250101-100000.jsonl.gz \
+        --database bot.sqlite3 --timing original --speed 4
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+
+from sqlmodel import delete
+from telebot.types import Update
+
+from lessons_reporter_bot import main as bot_main
+from lessons_reporter_bot.models import ProcessedCallback
+from lessons_reporter_bot.recorder import read_update_log
+from lessons_reporter_bot.settings import Settings
+from lessons_reporter_bot.telegram_transport import (
+    StubTelegramTransport,
+    install_transport,
+)
+
+WELCOME_COMMANDS = ('/start', '/help')
+
+
+def copy_database(path: str, directory: str) -> str:
+    copy_path = os.path.join(directory, 'replay.sqlite3')
+    source = sqlite3.connect(path)
+    copy = sqlite3.connect(copy_path)
+    try:
+        source.backup(copy)
+    finally:
+        copy.close()
+        source.close()
+    return f'sqlite:///{copy_path}'
+
+
+def get_update_kind(update: Update) -> str:
+    if update.callback_query:
+        try:
+            return 'callback ' + json.loads(update.callback_query.data)['type']
+        except (TypeError, ValueError, KeyError):
+            return 'callback'
+    if update.message and update.message.text:
+        if update.message.text.split()[0] in WELCOME_COMMANDS:
+            return 'welcome'
+        return 'text input'
+    return 'other'
+
+
+# Goes through the same handlers as polling, minus /backup and anything the
+# bot doesn't handle
+def dispatch(update: Update, kind: str) -> bool:
+    if kind.startswith('callback'):
+        bot_main.catchall_callback_handler(update.callback_query)
+    elif kind == 'welcome':
+        bot_main.welcome(update.message)
+    elif kind == 'text input' and not update.message.text.startswith('/'):
+        bot_main.text_input_handler(update.message)
+    else:
+        return False
+    return True
+
+
+def replay(log_path: str, timing: str, speed: float) -> dict[str, list[float]]:
+    records = list(read_update_log(log_path))
+    durations: dict[str, list[float]] = defaultdict(list)
+    if not records:
+        return durations
+
+    started_at = time.perf_counter()
+    first_received_at = records[0][0]
+    for received_at, raw_update in records:
+        due_at = time.perf_counter()
+        if timing == 'original':
+            due_at = started_at + (received_at - first_received_at) / speed
+            if (delay := due_at - time.perf_counter()) > 0:
+                time.sleep(delay)
+
+        update = Update.de_json(raw_update)
+        kind = get_update_kind(update)
+        try:
+            if not dispatch(update, kind):
+                continue
+        except Exception as e:
+            print(f'Update {update.update_id} failed: {e!r}')
+            kind += ' (failed)'
+        # With the original timing this includes waiting behind earlier updates
+        durations[kind].append(time.perf_counter() - due_at)
+
+    # Mass sends started by the replayed presses run in the background
+    bot_main.app.scheduler.shutdown()
+    return durations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('log')
+    parser.add_argument('--database', required=True)
+    parser.add_argument('--timing', choices=('full', 'original'), default='full')
+    parser.add_argument('--speed', type=float, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = bot_main.app
+        # Teachers come from the copied database, the token is never used
+        app.settings = Settings(
+            bot_token='0:replay',
+            superusers=[],
+            database_url=copy_database(args.database, directory),
+            shared_state_dir=None,
+            spool_dir=os.path.join(directory, 'spool'),
+            update_log_dir=None,
+        )
+        stub = StubTelegramTransport()
+        app.telegram_transport = stub
+        install_transport(stub, connect_timeout=1, read_timeout=1)
+        app.prepare_database()
+        # The recorded presses were already claimed in the original database
+        with app.unit_of_work() as session:
+            session.exec(delete(ProcessedCallback))
+
+        started_at = time.perf_counter()
+        durations = replay(args.log, args.timing, args.speed)
+        elapsed = time.perf_counter() - started_at
+
+    for kind, kind_durations in sorted(durations.items()):
+        kind_durations.sort()
+        p99 = kind_durations[
+            min(len(kind_durations) - 1, len(kind_durations) * 99 // 100)
+        ]
+        print(
+            f'{kind:>32}: {len(kind_durations):6} updates,'
+            f' p50 {statistics.median(kind_durations) * 1000:8.2f} ms,'
+            f' p99 {p99 * 1000:8.2f} ms'
+        )
+    total = sum(len(kind_durations) for kind_durations in durations.values())
+    print(
+        f'{total} updates in {elapsed:.2f}s ({total / max(elapsed, 1e-9):.1f}/s),'
+        f' {stub.count()} Telegram API calls'
+    )
+
+
+if __name__ == '__main__':
+    main()
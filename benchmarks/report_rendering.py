@@ -0,0 +1,101 @@
+"""
+Compares the previous per-report formatting, which looked up the topic and
+the student for every report, with batch rendering of pre-joined rows.
+
+    python -m benchmarks.report_rendering --reports 2000
+"""
+
+import argparse
+import time
+from datetime import date
+
+from sqlmodel import Session, SQLModel, create_engine
+
+from lessons_reporter_bot.models import Report, Student, Topic
+from lessons_reporter_bot.rendering import (
+    FORMATTED_HOMEWORK_STATUS_MAP,
+    render_reports,
+)
+from lessons_reporter_bot.report_storage import ReportStorage
+from lessons_reporter_bot.student_storage import StudentStorage
+from lessons_reporter_bot.topic_storage import TopicStorage
+
+
+def legacy_format_report_text(
+    report: Report, topic_storage: TopicStorage, student_storage: StudentStorage
+) -> str:
+    topic = topic_storage.get_topic_by_id(report.topic_id)
+    student = student_storage.get_student_by_id(report.student_id)
+    text = '\n'.join(
+        (
+            f'ФИО: {student.name}',
+            f'Занятие № {report.lesson_count} от {report.lesson_date.strftime("%d-%m-%Y")}',
+            f'Тема: {topic.topic}',
+            f'Д/З: {FORMATTED_HOMEWORK_STATUS_MAP[report.homework_status]}',
+            f'Активность на занятии {"высокая" if report.is_proactive else "слабая"}',
+            f'Занятие {"оплачено" if report.is_paid else "не оплачено"}',
+        )
+    )
+    if report.comment is not None:
+        text += f'\nКомментарий:\n{report.comment}'
+    return text
+
+
+def populate(engine, reports: int) -> None:
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        for index in range(50):
+            session.add(Student(name=f'Student_{index}', parent_id=index))
+            session.add(Topic(topic=f'Topic *{index}*'))
+        for index in range(reports):
+            session.add(
+                Report(
+                    lesson_date=date.today(),
+                    lesson_count=index,
+                    topic_id=index % 50 + 1,
+                    student_id=index % 50 + 1,
+                    homework_status=index % 3,
+                    is_proactive=bool(index % 2),
+                    is_paid=False,
+                    is_sent=False,
+                    comment='[draft] comment',
+                )
+            )
+        session.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--reports', type=int, default=2000)
+    args = parser.parse_args()
+
+    engine = create_engine('sqlite://')
+    populate(engine, args.reports)
+    topic_storage = TopicStorage(engine=engine)
+    student_storage = StudentStorage(engine=engine)
+    report_storage = ReportStorage(engine=engine)
+
+    started_at = time.perf_counter()
+    legacy_texts = [
+        legacy_format_report_text(report, topic_storage, student_storage)
+        for report in report_storage.get_saved_reports()
+    ]
+    legacy_elapsed = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    rows = report_storage.list_saved_report_rows()
+    rendered_texts = render_reports(rows)
+    batch_elapsed = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    render_reports(rows)
+    render_only_elapsed = time.perf_counter() - started_at
+
+    assert len(legacy_texts) == len(rendered_texts)
+    print(f'legacy per-report lookups: {legacy_elapsed * 1000:9.1f} ms')
+    print(f'joined rows + batch render: {batch_elapsed * 1000:9.1f} ms')
+    print(f'batch render only:          {render_only_elapsed * 1000:9.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
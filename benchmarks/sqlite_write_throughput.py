@@ -0,0 +1,115 @@
+"""
+Compares report write throughput of the default engine against the engine
+built by `create_database_engine` while a reader keeps listing reports.
+
+    python -m benchmarks.sqlite_write_throughput --writes 2000 --writers 4
+"""
+
+import argparse
+import tempfile
+import threading
+import time
+from datetime import date
+from pathlib import Path
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from lessons_reporter_bot.database import create_database_engine
+from lessons_reporter_bot.models import Report
+from lessons_reporter_bot.settings import Settings
+
+
+def make_report(index: int) -> Report:
+    return Report(
+        lesson_date=date.today(),
+        lesson_count=index,
+        topic_id=1,
+        student_id=index % 50,
+        homework_status=index % 3,
+        is_proactive=bool(index % 2),
+        is_paid=False,
+        is_sent=False,
+        comment='benchmark',
+    )
+
+
+def run(engine, writes: int, writers: int) -> dict[str, float]:
+    SQLModel.metadata.create_all(engine)
+    stop_reading = threading.Event()
+    failed_writes = 0
+    reads = 0
+    lock = threading.Lock()
+
+    def writer(offset: int) -> None:
+        nonlocal failed_writes
+        for index in range(offset, writes, writers):
+            try:
+                with Session(engine) as session:
+                    session.add(make_report(index))
+                    session.commit()
+            except OperationalError:
+                with lock:
+                    failed_writes += 1
+
+    def reader() -> None:
+        nonlocal reads
+        while not stop_reading.is_set():
+            with Session(engine) as session:
+                session.exec(select(Report).limit(100)).all()
+            reads += 1
+
+    reader_thread = threading.Thread(target=reader)
+    writer_threads = [
+        threading.Thread(target=writer, args=(offset,)) for offset in range(writers)
+    ]
+
+    reader_thread.start()
+    started_at = time.perf_counter()
+    for thread in writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    elapsed = time.perf_counter() - started_at
+    stop_reading.set()
+    reader_thread.join()
+    engine.dispose()
+
+    return {
+        'writes_per_second': (writes - failed_writes) / elapsed,
+        'failed_writes': failed_writes,
+        'reads': reads,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--writes', type=int, default=2000)
+    parser.add_argument('--writers', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        default_url = f'sqlite:///{Path(directory) / "default.db"}'
+        tuned_url = f'sqlite:///{Path(directory) / "tuned.db"}'
+        settings = Settings(
+            bot_token='benchmark',
+            superusers=[],
+            database_url=tuned_url,
+            _env_file=None,
+        )
+
+        results = {
+            'default': run(create_engine(default_url), args.writes, args.writers),
+            'tuned': run(create_database_engine(settings), args.writes, args.writers),
+        }
+
+    for name, result in results.items():
+        print(
+            f'{name:>8}: {result["writes_per_second"]:8.1f} writes/s,'
+            f' {result["failed_writes"]} failed writes,'
+            f' {result["reads"]} concurrent reads'
+        )
+
+
+if __name__ == '__main__':
+    main()
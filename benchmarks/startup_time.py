@@ -0,0 +1,72 @@
+"""
+Measures the cold import time of the bot entry point with `python -X importtime`
+and, optionally, appends the result to a CSV file to track it over time.
+
+    python -m benchmarks.startup_time --top 15 --history benchmarks/startup_history.csv
+"""
+
+import argparse
+import csv
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+ENTRY_POINT_MODULE = 'lessons_reporter_bot.main'
+
+
+def measure_import_times(module: str) -> dict[str, int]:
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative_times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_time, name = line.removeprefix('import time:').split('|')
+        cumulative_times[name.strip()] = int(cumulative_time)
+    return cumulative_times
+
+
+def get_git_revision() -> str:
+    completed = subprocess.run(
+        ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True
+    )
+    return completed.stdout.strip() or 'unknown'
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--history', type=Path)
+    args = parser.parse_args()
+
+    runs = [measure_import_times(ENTRY_POINT_MODULE) for _ in range(args.runs)]
+    total_us = min(run[ENTRY_POINT_MODULE] for run in runs)
+    slowest = sorted(runs[-1].items(), key=lambda item: item[1], reverse=True)
+
+    print(f'{ENTRY_POINT_MODULE}: {total_us / 1000:.1f} ms (best of {args.runs})')
+    for name, cumulative_us in slowest[: args.top]:
+        print(f'{cumulative_us / 1000:9.1f} ms  {name}')
+
+    if args.history:
+        is_new_file = not args.history.exists()
+        with args.history.open('a', newline='') as history_file:
+            writer = csv.writer(history_file)
+            if is_new_file:
+                writer.writerow(['measured_at', 'revision', 'import_time_us'])
+            writer.writerow(
+                [
+                    datetime.now().isoformat(timespec='seconds'),
+                    get_git_revision(),
+                    total_us,
+                ]
+            )
+
+
+if __name__ == '__main__':
+    main()
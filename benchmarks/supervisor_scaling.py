@@ -0,0 +1,86 @@
+"""
+Measures how update throughput scales with the number of worker processes
+when updates are routed by chat id, using the CPU-bound part of handling a
+callback: payload validation and keyboard serialisation.
+
+    python -m benchmarks.supervisor_scaling --updates 20000 --workers 1 2 4
+"""
+
+import argparse
+import time
+from multiprocessing.queues import Queue
+
+from lessons_reporter_bot.callback_data import (
+    ShowItemsListCallbackData,
+    ShowOneItemCallbackData,
+    any_callback_data_validator,
+)
+from lessons_reporter_bot.models import BotServiceMessage, BotServiceMessageButton
+from lessons_reporter_bot.supervisor import WorkerPool
+
+
+def handle_update(update: dict) -> None:
+    data = any_callback_data_validator.validate_json(update['callback_query']['data'])
+    message = BotServiceMessage(
+        text='Выберите студента:',
+        buttons=[
+            BotServiceMessageButton(
+                title=f'Student {index}',
+                callback_data=ShowOneItemCallbackData(
+                    i_t='S', i_f=None, page=data.page, i_id=index
+                ),
+            )
+            for index in range(12)
+        ],
+    )
+    for button in message.buttons:
+        button.callback_data.model_dump_json()
+
+
+def run_benchmark_worker(queue: Queue, index: int) -> None:
+    while (update := queue.get()) is not None:
+        handle_update(update)
+
+
+def make_update(update_id: int, chats: int) -> dict:
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'from': {'id': update_id % chats},
+            'data': ShowItemsListCallbackData(
+                i_t='S', i_f=None, page=1
+            ).model_dump_json(),
+        },
+    }
+
+
+def run(updates: list[dict], workers: int) -> float:
+    pool = WorkerPool(target=run_benchmark_worker, workers=workers)
+    pool.start()
+    started_at = time.perf_counter()
+    for update in updates:
+        pool.dispatch(update)
+    pool.stop()
+    return len(updates) / (time.perf_counter() - started_at)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=20000)
+    parser.add_argument('--chats', type=int, default=500)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    updates = [make_update(update_id, args.chats) for update_id in range(args.updates)]
+    baseline = None
+    for workers in args.workers:
+        throughput = run(updates, workers)
+        baseline = baseline or throughput
+        print(
+            f'{workers:>2} workers: {throughput:9.1f} updates/s'
+            f' ({throughput / baseline:.2f}x)'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Times the everyday per-teacher queries on a database shared by many teachers
+of very different sizes, with and without the indexes leading on teacher_id.
+With them query time follows the teacher's own data, not the whole table.
+
+    python -m benchmarks.tenant_queries --tenants 50 --largest 20000
+"""
+
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from sqlmodel import create_engine, insert
+
+from lessons_reporter_bot.database import ensure_schema
+from lessons_reporter_bot.models import Report, Student, Topic
+from lessons_reporter_bot.report_storage import ReportStorage
+from lessons_reporter_bot.student_storage import StudentStorage
+from lessons_reporter_bot.tenancy import tenant_scope
+from lessons_reporter_bot.topic_storage import TopicStorage
+
+TEACHER_INDEXES = (
+    'ix_report_teacher_id_lesson_date',
+    'ix_student_live_teacher_id_name',
+    'ix_topic_live_teacher_id_topic',
+)
+
+
+def tenant_sizes(tenants: int, largest: int) -> dict[int, int]:
+    # Report counts fall off geometrically from the largest teacher
+    ratio = (10 / largest) ** (1 / max(tenants - 1, 1))
+    return {
+        teacher_id: max(int(largest * ratio ** (teacher_id - 1)), 10)
+        for teacher_id in range(1, tenants + 1)
+    }
+
+
+def populate(engine, sizes: dict[int, int]) -> None:
+    ensure_schema(engine)
+    random_generator = random.Random(0)
+    student_id = topic_id = 0
+    with engine.begin() as connection:
+        for teacher_id, reports in sizes.items():
+            students = max(reports // 40, 1)
+            connection.execute(
+                insert(Student),
+                [
+                    {'name': f'Student {teacher_id}-{index}', 'teacher_id': teacher_id}
+                    for index in range(students)
+                ],
+            )
+            connection.execute(
+                insert(Topic),
+                [
+                    {'topic': f'Topic {teacher_id}-{index}', 'teacher_id': teacher_id}
+                    for index in range(10)
+                ],
+            )
+            connection.execute(
+                insert(Report),
+                [
+                    {
+                        'teacher_id': teacher_id,
+                        'lesson_date': date.today()
+                        - timedelta(days=random_generator.randrange(300)),
+                        'lesson_count': index + 1,
+                        'topic_id': topic_id + index % 10 + 1,
+                        'student_id': student_id + index % students + 1,
+                        'homework_status': index % 3,
+                        'is_proactive': True,
+                        'is_paid': bool(index % 2),
+                        'is_sent': index % 50 != 0,
+                    }
+                    for index in range(reports)
+                ],
+            )
+            student_id += students
+            topic_id += 10
+
+
+def time_tenant(engine, teacher_id: int, repeats: int) -> float:
+    report_storage = ReportStorage(engine=engine)
+    student_storage = StudentStorage(engine=engine)
+    topic_storage = TopicStorage(engine=engine)
+    with tenant_scope(teacher_id):
+        # The first round only warms up the statement cache
+        for repeat in range(repeats + 1):
+            if repeat == 1:
+                started_at = time.perf_counter()
+            report_storage.list_report_rows_page(offset=0, limit=10)
+            student_storage.list_students(order_by='name')
+            topic_storage.list_topics(order_by='topic')
+        return (time.perf_counter() - started_at) / repeats
+
+
+def run(engine, sizes: dict[int, int], repeats: int) -> dict[int, float]:
+    teacher_ids = sorted(sizes, key=sizes.get)
+    picked = (teacher_ids[0], teacher_ids[len(teacher_ids) // 2], teacher_ids[-1])
+    return {
+        teacher_id: time_tenant(engine, teacher_id, repeats) for teacher_id in picked
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tenants', type=int, default=50)
+    parser.add_argument('--largest', type=int, default=20000)
+    parser.add_argument('--repeats', type=int, default=50)
+    args = parser.parse_args()
+
+    sizes = tenant_sizes(args.tenants, args.largest)
+    engine = create_engine('sqlite://')
+    populate(engine, sizes)
+    print(f'{args.tenants} teachers, {sum(sizes.values())} reports in total')
+
+    indexed = run(engine, sizes, args.repeats)
+    with engine.begin() as connection:
+        for name in TEACHER_INDEXES:
+            connection.exec_driver_sql(f'DROP INDEX {name}')
+    unindexed = run(engine, sizes, args.repeats)
+
+    for teacher_id in indexed:
+        print(
+            f'teacher with {sizes[teacher_id]:6} reports:'
+            f' {indexed[teacher_id] * 1000:7.2f} ms with teacher indexes,'
+            f' {unindexed[teacher_id] * 1000:7.2f} ms without'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import cached_property
+from typing import TYPE_CHECKING, Iterator
+
+from lessons_reporter_bot.settings import Settings
+
+# Components are built on first access and their modules are imported only
+# then, so importing the entry point stays cheap and a process only pays for
+# what it actually uses
+if TYPE_CHECKING:
+    from sqlalchemy import Engine
+    from sqlmodel import Session
+    from telebot import TeleBot
+
+    from lessons_reporter_bot.attachment_storage import AttachmentStorage
+    from lessons_reporter_bot.attachment_store import AttachmentStore
+    from lessons_reporter_bot.authorization_service import AuthorizationService
+    from lessons_reporter_bot.backup import BackupService
+    from lessons_reporter_bot.bot_service import BotService
+    from lessons_reporter_bot.chart_storage import ChartStorage
+    from lessons_reporter_bot.charts import ProgressCharts
+    from lessons_reporter_bot.coalescing import NavigationCoalescer
+    from lessons_reporter_bot.draft_storage import DraftStorage
+    from lessons_reporter_bot.idempotency import CallbackDeduplicator
+    from lessons_reporter_bot.job_storage import JobStorage
+    from lessons_reporter_bot.parent_history_cache import ParentHistoryCache
+    from lessons_reporter_bot.payment_storage import PaymentStorage
+    from lessons_reporter_bot.rate_limiter import RateLimiter
+    from lessons_reporter_bot.recorder import UpdateRecorder
+    from lessons_reporter_bot.report_builder import ReportBuilder
+    from lessons_reporter_bot.report_storage import ReportStorage
+    from lessons_reporter_bot.scheduler import PriorityScheduler
+    from lessons_reporter_bot.shared_store import SharedStore
+    from lessons_reporter_bot.spool import MessageSpool
+    from lessons_reporter_bot.student_storage import StudentStorage
+    from lessons_reporter_bot.teacher_storage import TeacherStorage
+    from lessons_reporter_bot.telegram_transport import TelegramTransport
+    from lessons_reporter_bot.topic_storage import TopicStorage
+
+
+class Application:
+    # The process name keeps files owned by one process apart from the others
+    def __init__(
+        self, settings: Settings | None = None, process_name: str = 'main'
+    ) -> None:
+        if settings is not None:
+            self.settings = settings
+        self.process_name = process_name
+
+    @cached_property
+    def settings(self) -> Settings:
+        return Settings()
+
+    @cached_property
+    def engine(self) -> 'Engine':
+        from lessons_reporter_bot.database import create_database_engine
+
+        return create_database_engine(self.settings)
+
+    # Work done for a teacher is limited to that teacher's data, work done for
+    # any other user sees no data at all. Only system jobs, which pass no user,
+    # see every teacher's data.
+    @contextmanager
+    def unit_of_work(self, user_id: int | None = None) -> Iterator['Session']:
+        from lessons_reporter_bot.database import unit_of_work
+        from lessons_reporter_bot.tenancy import TenantScope, tenant_scope
+
+        if user_id is None:
+            teacher_id = None
+        elif self.authorization_service.has_teacher_access(user_id):
+            teacher_id = user_id
+        else:
+            teacher_id = TenantScope.DENY_ALL
+        with tenant_scope(teacher_id), unit_of_work(self.engine) as session:
+            yield session
+
+    # The parent screens look up a parent's children across every teacher.
+    # They only read, and check that the student is the parent's own.
+    @contextmanager
+    def parent_unit_of_work(self) -> Iterator['Session']:
+        from lessons_reporter_bot.database import unit_of_work
+        from lessons_reporter_bot.tenancy import tenant_scope
+
+        with tenant_scope(None), unit_of_work(self.engine) as session:
+            yield session
+
+    @cached_property
+    def topic_storage(self) -> 'TopicStorage':
+        from lessons_reporter_bot.topic_storage import TopicStorage
+
+        return TopicStorage(engine=self.engine)
+
+    @cached_property
+    def student_storage(self) -> 'StudentStorage':
+        from lessons_reporter_bot.student_storage import StudentStorage
+
+        return StudentStorage(engine=self.engine)
+
+    @cached_property
+    def teacher_storage(self) -> 'TeacherStorage':
+        from lessons_reporter_bot.teacher_storage import TeacherStorage
+
+        return TeacherStorage(engine=self.engine)
+
+    @cached_property
+    def report_storage(self) -> 'ReportStorage':
+        from lessons_reporter_bot.report_storage import ReportStorage
+
+        return ReportStorage(engine=self.engine)
+
+    @cached_property
+    def payment_storage(self) -> 'PaymentStorage':
+        from lessons_reporter_bot.payment_storage import PaymentStorage
+
+        return PaymentStorage(engine=self.engine)
+
+    @cached_property
+    def draft_storage(self) -> 'DraftStorage':
+        from lessons_reporter_bot.draft_storage import DraftStorage
+
+        return DraftStorage(engine=self.engine)
+
+    @cached_property
+    def job_storage(self) -> 'JobStorage':
+        from lessons_reporter_bot.job_storage import JobStorage
+
+        return JobStorage(engine=self.engine)
+
+    @cached_property
+    def attachment_storage(self) -> 'AttachmentStorage':
+        from lessons_reporter_bot.attachment_storage import AttachmentStorage
+
+        return AttachmentStorage(engine=self.engine)
+
+    @cached_property
+    def attachment_store(self) -> 'AttachmentStore':
+        from lessons_reporter_bot.attachment_store import AttachmentStore
+
+        return AttachmentStore(
+            directory=self.settings.attachment_dir,
+            max_file_bytes=self.settings.attachment_max_bytes,
+        )
+
+    @cached_property
+    def chart_storage(self) -> 'ChartStorage':
+        from lessons_reporter_bot.chart_storage import ChartStorage
+
+        return ChartStorage(engine=self.engine)
+
+    @cached_property
+    def progress_charts(self) -> 'ProgressCharts':
+        from lessons_reporter_bot.charts import ProgressCharts
+
+        return ProgressCharts(
+            report_storage=self.report_storage,
+            chart_storage=self.chart_storage,
+            directory=self.settings.chart_dir,
+            workers=self.settings.chart_workers,
+        )
+
+    @cached_property
+    def report_builder(self) -> 'ReportBuilder':
+        from lessons_reporter_bot.report_builder import ReportBuilder
+
+        return ReportBuilder(draft_storage=self.draft_storage)
+
+    @cached_property
+    def authorization_service(self) -> 'AuthorizationService':
+        from lessons_reporter_bot.authorization_service import AuthorizationService
+
+        return AuthorizationService(
+            teacher_storage=self.teacher_storage,
+            student_storage=self.student_storage,
+            ttl_seconds=self.settings.role_cache_ttl_seconds,
+        )
+
+    @cached_property
+    def bot_service(self) -> 'BotService':
+        from lessons_reporter_bot.bot_service import BotService
+
+        return BotService(
+            topic_storage=self.topic_storage,
+            report_builder=self.report_builder,
+            student_storage=self.student_storage,
+            teacher_storage=self.teacher_storage,
+            report_storage=self.report_storage,
+            payment_storage=self.payment_storage,
+            attachment_storage=self.attachment_storage,
+            progress_charts=self.progress_charts,
+            authorization_service=self.authorization_service,
+            parent_history_cache=self.parent_history_cache,
+            max_attachments_per_report=self.settings.attachments_per_report,
+        )
+
+    @cached_property
+    def parent_history_cache(self) -> 'ParentHistoryCache':
+        from lessons_reporter_bot.parent_history_cache import ParentHistoryCache
+
+        # Workers only see each other's invalidations through a shared
+        # directory, without one a parent could get stale pages
+        return ParentHistoryCache(
+            shared_store=self.shared_store,
+            enabled=self.settings.workers == 1
+            or self.settings.shared_state_dir is not None,
+        )
+
+    @cached_property
+    def callback_deduplicator(self) -> 'CallbackDeduplicator':
+        from lessons_reporter_bot.idempotency import CallbackDeduplicator
+
+        return CallbackDeduplicator(
+            engine=self.engine,
+            ttl=timedelta(seconds=self.settings.callback_dedup_ttl_seconds),
+            max_entries=self.settings.callback_dedup_max_entries,
+        )
+
+    @cached_property
+    def backup_service(self) -> 'BackupService':
+        from lessons_reporter_bot.backup import BackupService
+
+        return BackupService(
+            engine=self.engine,
+            directory=self.settings.backup_dir,
+            keep=self.settings.backup_keep,
+            pages_per_step=self.settings.backup_pages_per_step,
+            step_sleep_seconds=self.settings.backup_step_sleep_seconds,
+        )
+
+    @cached_property
+    def navigation_coalescer(self) -> 'NavigationCoalescer':
+        from lessons_reporter_bot.coalescing import NavigationCoalescer
+
+        return NavigationCoalescer()
+
+    @cached_property
+    def scheduler(self) -> 'PriorityScheduler':
+        from lessons_reporter_bot.scheduler import PriorityScheduler
+
+        return PriorityScheduler(
+            bulk_workers=self.settings.bulk_workers,
+            max_yield_seconds=self.settings.bulk_max_yield_seconds,
+        )
+
+    # Shared by every bulk job of the process, interactive replies are not
+    # limited by it
+    @cached_property
+    def bulk_rate_limiter(self) -> 'RateLimiter':
+        from lessons_reporter_bot.rate_limiter import RateLimiter
+
+        return RateLimiter(self.settings.telegram_bulk_messages_per_second)
+
+    @cached_property
+    def message_spool(self) -> 'MessageSpool':
+        import os
+
+        from lessons_reporter_bot.spool import MessageSpool
+
+        return MessageSpool(
+            directory=os.path.join(self.settings.spool_dir, self.process_name),
+            segment_max_bytes=self.settings.spool_segment_max_bytes,
+        )
+
+    @cached_property
+    def shared_store(self) -> 'SharedStore':
+        from lessons_reporter_bot.shared_store import create_shared_store
+
+        return create_shared_store(self.settings.shared_state_dir)
+
+    @cached_property
+    def telegram_transport(self) -> 'TelegramTransport':
+        from lessons_reporter_bot.telegram_transport import (
+            TelegramTransport,
+            install_transport,
+        )
+
+        transport = TelegramTransport(
+            pool_size=self.settings.telegram_pool_size,
+            max_retries=self.settings.telegram_max_retries,
+            backoff_seconds=self.settings.telegram_retry_backoff_seconds,
+            max_backoff_seconds=self.settings.telegram_retry_max_backoff_seconds,
+        )
+        install_transport(
+            self.update_recorder.wrap_transport(transport)
+            if self.update_recorder
+            else transport,
+            connect_timeout=self.settings.telegram_connect_timeout,
+            read_timeout=self.settings.telegram_read_timeout,
+            api_url=self.settings.telegram_api_url,
+        )
+        return transport
+
+    @cached_property
+    def update_recorder(self) -> 'UpdateRecorder | None':
+        from lessons_reporter_bot.recorder import UpdateRecorder
+
+        if self.settings.update_log_dir is None:
+            return None
+        return UpdateRecorder(
+            directory=self.settings.update_log_dir, name=self.process_name
+        )
+
+    @cached_property
+    def telegram_bot(self) -> 'TeleBot':
+        from lessons_reporter_bot.scheduler import PriorityTeleBot
+
+        # Every API call goes through the configured transport
+        self.telegram_transport
+        # Worker processes handle their updates in order, one at a time
+        return PriorityTeleBot(
+            scheduler=self.scheduler,
+            token=self.settings.bot_token,
+            threaded=self.settings.workers == 1,
+            num_threads=self.settings.interactive_workers,
+        )
+
+    def prepare_database(self) -> None:
+        from lessons_reporter_bot.database import ensure_schema
+        from lessons_reporter_bot.tenancy import claim_unowned_rows
+
+        ensure_schema(self.engine)
+        self.teacher_storage.add_missing_teachers(self.settings.superusers)
+        if self.settings.superusers:
+            with self.unit_of_work() as session:
+                claim_unowned_rows(session, teacher_id=self.settings.superusers[0])
+        self.callback_deduplicator.prune()
+        if not self.payment_storage.has_balances():
+            self.payment_storage.rebuild_balances()
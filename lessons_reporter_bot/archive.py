@@ -0,0 +1,38 @@
+import threading
+from datetime import date, timedelta
+from typing import Callable
+
+from lessons_reporter_bot.report_storage import ReportStorage
+
+
+class ReportArchiver:
+    def __init__(
+        self,
+        report_storage: ReportStorage,
+        archive_after_days: int,
+        batch_size: int,
+        today: Callable[[], date] = date.today,
+    ) -> None:
+        self.report_storage = report_storage
+        self.archive_after_days = archive_after_days
+        self.batch_size = batch_size
+        self.today = today
+
+    def run_pending(self) -> int:
+        cutoff = self.today() - timedelta(days=self.archive_after_days)
+        archived_count = self.report_storage.archive_reports_older_than(
+            cutoff=cutoff, batch_size=self.batch_size
+        )
+        if archived_count:
+            print(f'Archived {archived_count} reports older than {cutoff}')
+        return archived_count
+
+    def run_forever(
+        self, stop_event: threading.Event, poll_interval_seconds: float = 6 * 3600
+    ) -> None:
+        while not stop_event.is_set():
+            try:
+                self.run_pending()
+            except Exception as e:
+                print(f'Report archiving failed: {e!r}')
+            stop_event.wait(poll_interval_seconds)
@@ -0,0 +1,62 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlmodel import select
+
+from lessons_reporter_bot.database import unit_of_work
+from lessons_reporter_bot.models import Attachment, AttachmentData
+
+
+class AttachmentStorage:
+    def __init__(self, engine) -> None:
+        self.engine = engine
+
+    def add_attachments(
+        self, report_id: int, attachments: list[AttachmentData]
+    ) -> list[int]:
+        instances = [
+            Attachment(
+                report_id=report_id,
+                kind=attachment.kind.value,
+                sha256=attachment.sha256,
+                size_bytes=attachment.size_bytes,
+                file_name=attachment.file_name,
+                telegram_file_id=attachment.telegram_file_id,
+                created_at=datetime.now(),
+            )
+            for attachment in attachments
+        ]
+        with unit_of_work(self.engine) as session:
+            session.add_all(instances)
+        return [instance.attachment_id for instance in instances]
+
+    def get_attachment(self, attachment_id: int) -> Optional[Attachment]:
+        with unit_of_work(self.engine) as session:
+            return session.get(Attachment, attachment_id)
+
+    # One query for the whole list of reports
+    def list_attachment_ids_by_report_ids(
+        self, report_ids: list[int]
+    ) -> dict[int, list[int]]:
+        with unit_of_work(self.engine) as session:
+            statement = (
+                select(Attachment.report_id, Attachment.attachment_id)
+                .where(Attachment.report_id.in_(report_ids))
+                .order_by(Attachment.attachment_id)
+            )
+            attachment_ids = {}
+            for report_id, attachment_id in session.exec(statement):
+                attachment_ids.setdefault(report_id, []).append(attachment_id)
+            return attachment_ids
+
+    def list_attachment_ids(self, report_id: int) -> list[int]:
+        return self.list_attachment_ids_by_report_ids([report_id]).get(report_id, [])
+
+    def set_telegram_file_id(self, attachment_id: int, telegram_file_id: str) -> None:
+        with unit_of_work(self.engine) as session:
+            if attachment := session.get(Attachment, attachment_id):
+                attachment.telegram_file_id = telegram_file_id
+
+    def list_hashes(self) -> set[str]:
+        with unit_of_work(self.engine) as session:
+            return set(session.exec(select(Attachment.sha256).distinct()))
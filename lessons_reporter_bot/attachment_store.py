@@ -0,0 +1,84 @@
+import hashlib
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterable
+
+PARTIAL_FILE_SUFFIX = '.part'
+
+
+class AttachmentTooLarge(Exception):
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class StoredFile:
+    sha256: str
+    size_bytes: int
+
+
+# Files are named by the SHA-256 of their content, so a photo attached twice
+# is kept once. Downloads are streamed to a temporary file and only renamed
+# into place once complete, so a stored file is never partial.
+class AttachmentStore:
+    def __init__(self, directory: str | os.PathLike, max_file_bytes: int) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_file_bytes = max_file_bytes
+
+    def save(self, chunks: Iterable[bytes]) -> StoredFile:
+        digest = hashlib.sha256()
+        size_bytes = 0
+        file_descriptor, temp_path = tempfile.mkstemp(
+            dir=self.directory, suffix=PARTIAL_FILE_SUFFIX
+        )
+        try:
+            with os.fdopen(file_descriptor, 'wb') as temp_file:
+                for chunk in chunks:
+                    size_bytes += len(chunk)
+                    if size_bytes > self.max_file_bytes:
+                        raise AttachmentTooLarge(
+                            f'More than {self.max_file_bytes} bytes'
+                        )
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+
+            path = self.path(digest.hexdigest())
+            if path.exists():
+                os.unlink(temp_path)
+                # Counts as new for `delete_unreferenced`
+                os.utime(path)
+            else:
+                path.parent.mkdir(exist_ok=True)
+                os.replace(temp_path, path)
+        except BaseException:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+        return StoredFile(sha256=digest.hexdigest(), size_bytes=size_bytes)
+
+    def path(self, sha256: str) -> Path:
+        return self.directory / sha256[:2] / sha256
+
+    def open(self, sha256: str) -> BinaryIO:
+        return open(self.path(sha256), 'rb')
+
+    # Files no attachment refers to are kept for a while, a report that is
+    # still being written may be about to refer to them
+    def delete_unreferenced(
+        self, referenced_hashes: set[str], older_than_seconds: float
+    ) -> int:
+        deleted_count = 0
+        cutoff = time.time() - older_than_seconds
+        for path in self.directory.glob('*/*'):
+            if path.name in referenced_hashes or path.stat().st_mtime > cutoff:
+                continue
+            path.unlink(missing_ok=True)
+            deleted_count += 1
+        for path in self.directory.glob(f'*{PARTIAL_FILE_SUFFIX}'):
+            if path.stat().st_mtime < cutoff:
+                path.unlink(missing_ok=True)
+        return deleted_count
@@ -1,11 +1,54 @@
-from dataclasses import dataclass
+import threading
+import time
+from typing import Callable
 
 from lessons_reporter_bot.settings import UserId
+from lessons_reporter_bot.student_storage import StudentStorage
+from lessons_reporter_bot.teacher_storage import TeacherStorage
+from lessons_reporter_bot.tenancy import tenant_scope
 
 
-@dataclass
+# Roles are checked for every outgoing message, so they are answered from
+# in-memory sets. The sets are reloaded after a local change and at least
+# every `ttl_seconds`, which covers changes made by other worker processes.
 class AuthorizationService:
-    superusers: list[UserId]
+    def __init__(
+        self,
+        teacher_storage: TeacherStorage,
+        student_storage: StudentStorage,
+        ttl_seconds: float = 60,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.teacher_storage = teacher_storage
+        self.student_storage = student_storage
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._teacher_ids: frozenset[UserId] = frozenset()
+        self._parent_ids: frozenset[UserId] = frozenset()
+        self._loaded_at: float | None = None
+        self._lock = threading.Lock()
 
     def has_teacher_access(self, user_id: UserId) -> bool:
-        return user_id in self.superusers
+        self._refresh_if_stale()
+        return user_id in self._teacher_ids
+
+    def has_parent_access(self, user_id: UserId) -> bool:
+        self._refresh_if_stale()
+        return user_id in self._parent_ids
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+    def _refresh_if_stale(self) -> None:
+        loaded_at = self._loaded_at
+        if loaded_at is not None and self.clock() - loaded_at < self.ttl_seconds:
+            return
+
+        with self._lock:
+            if self._loaded_at is not loaded_at:
+                return
+            # Parents are looked up across all teachers
+            with tenant_scope(None):
+                self._teacher_ids = frozenset(self.teacher_storage.list_teacher_ids())
+                self._parent_ids = frozenset(self.student_storage.list_parent_ids())
+            self._loaded_at = self.clock()
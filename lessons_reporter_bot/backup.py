@@ -0,0 +1,168 @@
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+from sqlalchemy import Engine
+from sqlmodel import SQLModel, select
+
+BACKUP_FILE_PREFIX = 'backup-'
+
+
+@dataclass(slots=True)
+class BackupResult:
+    path: Path
+    size_bytes: int
+    duration_seconds: float
+
+
+class BackupService:
+    def __init__(
+        self,
+        engine: Engine,
+        directory: str | os.PathLike,
+        keep: int,
+        pages_per_step: int = 256,
+        step_sleep_seconds: float = 0.01,
+        clock: Callable[[], datetime] = datetime.now,
+    ) -> None:
+        self.engine = engine
+        self.directory = Path(directory)
+        self.keep = keep
+        self.pages_per_step = pages_per_step
+        self.step_sleep_seconds = step_sleep_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+
+    @property
+    def is_running(self) -> bool:
+        return self._lock.locked()
+
+    # Returns None if another backup is still in progress
+    def create_backup(self) -> BackupResult | None:
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            return self._create_backup()
+        finally:
+            self._lock.release()
+
+    def _create_backup(self) -> BackupResult:
+        started_at = time.perf_counter()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        name = BACKUP_FILE_PREFIX + self.clock().strftime('%Y%m%d-%H%M%S')
+        if self.engine.dialect.name == 'sqlite':
+            path = self.directory / f'{name}.sqlite3.gz'
+            self._backup_sqlite(path)
+        else:
+            path = self.directory / f'{name}.jsonl.gz'
+            self._dump_tables(path)
+
+        self.rotate()
+        return BackupResult(
+            path=path,
+            size_bytes=path.stat().st_size,
+            duration_seconds=time.perf_counter() - started_at,
+        )
+
+    # The online backup API copies a few pages at a time and the pause between
+    # steps keeps the bot's queries from queueing behind it. The source holds
+    # one read transaction throughout: without it every write by the bot would
+    # restart the copy, and in WAL mode it doesn't block writers.
+    def _backup_sqlite(self, path: Path) -> None:
+        snapshot_path = path.with_name(path.name + '.partial.sqlite3')
+        raw_connection = self.engine.raw_connection()
+        source = raw_connection.driver_connection
+        try:
+            source.execute('BEGIN')
+            source.execute('SELECT count(*) FROM sqlite_master').fetchone()
+            snapshot = sqlite3.connect(snapshot_path)
+            try:
+                source.backup(
+                    snapshot,
+                    pages=self.pages_per_step,
+                    progress=lambda status, remaining, total: time.sleep(
+                        self.step_sleep_seconds
+                    ),
+                )
+            finally:
+                snapshot.close()
+            source.rollback()
+            self._compress(snapshot_path, path)
+        finally:
+            raw_connection.close()
+            snapshot_path.unlink(missing_ok=True)
+
+    def _dump_tables(self, path: Path) -> None:
+        partial_path = path.with_name(path.name + '.partial')
+        with (
+            self.engine.connect() as connection,
+            gzip.open(partial_path, 'wt', encoding='utf-8') as file,
+        ):
+            for table in SQLModel.metadata.sorted_tables:
+                result = connection.execution_options(yield_per=1000).execute(
+                    select(table)
+                )
+                for row in result.mappings():
+                    file.write(
+                        json.dumps(
+                            {'table': table.name, 'row': dict(row)},
+                            default=str,
+                            ensure_ascii=False,
+                        )
+                        + '\n'
+                    )
+        os.replace(partial_path, path)
+
+    def _compress(self, source_path: Path, path: Path) -> None:
+        partial_path = path.with_name(path.name + '.partial')
+        with open(source_path, 'rb') as source, gzip.open(partial_path, 'wb') as file:
+            shutil.copyfileobj(source, file, length=1024 * 1024)
+        os.replace(partial_path, path)
+
+    def list_backups(self) -> list[Path]:
+        return sorted(
+            path
+            for path in self.directory.glob(f'{BACKUP_FILE_PREFIX}*.gz')
+            if path.is_file()
+        )
+
+    def rotate(self) -> list[Path]:
+        removed = self.list_backups()[: -self.keep] if self.keep > 0 else []
+        for path in removed:
+            path.unlink(missing_ok=True)
+        return removed
+
+    def run_forever(self, stop_event: threading.Event, interval_seconds: float) -> None:
+        while not stop_event.wait(interval_seconds):
+            try:
+                if result := self.create_backup():
+                    print(
+                        f'Backup {result.path.name}: {result.size_bytes} bytes '
+                        f'in {result.duration_seconds:.2f}s'
+                    )
+            except Exception as e:
+                print(f'Backup failed: {e!r}')
+
+
+def main() -> None:
+    from lessons_reporter_bot.app import Application
+
+    app = Application()
+    if result := app.backup_service.create_backup():
+        print(
+            f'{result.path}: {result.size_bytes} bytes '
+            f'in {result.duration_seconds:.2f}s'
+        )
+
+
+if __name__ == '__main__':
+    main()
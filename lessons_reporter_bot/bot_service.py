@@ -1,15 +1,22 @@
 from dataclasses import dataclass
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
+from lessons_reporter_bot.attachment_storage import AttachmentStorage
 from lessons_reporter_bot.authorization_service import AuthorizationService
+from lessons_reporter_bot.backup import BackupResult
 from lessons_reporter_bot.callback_data import (
     # Topic's callback's
     AddParentIdToStudentCallbackData,
+    # Payment callback's
+    AddPaymentCallbackData,
+    AddTeacherCallbackData,
+    AnyCallbackData,
     # Student's callback's
     CreateStudentCallbackData,
     CreateTopicCallbackData,
     DeleteConfirmedItemCallbackData,
     DeleteOneItemCallbackData,
+    EditReportCallbackData,
     # Back to callback's
     GoBackToAdminPanelCallbackData,
     # Report builder's callback's
@@ -20,35 +27,50 @@ from lessons_reporter_bot.callback_data import (
     ReportBuilder6SetIsProactiveCallbackData,
     ReportBuilder7SetIsPaidCallbackData,
     ReportBuilder8AddCommentQuestionCallbackData,
+    ReportBuilder9AddAttachmentCallbackData,
     ReportBuilderChooseItemListCallbackData,
     ReportBuilderShowItemListCallbackData,
     ReportBuilderShowReportPreviewCallbackData,
     SaveConfirmedReportCallbackData,
     SendSavedReportsCallbackData,
+    ShowDebtorsCallbackData,
     ShowItemsListCallbackData,
     ShowOneItemCallbackData,
+    ShowParentReportsCallbackData,
+    ShowStudentChartCallbackData,
     UpdateStudentNameCallbackData,
 )
+from lessons_reporter_bot.charts import ProgressCharts
 from lessons_reporter_bot.models import (
+    AttachmentData,
     BotServiceMessage,
     BotServiceMessageButton,
     BotServiceRegisterNextMessageHandler,
     FormattedPaginationItem,
+    MonthlySummary,
     Report,
     ReportData,
 )
+from lessons_reporter_bot.parent_history_cache import ParentHistoryCache
+from lessons_reporter_bot.payment_storage import PaymentStorage
+from lessons_reporter_bot.rendering import (
+    escape_markdown,
+    render_chart_caption,
+    render_monthly_digest,
+    render_report,
+    render_report_row,
+    render_reports,
+)
 from lessons_reporter_bot.report_builder import ReportBuilder
 from lessons_reporter_bot.report_storage import ReportStorage
 from lessons_reporter_bot.settings import UserId
 from lessons_reporter_bot.student_storage import StudentStorage
+from lessons_reporter_bot.teacher_storage import TeacherStorage
 from lessons_reporter_bot.topic_storage import TopicStorage
-from lessons_reporter_bot.utils import paginate
+from lessons_reporter_bot.utils import FIRST_PAGE, PaginationResult, paginate
 
-FORMATTED_HOMEWORK_STATUS_MAP = {
-    2: 'выполнено',
-    1: 'частично выполнено',
-    0: 'не выполнено',
-}
+ITEMS_PAGE_SIZE = 10
+PARENT_REPORTS_PAGE_SIZE = 5
 
 
 @dataclass
@@ -56,14 +78,22 @@ class BotService:
     authorization_service: AuthorizationService
     topic_storage: TopicStorage
     student_storage: StudentStorage
+    teacher_storage: TeacherStorage
     report_builder: ReportBuilder
     report_storage: ReportStorage
+    payment_storage: PaymentStorage
+    attachment_storage: AttachmentStorage
+    progress_charts: ProgressCharts
+    parent_history_cache: ParentHistoryCache
+    max_attachments_per_report: int = 10
 
     def welcome(self, user_id: UserId) -> list[BotServiceMessage]:
         if self.authorization_service.has_teacher_access(user_id):
             return [
                 self.show_admin_panel(),
             ]
+        if self.authorization_service.has_parent_access(user_id):
+            return [self.show_parent_menu(user_id)]
         return [
             BotServiceMessage(
                 text=f'Здравствуйте! Перешлите это сообщение Елене Петровне:\n`{user_id}`',
@@ -79,9 +109,84 @@ class BotService:
             ),
         ]
 
-    def show_admin_panel(self) -> BotServiceMessage:
+    def show_parent_menu(self, parent_id: UserId) -> BotServiceMessage:
+        return BotServiceMessage(
+            text=(
+                'Здравствуйте! Бот присылает отчёты о занятиях.'
+                ' Прошлые отчёты можно посмотреть здесь:'
+            ),
+            buttons=[
+                BotServiceMessageButton(
+                    title=student.name,
+                    callback_data=ShowParentReportsCallbackData(
+                        student_id=student.student_id, page=FIRST_PAGE
+                    ),
+                )
+                for student in self.student_storage.list_students_by_parent_id(
+                    parent_id
+                )
+            ],
+            row_width=1,
+        )
+
+    def show_parent_reports(
+        self, parent_id: UserId, data: ShowParentReportsCallbackData
+    ) -> BotServiceMessage:
+        if cached_message := self.parent_history_cache.get(
+            parent_id, data.student_id, data.page
+        ):
+            return cached_message
+
+        students = self.student_storage.list_students_by_parent_id(parent_id)
+        if not any(student.student_id == data.student_id for student in students):
+            return self.show_parent_menu(parent_id)
+
+        report_rows, is_last_page = self.report_storage.list_report_rows_page(
+            offset=(data.page - 1) * PARENT_REPORTS_PAGE_SIZE,
+            limit=PARENT_REPORTS_PAGE_SIZE,
+            student_id=data.student_id,
+        )
+        text = '\n\n'.join(render_reports(report_rows)) or 'Отчётов пока нет'
+
+        buttons = [
+            BotServiceMessageButton(
+                title='График',
+                callback_data=ShowStudentChartCallbackData(
+                    student_id=data.student_id, page=data.page
+                ),
+            )
+        ]
+        if data.page != FIRST_PAGE:
+            buttons.append(
+                BotServiceMessageButton(
+                    title='Новее',
+                    callback_data=ShowParentReportsCallbackData(
+                        student_id=data.student_id, page=data.page - 1
+                    ),
+                )
+            )
+        if not is_last_page:
+            buttons.append(
+                BotServiceMessageButton(
+                    title='Старее',
+                    callback_data=ShowParentReportsCallbackData(
+                        student_id=data.student_id, page=data.page + 1
+                    ),
+                )
+            )
+        buttons.append(
+            BotServiceMessageButton(
+                title='В меню', callback_data=GoBackToAdminPanelCallbackData()
+            )
+        )
+
+        message = BotServiceMessage(text=text, buttons=buttons)
+        self.parent_history_cache.set(parent_id, data.student_id, data.page, message)
+        return message
+
+    def show_admin_panel(self, notice: str | None = None) -> BotServiceMessage:
         return BotServiceMessage(
-            text='Главное меню:',
+            text=f'{notice}\n\nГлавное меню:' if notice else 'Главное меню:',
             buttons=[
                 BotServiceMessageButton(
                     title='Студенты',
@@ -95,16 +200,27 @@ class BotService:
                     title='Отчёты',
                     callback_data=ShowItemsListCallbackData(i_t='R', i_f=None, page=1),
                 ),
+                BotServiceMessageButton(
+                    title='Долги',
+                    callback_data=ShowDebtorsCallbackData(page=1),
+                ),
                 BotServiceMessageButton(
                     title='Составить отчёт',
                     callback_data=ReportBuilder1CallbackData(),
                 ),
+                BotServiceMessageButton(
+                    title='Добавить преподавателя',
+                    callback_data=AddTeacherCallbackData(),
+                ),
             ],
         )
 
     def delete_one_item(self, data: DeleteOneItemCallbackData) -> BotServiceMessage:
         if data.i_t == 'S':
-            text = 'Подтвердите удаление студента'
+            text = (
+                'Подтвердите удаление студента. Его отчёты и оплаты тоже будут'
+                ' удалены.'
+            )
         elif data.i_t == 'T':
             text = 'Подтвердите удаление темы'
 
@@ -132,7 +248,10 @@ class BotService:
         self, data: DeleteConfirmedItemCallbackData
     ) -> BotServiceMessage:
         if data.i_t == 'S':
+            parent_id = self.student_storage.get_parent_id(data.i_id)
             if self.student_storage.delete_student(data.i_id):
+                self.authorization_service.invalidate()
+                self.parent_history_cache.invalidate(parent_id)
                 text = 'Студент удалён'
             else:
                 text = 'Студент не найден'
@@ -164,7 +283,14 @@ class BotService:
 
         if data.i_t == 'S':
             if student := self.student_storage.get_student_by_id(data.i_id):
-                text = f'ФИО: {student.name}\nРодитель id: {student.parent_id if student.parent_id else 'отсутсвует'}'
+                balance = self.payment_storage.get_balance(data.i_id)
+                text = '\n'.join(
+                    (
+                        f'ФИО: {escape_markdown(student.name)}',
+                        f'Родитель id: {student.parent_id if student.parent_id else 'отсутсвует'}',
+                        f'Неоплаченных занятий: {max(balance.debt, 0) if balance else 0}',
+                    )
+                )
             else:
                 text = 'Студент не найден'
 
@@ -177,6 +303,12 @@ class BotService:
                             i_t='R', page=data.page, i_f=data.i_id
                         ),
                     ),
+                    BotServiceMessageButton(
+                        title='График',
+                        callback_data=ShowStudentChartCallbackData(
+                            student_id=data.i_id, page=data.page
+                        ),
+                    ),
                     BotServiceMessageButton(
                         title='Удалить',
                         callback_data=DeleteOneItemCallbackData(
@@ -197,24 +329,39 @@ class BotService:
                             page=data.page, student_id=data.i_id
                         ),
                     ),
+                    BotServiceMessageButton(
+                        title='Внести оплату',
+                        callback_data=AddPaymentCallbackData(
+                            page=data.page, student_id=data.i_id
+                        ),
+                    ),
                     go_back_button,
                 ],
             )
 
         elif data.i_t == 'R':
-            if report := self.report_storage.get_report_by_id(data.i_id):
-                if student := self.student_storage.get_student_by_id(report.student_id):
-                    text = self.format_report_text(report)
-                else:
-                    text = 'Студент не найден'
+            buttons = [go_back_button]
+            attachment_ids = []
+            if report_row := self.report_storage.get_report_row(data.i_id):
+                text = render_report_row(report_row)
+                attachment_ids = self.attachment_storage.list_attachment_ids(data.i_id)
+                buttons.insert(
+                    0,
+                    BotServiceMessageButton(
+                        title='Изменить',
+                        callback_data=EditReportCallbackData(report_id=data.i_id),
+                    ),
+                )
             else:
                 text = 'Отчёт не найден.'
 
-            return BotServiceMessage(text=text, buttons=[go_back_button])
+            return BotServiceMessage(
+                text=text, buttons=buttons, attachment_ids=attachment_ids
+            )
 
         elif data.i_t == 'T':
             if topic := self.topic_storage.get_topic_by_id(data.i_id):
-                text = topic.topic
+                text = escape_markdown(topic.topic)
             else:
                 text = 'Тема не найдена.'
 
@@ -233,12 +380,55 @@ class BotService:
                 ],
             )
 
+    # Renders the chart first if the student's reports changed since the last
+    # one was made
+    def show_student_chart(
+        self, user_id: UserId, data: ShowStudentChartCallbackData
+    ) -> BotServiceMessage:
+        student = self.student_storage.get_student_by_id(data.student_id)
+        if self.authorization_service.has_teacher_access(user_id):
+            go_back_button = BotServiceMessageButton(
+                title='Назад',
+                callback_data=ShowOneItemCallbackData(
+                    i_t='S', page=data.page, i_f=None, i_id=data.student_id
+                ),
+            )
+        elif student is not None and student.parent_id == user_id:
+            go_back_button = BotServiceMessageButton(
+                title='Назад',
+                callback_data=ShowParentReportsCallbackData(
+                    student_id=data.student_id, page=data.page
+                ),
+            )
+        else:
+            return self.show_parent_menu(user_id)
+
+        if student is None:
+            return BotServiceMessage(text='Студент не найден', buttons=[go_back_button])
+        if not (
+            months := self.progress_charts.prepare_charts([student.student_id]).get(
+                student.student_id
+            )
+        ):
+            return BotServiceMessage(
+                text='Отчётов пока нет, графику не из чего строиться.',
+                buttons=[go_back_button],
+            )
+        return BotServiceMessage(
+            text=render_chart_caption(student.name, months),
+            buttons=[go_back_button],
+            chart_student_ids=[student.student_id],
+        )
+
     def show_items_list(self, data: ShowItemsListCallbackData) -> BotServiceMessage:
         if data.i_t == 'S':
             formatted_items = [
                 FormattedPaginationItem(title=student.name, id=student.student_id)
                 for student in self.student_storage.list_students(order_by='name')
             ]
+            pagination_result = paginate(
+                items=formatted_items, data=data, page_size=ITEMS_PAGE_SIZE
+            )
             text = 'Выберите студента:'
             extra_buttons = [
                 BotServiceMessageButton(
@@ -250,9 +440,6 @@ class BotService:
 
         elif data.i_t == 'R':
             if data.i_f:
-                reports_list = self.report_storage.list_reports_by_student_id(
-                    student_id=data.i_f, order_by='lesson_date', descending=True
-                )
                 extra_buttons = [
                     BotServiceMessageButton(
                         title='Назад',
@@ -262,9 +449,6 @@ class BotService:
                     )
                 ]
             else:
-                reports_list = self.report_storage.list_reports(
-                    order_by='lesson_date', descending=True
-                )
                 extra_buttons = [
                     BotServiceMessageButton(
                         title='Отправить сохранённые отчёты',
@@ -272,16 +456,22 @@ class BotService:
                     )
                 ]
 
-            formatted_items = [
-                FormattedPaginationItem(
-                    title=f'{report.lesson_date.strftime('%d-%m-%Y')} — {student.name}',
-                    id=report.report_id,
-                )
-                for report in reports_list
-                if (
-                    student := self.student_storage.get_student_by_id(report.student_id)
-                )
-            ]
+            report_rows, is_last_page = self.report_storage.list_report_rows_page(
+                offset=(data.page - 1) * ITEMS_PAGE_SIZE,
+                limit=ITEMS_PAGE_SIZE,
+                student_id=data.i_f,
+            )
+            pagination_result = PaginationResult(
+                is_first_page=data.page == FIRST_PAGE,
+                is_last_page=is_last_page,
+                items=[
+                    FormattedPaginationItem(
+                        title=f'{row.lesson_date.strftime('%d-%m-%Y')} — {row.student_name}',
+                        id=row.report_id,
+                    )
+                    for row in report_rows
+                ],
+            )
             text = 'Выберите отчёт:'
             row_width = 1
 
@@ -290,6 +480,9 @@ class BotService:
                 FormattedPaginationItem(title=topic.topic, id=topic.topic_id)
                 for topic in self.topic_storage.list_topics(order_by='topic')
             ]
+            pagination_result = paginate(
+                items=formatted_items, data=data, page_size=ITEMS_PAGE_SIZE
+            )
             text = 'Выберите тему:'
             extra_buttons = [
                 BotServiceMessageButton(
@@ -299,8 +492,6 @@ class BotService:
             ]
             row_width = 1
 
-        pagination_result = paginate(items=formatted_items, data=data, page_size=10)
-
         buttons = [
             BotServiceMessageButton(
                 title=item['title'],
@@ -320,7 +511,7 @@ class BotService:
                     BotServiceMessageButton(
                         title='Назад',
                         callback_data=ShowItemsListCallbackData(
-                            i_t=data.i_t, i_f=None, page=data.page - 1
+                            i_t=data.i_t, i_f=data.i_f, page=data.page - 1
                         ),
                     )
                 )
@@ -330,7 +521,7 @@ class BotService:
                     BotServiceMessageButton(
                         title='Вперёд',
                         callback_data=ShowItemsListCallbackData(
-                            i_t=data.i_t, i_f=None, page=data.page + 1
+                            i_t=data.i_t, i_f=data.i_f, page=data.page + 1
                         ),
                     )
                 )
@@ -346,37 +537,26 @@ class BotService:
     def create_topic(
         self, data: CreateTopicCallbackData
     ) -> list[BotServiceMessage | BotServiceRegisterNextMessageHandler]:
-        def process_topic_name(message_text: str) -> list[BotServiceMessage]:
-            topic_id = self.topic_storage.add_topic(message_text)
-            return [
-                self.show_one_item(
-                    ShowOneItemCallbackData(
-                        i_t='T', page=data.page, i_f=None, i_id=topic_id
-                    )
-                )
-            ]
-
         return [
             BotServiceMessage(text='Введите название темы:'),
-            BotServiceRegisterNextMessageHandler(process_topic_name),
+            BotServiceRegisterNextMessageHandler(awaited_input=data),
         ]
 
-    def create_student(
-        self, data: CreateStudentCallbackData
+    def process_topic_name_input(
+        self, data: CreateTopicCallbackData, chat_id: int, message_text: str
     ) -> list[BotServiceMessage | BotServiceRegisterNextMessageHandler]:
-        def process_student_name_input(message_text: str) -> list[BotServiceMessage]:
-            student_name = ' '.join(
-                map(lambda word: word.capitalize(), message_text.strip().split())
-            )
-            student_id = self.student_storage.add_student(student_name)
-            return [
-                self.show_one_item(
-                    ShowOneItemCallbackData(
-                        i_t='S', page=data.page, i_f=None, i_id=student_id
-                    )
+        topic_id = self.topic_storage.add_topic(message_text)
+        return [
+            self.show_one_item(
+                ShowOneItemCallbackData(
+                    i_t='T', page=data.page, i_f=None, i_id=topic_id
                 )
-            ]
+            )
+        ]
 
+    def create_student(
+        self, data: CreateStudentCallbackData
+    ) -> list[BotServiceMessage | BotServiceRegisterNextMessageHandler]:
         return [
             BotServiceMessage(
                 text='Введите ФИО студента:',
@@ -389,35 +569,27 @@ class BotService:
                     ),
                 ],
             ),
-            BotServiceRegisterNextMessageHandler(process_student_name_input),
+            BotServiceRegisterNextMessageHandler(awaited_input=data),
         ]
 
-    def add_parent_id_to_student(
-        self, data: AddParentIdToStudentCallbackData, student_id: int
+    def process_new_student_name_input(
+        self, data: CreateStudentCallbackData, chat_id: int, message_text: str
     ) -> list[BotServiceMessage | BotServiceRegisterNextMessageHandler]:
-        def process_student_parent_id_input(
-            message_text: str,
-        ) -> list[BotServiceMessage]:
-            try:
-                parent_id = int(message_text)
-            except ValueError:
-                return [
-                    BotServiceMessage(text='Введите id родителя:'),
-                    BotServiceRegisterNextMessageHandler(
-                        process_student_parent_id_input
-                    ),
-                ]
-            self.student_storage.add_parent_id_to_student(
-                student_id=student_id, parent_id=parent_id
-            )
-            return [
-                self.show_one_item(
-                    ShowOneItemCallbackData(
-                        i_t='S', page=data.page, i_f=None, i_id=student_id
-                    )
+        student_name = ' '.join(
+            map(lambda word: word.capitalize(), message_text.strip().split())
+        )
+        student_id = self.student_storage.add_student(student_name)
+        return [
+            self.show_one_item(
+                ShowOneItemCallbackData(
+                    i_t='S', page=data.page, i_f=None, i_id=student_id
                 )
-            ]
+            )
+        ]
 
+    def add_parent_id_to_student(
+        self, data: AddParentIdToStudentCallbackData
+    ) -> list[BotServiceMessage | BotServiceRegisterNextMessageHandler]:
         return [
             BotServiceMessage(
                 text='Введите id родителя:',
@@ -430,30 +602,128 @@ class BotService:
                     )
                 ],
             ),
-            BotServiceRegisterNextMessageHandler(process_student_parent_id_input),
+            BotServiceRegisterNextMessageHandler(awaited_input=data),
+        ]
+
+    def process_student_parent_id_input(
+        self, data: AddParentIdToStudentCallbackData, chat_id: int, message_text: str
+    ) -> list[BotServiceMessage | BotServiceRegisterNextMessageHandler]:
+        try:
+            parent_id = int(message_text)
+        except ValueError:
+            return [
+                BotServiceMessage(text='Введите id родителя:'),
+                BotServiceRegisterNextMessageHandler(awaited_input=data),
+            ]
+        self.parent_history_cache.invalidate(
+            self.student_storage.get_parent_id(data.student_id)
+        )
+        self.student_storage.add_parent_id_to_student(
+            student_id=data.student_id, parent_id=parent_id
+        )
+        self.authorization_service.invalidate()
+        self.parent_history_cache.invalidate(parent_id)
+        return [
+            self.show_one_item(
+                ShowOneItemCallbackData(
+                    i_t='S', page=data.page, i_f=None, i_id=data.student_id
+                )
+            )
         ]
 
     def update_student_name(
         self, data: UpdateStudentNameCallbackData
     ) -> list[BotServiceMessage | BotServiceRegisterNextMessageHandler]:
-        def process_student_name_input(message_text: str) -> list[BotServiceMessage]:
-            self.student_storage.update_student_name(
-                student_id=data.student_id, student_name=message_text
-            )
-            return [
-                self.show_one_item(
-                    ShowOneItemCallbackData(
-                        i_t='S',
-                        page=data.page,
-                        i_f=None,
-                        i_id=data.student_id,
+        return [
+            BotServiceMessage(
+                text='Введите имя и фамилию:',
+                buttons=[
+                    BotServiceMessageButton(
+                        title='Назад',
+                        callback_data=ShowOneItemCallbackData(
+                            i_t='S', page=data.page, i_f=None, i_id=data.student_id
+                        ),
                     )
+                ],
+            ),
+            BotServiceRegisterNextMessageHandler(awaited_input=data),
+        ]
+
+    def process_student_name_input(
+        self, data: UpdateStudentNameCallbackData, chat_id: int, message_text: str
+    ) -> list[BotServiceMessage | BotServiceRegisterNextMessageHandler]:
+        self.student_storage.update_student_name(
+            student_id=data.student_id, student_name=message_text
+        )
+        self.parent_history_cache.invalidate(
+            self.student_storage.get_parent_id(data.student_id)
+        )
+        return [
+            self.show_one_item(
+                ShowOneItemCallbackData(
+                    i_t='S',
+                    page=data.page,
+                    i_f=None,
+                    i_id=data.student_id,
                 )
-            ]
+            )
+        ]
+
+    def show_debtors(self, data: ShowDebtorsCallbackData) -> BotServiceMessage:
+        formatted_items = [
+            FormattedPaginationItem(
+                title=f'{student.name} — {balance.debt}', id=student.student_id
+            )
+            for student, balance in self.payment_storage.list_debtors()
+        ]
 
+        pagination_result = paginate(
+            items=formatted_items, data=data, page_size=ITEMS_PAGE_SIZE
+        )
+
+        buttons = [
+            BotServiceMessageButton(
+                title=item['title'],
+                callback_data=ShowOneItemCallbackData(
+                    i_t='S', i_f=None, page=FIRST_PAGE, i_id=item['id']
+                ),
+            )
+            for item in pagination_result.items
+        ]
+
+        if not pagination_result.is_first_page:
+            buttons.append(
+                BotServiceMessageButton(
+                    title='Назад',
+                    callback_data=ShowDebtorsCallbackData(page=data.page - 1),
+                )
+            )
+
+        if not pagination_result.is_last_page:
+            buttons.append(
+                BotServiceMessageButton(
+                    title='Вперёд',
+                    callback_data=ShowDebtorsCallbackData(page=data.page + 1),
+                )
+            )
+
+        buttons.append(
+            BotServiceMessageButton(
+                title='В меню', callback_data=GoBackToAdminPanelCallbackData()
+            )
+        )
+
+        text = (
+            'Неоплаченные занятия:' if formatted_items else 'Неоплаченных занятий нет'
+        )
+        return BotServiceMessage(text=text, buttons=buttons, row_width=1)
+
+    def add_payment(
+        self, data: AddPaymentCallbackData
+    ) -> list[BotServiceMessage | BotServiceRegisterNextMessageHandler]:
         return [
             BotServiceMessage(
-                text='Введите имя и фамилию:',
+                text='Введите количество оплаченных занятий:',
                 buttons=[
                     BotServiceMessageButton(
                         title='Назад',
@@ -463,9 +733,98 @@ class BotService:
                     )
                 ],
             ),
-            BotServiceRegisterNextMessageHandler(process_student_name_input),
+            BotServiceRegisterNextMessageHandler(awaited_input=data),
+        ]
+
+    def process_payment_input(
+        self, data: AddPaymentCallbackData, chat_id: int, message_text: str
+    ) -> list[BotServiceMessage | BotServiceRegisterNextMessageHandler]:
+        try:
+            lessons_count = int(message_text)
+        except ValueError:
+            lessons_count = 0
+
+        if lessons_count <= 0:
+            return [
+                BotServiceMessage(text='Введите количество оплаченных занятий:'),
+                BotServiceRegisterNextMessageHandler(awaited_input=data),
+            ]
+
+        self.payment_storage.add_payment(
+            student_id=data.student_id, lessons_count=lessons_count
+        )
+        return [
+            self.show_one_item(
+                ShowOneItemCallbackData(
+                    i_t='S', page=data.page, i_f=None, i_id=data.student_id
+                )
+            )
         ]
 
+    def add_teacher(
+        self, data: AddTeacherCallbackData
+    ) -> list[BotServiceMessage | BotServiceRegisterNextMessageHandler]:
+        return [
+            BotServiceMessage(
+                text=(
+                    'Введите id преподавателя. Его можно узнать,'
+                    ' отправив боту команду /start:'
+                ),
+                buttons=[
+                    BotServiceMessageButton(
+                        title='Назад', callback_data=GoBackToAdminPanelCallbackData()
+                    )
+                ],
+            ),
+            BotServiceRegisterNextMessageHandler(awaited_input=data),
+        ]
+
+    def process_teacher_id_input(
+        self, data: AddTeacherCallbackData, chat_id: int, message_text: str
+    ) -> list[BotServiceMessage | BotServiceRegisterNextMessageHandler]:
+        try:
+            user_id = int(message_text)
+        except ValueError:
+            return [
+                BotServiceMessage(text='Введите id преподавателя:'),
+                BotServiceRegisterNextMessageHandler(awaited_input=data),
+            ]
+
+        if self.teacher_storage.add_teacher(user_id):
+            self.authorization_service.invalidate()
+            text = 'Преподаватель добавлен'
+        else:
+            text = 'Этот пользователь уже является преподавателем'
+        return [
+            BotServiceMessage(
+                text=text,
+                buttons=[
+                    BotServiceMessageButton(
+                        title='В меню', callback_data=GoBackToAdminPanelCallbackData()
+                    )
+                ],
+            )
+        ]
+
+    # The wizard starts over with the saved values, every step can be
+    # answered the same way or changed
+    def edit_report(
+        self, chat_id: int, data: EditReportCallbackData
+    ) -> BotServiceMessage:
+        report = self.report_storage.get_report_by_id(data.report_id)
+        if not isinstance(report, Report):
+            return BotServiceMessage(
+                text='Отчёт не найден или уже в архиве.',
+                buttons=[
+                    BotServiceMessageButton(
+                        title='В меню', callback_data=GoBackToAdminPanelCallbackData()
+                    )
+                ],
+            )
+
+        self.report_builder.load_report(chat_id, report)
+        return self.build_report_1_lesson_date_setting()
+
     def build_report_1_lesson_date_setting(self) -> BotServiceMessage:
         return BotServiceMessage(
             text='Выберите дату:',
@@ -493,13 +852,15 @@ class BotService:
         )
 
     def build_report_1_lesson_date_from_button(
-        self, lesson_day: str
+        self, chat_id: int, lesson_day: str
     ) -> list[BotServiceMessage | BotServiceRegisterNextMessageHandler]:
         if lesson_day == 'today':
             lesson_date = datetime.today()
         elif lesson_day == 'yesterday':
             lesson_date = datetime.today() - timedelta(days=1)
-        self.report_builder.set_lesson_date_1(lesson_date=lesson_date.date())
+        self.report_builder.set_lesson_date_1(
+            chat_id=chat_id, lesson_date=lesson_date.date()
+        )
         return [
             self.build_report_2_topic_setting(
                 data=ReportBuilderShowItemListCallbackData(i_t='T', page=1),
@@ -507,34 +868,8 @@ class BotService:
         ]
 
     def build_report_1_manual(
-        self,
+        self, data: ReportBuilder1EnterManuallyCallbackData
     ) -> list[BotServiceMessage | BotServiceRegisterNextMessageHandler]:
-        def process_lesson_date(
-            message_text: str,
-        ) -> list[BotServiceMessage | BotServiceRegisterNextMessageHandler]:
-            try:
-                lesson_date = datetime.strptime(message_text, '%d-%m-%Y')
-            except ValueError:
-                return [
-                    BotServiceMessage(
-                        text="Введите дату в корректном формате ('ДД-ММ-ГГГГ'):",
-                        buttons=[
-                            BotServiceMessageButton(
-                                title='В меню',
-                                callback_data=GoBackToAdminPanelCallbackData(),
-                            )
-                        ],
-                    ),
-                    BotServiceRegisterNextMessageHandler(process_lesson_date),
-                ]
-
-            self.report_builder.set_lesson_date_1(lesson_date=lesson_date)
-            return [
-                self.build_report_2_topic_setting(
-                    data=ReportBuilderShowItemListCallbackData(i_t='T', page=1),
-                )
-            ]
-
         return [
             BotServiceMessage(
                 text="Введите дату в формате ('ДД-ММ-ГГГГ'):",
@@ -544,7 +879,38 @@ class BotService:
                     )
                 ],
             ),
-            BotServiceRegisterNextMessageHandler(process_lesson_date),
+            BotServiceRegisterNextMessageHandler(awaited_input=data),
+        ]
+
+    def process_lesson_date_input(
+        self,
+        data: ReportBuilder1EnterManuallyCallbackData,
+        chat_id: int,
+        message_text: str,
+    ) -> list[BotServiceMessage | BotServiceRegisterNextMessageHandler]:
+        try:
+            lesson_date = datetime.strptime(message_text, '%d-%m-%Y')
+        except ValueError:
+            return [
+                BotServiceMessage(
+                    text="Введите дату в корректном формате ('ДД-ММ-ГГГГ'):",
+                    buttons=[
+                        BotServiceMessageButton(
+                            title='В меню',
+                            callback_data=GoBackToAdminPanelCallbackData(),
+                        )
+                    ],
+                ),
+                BotServiceRegisterNextMessageHandler(awaited_input=data),
+            ]
+
+        self.report_builder.set_lesson_date_1(
+            chat_id=chat_id, lesson_date=lesson_date.date()
+        )
+        return [
+            self.build_report_2_topic_setting(
+                data=ReportBuilderShowItemListCallbackData(i_t='T', page=1),
+            )
         ]
 
     def build_report_2_topic_setting(
@@ -556,7 +922,9 @@ class BotService:
             for topic in self.topic_storage.list_topics(order_by='topic')
         ]
 
-        pagination_result = paginate(items=formatted_items, data=data, page_size=10)
+        pagination_result = paginate(
+            items=formatted_items, data=data, page_size=ITEMS_PAGE_SIZE
+        )
 
         buttons = [
             BotServiceMessageButton(
@@ -605,7 +973,9 @@ class BotService:
             for student in self.student_storage.list_students(order_by='name')
         ]
 
-        pagination_result = paginate(items=formatted_items, data=data, page_size=10)
+        pagination_result = paginate(
+            items=formatted_items, data=data, page_size=ITEMS_PAGE_SIZE
+        )
 
         buttons = [
             BotServiceMessageButton(
@@ -729,12 +1099,8 @@ class BotService:
         )
 
     def build_report_8_get_comment(
-        self,
+        self, data: ReportBuilder8AddCommentQuestionCallbackData
     ) -> list[BotServiceMessage | BotServiceRegisterNextMessageHandler]:
-        def process_comment_input(message_text: str) -> BotServiceMessage:
-            self.report_builder.set_comment_8(message_text)
-            return [self.build_report_preview()]
-
         return [
             BotServiceMessage(
                 text='Введите комментарий:',
@@ -744,55 +1110,130 @@ class BotService:
                     ),
                 ],
             ),
-            BotServiceRegisterNextMessageHandler(callback=process_comment_input),
+            BotServiceRegisterNextMessageHandler(awaited_input=data),
+        ]
+
+    def process_comment_input(
+        self,
+        data: ReportBuilder8AddCommentQuestionCallbackData,
+        chat_id: int,
+        message_text: str,
+    ) -> list[BotServiceMessage | BotServiceRegisterNextMessageHandler]:
+        self.report_builder.set_comment_8(chat_id=chat_id, text=message_text)
+        return [self.build_report_preview(chat_id)]
+
+    def build_report_9_ask_attachment(
+        self, data: ReportBuilder9AddAttachmentCallbackData
+    ) -> list[BotServiceMessage | BotServiceRegisterNextMessageHandler]:
+        return [
+            BotServiceMessage(
+                text='Отправьте фото или файл. Можно несколько.',
+                buttons=self._build_attachment_input_buttons(),
+            ),
+            BotServiceRegisterNextMessageHandler(awaited_input=data),
+        ]
+
+    # `attachment` is None if the file was too large to download
+    def process_attachment_input(
+        self, chat_id: int, attachment: AttachmentData | None
+    ) -> list[BotServiceMessage | BotServiceRegisterNextMessageHandler]:
+        attachments = self.report_builder.get_temp_report(chat_id).attachments or []
+        if attachment is None:
+            text = 'Файл слишком большой, его не получится прикрепить.'
+        elif any(added.sha256 == attachment.sha256 for added in attachments):
+            text = 'Этот файл уже прикреплён.'
+        elif len(attachments) >= self.max_attachments_per_report:
+            text = f'К отчёту можно прикрепить не больше {self.max_attachments_per_report} файлов.'
+        else:
+            self.report_builder.add_attachment_9(chat_id, attachment)
+            text = f'Прикреплено файлов: {len(attachments) + 1}.'
+        return [
+            BotServiceMessage(
+                text=f'{text}\nОтправьте ещё или нажмите «Готово».',
+                buttons=self._build_attachment_input_buttons(),
+            ),
+            BotServiceRegisterNextMessageHandler(
+                awaited_input=ReportBuilder9AddAttachmentCallbackData()
+            ),
+        ]
+
+    def process_attachment_text_input(
+        self,
+        data: ReportBuilder9AddAttachmentCallbackData,
+        chat_id: int,
+        message_text: str,
+    ) -> list[BotServiceMessage | BotServiceRegisterNextMessageHandler]:
+        return [
+            BotServiceMessage(
+                text='Нужно отправить фото или файл, а не текст.',
+                buttons=self._build_attachment_input_buttons(),
+            ),
+            BotServiceRegisterNextMessageHandler(awaited_input=data),
+        ]
+
+    def _build_attachment_input_buttons(self) -> list[BotServiceMessageButton]:
+        return [
+            BotServiceMessageButton(
+                title='Готово',
+                callback_data=ReportBuilderShowReportPreviewCallbackData(),
+            ),
+            BotServiceMessageButton(
+                title='В меню', callback_data=GoBackToAdminPanelCallbackData()
+            ),
         ]
 
     def format_report_text(self, report: Report | ReportData) -> str:
-        topic = self.topic_storage.get_topic_by_id(report.topic_id)
-        student = self.student_storage.get_student_by_id(report.student_id)
-        text = '\n'.join(
-            (
-                f'ФИО: {student.name}',
-                f'Занятие № {report.lesson_count} от {report.lesson_date.strftime('%d-%m-%Y')}',
-                f'Тема: {topic.topic}',
-                f'Д/З: {FORMATTED_HOMEWORK_STATUS_MAP[report.homework_status]}',
-                f'Активность на занятии {"высокая" if report.is_proactive else "слабая"}',
-                f'Занятие {"оплачено" if report.is_paid else "не оплачено"}',
-            )
+        topic = self.topic_storage.get_topic_by_id(
+            report.topic_id, include_deleted=True
+        )
+        student = self.student_storage.get_student_by_id(
+            report.student_id, include_deleted=True
+        )
+        return render_report(
+            report, student_name=student.name, topic=topic.topic if topic else None
         )
-        if report.comment is not None:
-            text += f'\nКомментарий:\n{report.comment}'
-
-        return text
 
-    def build_report_preview(self) -> BotServiceMessage:
-        report = self.report_builder.preview_complete_report()
-        if parent_id := self.student_storage.get_parent_id(
-            student_id=report.student_id
-        ):
+    def build_report_preview(self, chat_id: int) -> BotServiceMessage:
+        report = self.report_builder.preview_complete_report(chat_id)
+        temp_report = self.report_builder.get_temp_report(chat_id)
+        parent_id = self.student_storage.get_parent_id(student_id=report.student_id)
+        if temp_report.editing_report_id:
+            button_send_and_save_title = 'Сохранить изменения'
+        elif parent_id:
             button_send_and_save_title = 'Сохранить и отправить отчёт'
         else:
             button_send_and_save_title = 'Сохранить отчёт'
 
         text = self.format_report_text(report)
-        return BotServiceMessage(
-            text=text,
-            buttons=[
-                BotServiceMessageButton(
-                    title='В меню', callback_data=GoBackToAdminPanelCallbackData()
-                ),
-                BotServiceMessageButton(
-                    title='Новый отчёт', callback_data=ReportBuilder1CallbackData()
-                ),
+        if temp_report.attachments:
+            text += f'\n\nПрикреплено файлов: {len(temp_report.attachments)}'
+        buttons = [
+            BotServiceMessageButton(
+                title='В меню', callback_data=GoBackToAdminPanelCallbackData()
+            ),
+            BotServiceMessageButton(
+                title='Новый отчёт', callback_data=ReportBuilder1CallbackData()
+            ),
+            BotServiceMessageButton(
+                title=button_send_and_save_title,
+                callback_data=SaveConfirmedReportCallbackData(parent_id=parent_id),
+            ),
+        ]
+        # The parent's copy of a corrected report is edited in place, so files
+        # can only be attached to a new report
+        if not temp_report.editing_report_id:
+            buttons.insert(
+                2,
                 BotServiceMessageButton(
-                    title=button_send_and_save_title,
-                    callback_data=SaveConfirmedReportCallbackData(parent_id=parent_id),
+                    title='Прикрепить фото',
+                    callback_data=ReportBuilder9AddAttachmentCallbackData(),
                 ),
-            ],
-        )
+            )
+        return BotServiceMessage(text=text, buttons=buttons)
 
-    def save_report(self) -> tuple[int, ReportData]:
-        complete_report = self.report_builder.complete_report()
+    def save_report(self, chat_id: int) -> tuple[int, ReportData]:
+        attachments = self.report_builder.get_temp_report(chat_id).attachments
+        complete_report = self.report_builder.complete_report(chat_id)
         instance = Report(
             lesson_date=complete_report.lesson_date,
             lesson_count=complete_report.lesson_count,
@@ -806,33 +1247,156 @@ class BotService:
         )
 
         report_id = self.report_storage.add_report(instance)
+        if attachments:
+            self.attachment_storage.add_attachments(report_id, attachments)
+        self.parent_history_cache.invalidate(
+            self.student_storage.get_parent_id(complete_report.student_id)
+        )
         return report_id, complete_report
 
+    # Returns None if the report is gone, e.g. archived meanwhile
+    def save_edited_report(self, chat_id: int) -> tuple[Report | None, ReportData]:
+        report_id = self.report_builder.get_temp_report(chat_id).editing_report_id
+        complete_report = self.report_builder.complete_report(chat_id)
+        if (previous_report := self.report_storage.get_report_by_id(report_id)) is None:
+            return None, complete_report
+        previous_student_id = previous_report.student_id
+
+        report = self.report_storage.update_report(report_id, complete_report)
+        if report is not None:
+            for student_id in {previous_student_id, report.student_id}:
+                self.parent_history_cache.invalidate(
+                    self.student_storage.get_parent_id(student_id)
+                )
+        return report, complete_report
+
+    def get_message_report_updated(self, is_parent_notified: bool) -> BotServiceMessage:
+        if is_parent_notified:
+            text = 'Отчёт исправлен, родитель видит новую версию ✅️'
+        else:
+            text = 'Отчёт исправлен ✅️'
+        return BotServiceMessage(text=text, buttons=[])
+
+    def get_message_report_not_found(self) -> BotServiceMessage:
+        return BotServiceMessage(text='Отчёт не найден ❌', buttons=[])
+
     def get_message_report_successfully_sent(self) -> BotServiceMessage:
         return BotServiceMessage(text='Отчёт успешно отправлен ✅️', buttons=[])
 
+    def get_message_report_queued(self) -> BotServiceMessage:
+        return BotServiceMessage(
+            text='Telegram сейчас недоступен ⏳\nОтчёт будет отправлен автоматически.',
+            buttons=[],
+        )
+
     def get_message_report_unsuccessfully_sent(self) -> BotServiceMessage:
         return BotServiceMessage(
             text='Отчёт не был отправлен ❌.\nПроверьте id родителя.',
             buttons=[],
         )
 
-    def build_report_message(self, complete_report: ReportData) -> BotServiceMessage:
+    # Attachments are only sent with a report given by id
+    def build_report_message(
+        self, complete_report: ReportData, report_id: int | None = None
+    ) -> BotServiceMessage:
         text = self.format_report_text(complete_report)
-        return BotServiceMessage(text=text, buttons=[])
+        return BotServiceMessage(
+            text=text,
+            buttons=[],
+            attachment_ids=self.attachment_storage.list_attachment_ids(report_id)
+            if report_id is not None
+            else [],
+        )
+
+    # Sent when the parent's original message can't be edited
+    def build_report_correction_message(
+        self, complete_report: ReportData
+    ) -> BotServiceMessage:
+        text = self.format_report_text(complete_report)
+        return BotServiceMessage(text=f'Исправление к отчёту:\n\n{text}', buttons=[])
 
     def send_saved_reports(self) -> list[tuple[BotServiceMessage, int, int]]:
-        result = []
-        for report in self.report_storage.get_saved_reports():
-            if parent_id := self.student_storage.get_parent_id(report.student_id):
-                result += [
-                    (
-                        BotServiceMessage(text=self.format_report_text(report)),
-                        report.report_id,
-                        parent_id,
-                    )
-                ]
-        return result
+        report_rows = self.report_storage.list_saved_report_rows()
+        attachment_ids = self.attachment_storage.list_attachment_ids_by_report_ids(
+            [report_row.report_id for report_row in report_rows]
+        )
+        return [
+            (
+                BotServiceMessage(
+                    text=text,
+                    attachment_ids=attachment_ids.get(report_row.report_id, []),
+                ),
+                report_row.report_id,
+                report_row.parent_id,
+            )
+            for report_row, text in zip(report_rows, render_reports(report_rows))
+        ]
+
+    def build_progress_message(self, text: str) -> BotServiceMessage:
+        return BotServiceMessage(text=text)
+
+    def get_saved_reports_sent_notice(
+        self, sent_count: int, total: int, queued_count: int = 0
+    ) -> str:
+        notice = f'Отправлено отчётов: {sent_count} из {total}'
+        if queued_count:
+            notice += f'\nЕщё {queued_count} будут отправлены, когда Telegram станет доступен.'
+        if sent_count + queued_count < total:
+            notice += '\nНекоторые родители не найдены. Проверьте id.'
+        return notice
 
     def get_error_message_temp_report_must_be_filled(self) -> BotServiceMessage:
         return BotServiceMessage(text='Отчёт не полный. Создайте с самого начала.')
+
+    def build_monthly_digest_message(
+        self,
+        summaries: list[MonthlySummary],
+        period_start: date,
+        chart_student_ids: list[int] | None = None,
+    ) -> BotServiceMessage:
+        return BotServiceMessage(
+            text=render_monthly_digest(summaries, period_start),
+            buttons=[],
+            chart_student_ids=chart_student_ids or [],
+        )
+
+    def backup_started(self) -> BotServiceMessage:
+        return BotServiceMessage(text='Создаю резервную копию...')
+
+    def backup_finished(self, result: BackupResult | None) -> BotServiceMessage:
+        if result is None:
+            text = 'Резервная копия уже создаётся, дождитесь её завершения.'
+        else:
+            text = (
+                f'Резервная копия создана: `{result.path.name}`\n'
+                f'Размер: {result.size_bytes / 1024 / 1024:.1f} МБ\n'
+                f'Время: {result.duration_seconds:.1f} с'
+            )
+        return BotServiceMessage(
+            text=text,
+            buttons=[
+                BotServiceMessageButton(
+                    title='В меню', callback_data=GoBackToAdminPanelCallbackData()
+                )
+            ],
+        )
+
+    def process_text_input(
+        self, awaited_input: AnyCallbackData, chat_id: int, message_text: str
+    ) -> list[BotServiceMessage | BotServiceRegisterNextMessageHandler]:
+        handler = TEXT_INPUT_HANDLERS[type(awaited_input)]
+        return handler(self, awaited_input, chat_id, message_text)
+
+
+# Text typed by the user is handled according to the button that asked for it
+TEXT_INPUT_HANDLERS = {
+    CreateTopicCallbackData: BotService.process_topic_name_input,
+    CreateStudentCallbackData: BotService.process_new_student_name_input,
+    AddParentIdToStudentCallbackData: BotService.process_student_parent_id_input,
+    UpdateStudentNameCallbackData: BotService.process_student_name_input,
+    AddPaymentCallbackData: BotService.process_payment_input,
+    AddTeacherCallbackData: BotService.process_teacher_id_input,
+    ReportBuilder1EnterManuallyCallbackData: BotService.process_lesson_date_input,
+    ReportBuilder8AddCommentQuestionCallbackData: BotService.process_comment_input,
+    ReportBuilder9AddAttachmentCallbackData: BotService.process_attachment_text_input,
+}
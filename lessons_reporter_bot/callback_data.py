@@ -38,6 +38,17 @@ class UpdateStudentNameCallbackData(pydantic.BaseModel):
     page: int
 
 
+class ShowDebtorsCallbackData(pydantic.BaseModel):
+    type: Literal['show_debtors'] = 'show_debtors'
+    page: int
+
+
+class AddPaymentCallbackData(pydantic.BaseModel):
+    type: Literal['add_payment'] = 'add_payment'
+    student_id: int
+    page: int
+
+
 # Report builder's callback's
 
 
@@ -95,10 +106,19 @@ class ReportBuilder8AddCommentQuestionCallbackData(pydantic.BaseModel):
     type: Literal['rb_8'] = 'rb_8'
 
 
+class ReportBuilder9AddAttachmentCallbackData(pydantic.BaseModel):
+    type: Literal['rb_9'] = 'rb_9'
+
+
 class ReportBuilderShowReportPreviewCallbackData(pydantic.BaseModel):
     type: Literal['show_preview_report'] = 'show_preview_report'
 
 
+class EditReportCallbackData(pydantic.BaseModel):
+    type: Literal['edit_report'] = 'edit_report'
+    report_id: int
+
+
 class SaveConfirmedReportCallbackData(pydantic.BaseModel):
     type: Literal['save_report'] = 'save_report'
     parent_id: int | None
@@ -137,6 +157,24 @@ class SendSavedReportsCallbackData(pydantic.BaseModel):
     type: Literal['send_saved_reports'] = 'send_saved_reports'
 
 
+class AddTeacherCallbackData(pydantic.BaseModel):
+    type: Literal['add_teacher'] = 'add_teacher'
+
+
+# Shown to teachers and to the student's parent
+class ShowStudentChartCallbackData(pydantic.BaseModel):
+    type: Literal['student_chart'] = 'student_chart'
+    student_id: int
+    page: int
+
+
+# Parent's callback's
+class ShowParentReportsCallbackData(pydantic.BaseModel):
+    type: Literal['parent_reports'] = 'parent_reports'
+    student_id: int
+    page: int
+
+
 #  Go back callback
 class GoBackToAdminPanelCallbackData(pydantic.BaseModel):
     type: Literal['back_to_admin_panel'] = 'back_to_admin_panel'
@@ -149,6 +187,14 @@ AnyCallbackData = (
     | CreateStudentCallbackData
     | AddParentIdToStudentCallbackData
     | UpdateStudentNameCallbackData
+    # Payment callback's
+    | ShowDebtorsCallbackData
+    | AddPaymentCallbackData
+    # Teacher's callback's
+    | AddTeacherCallbackData
+    | ShowStudentChartCallbackData
+    # Parent's callback's
+    | ShowParentReportsCallbackData
     # Report builder's callback's
     | ReportBuilderShowItemListCallbackData
     | ReportBuilderChooseItemListCallbackData
@@ -161,8 +207,10 @@ AnyCallbackData = (
     | ReportBuilder6SetIsProactiveCallbackData
     | ReportBuilder7SetIsPaidCallbackData
     | ReportBuilder8AddCommentQuestionCallbackData
+    | ReportBuilder9AddAttachmentCallbackData
     | ReportBuilderShowReportPreviewCallbackData
     | SaveConfirmedReportCallbackData
+    | EditReportCallbackData
     # Show list, show one, delete, delete with confirmation
     | ShowItemsListCallbackData
     | ShowOneItemCallbackData
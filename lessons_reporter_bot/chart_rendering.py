@@ -0,0 +1,169 @@
+import hashlib
+import struct
+import zlib
+from dataclasses import astuple, dataclass
+
+# Only the standard library is imported here, chart worker processes start
+# with this module alone
+
+# Part of every chart version, bumped when charts are drawn differently
+CHART_STYLE_VERSION = 1
+MAX_CHART_MONTHS = 12
+
+WIDTH = 800
+HEIGHT = 400
+MARGIN = 20
+# Homework and activity shares on top, the number of lessons below
+SHARES_AREA_HEIGHT = 250
+COUNTS_AREA_TOP = MARGIN + SHARES_AREA_HEIGHT + 20
+COUNTS_AREA_HEIGHT = HEIGHT - MARGIN - COUNTS_AREA_TOP
+
+BACKGROUND_COLOR = (255, 255, 255)
+GRID_COLOR = (230, 230, 230)
+AXIS_COLOR = (120, 120, 120)
+HOMEWORK_COLOR = (76, 175, 80)
+PROACTIVE_COLOR = (33, 150, 243)
+LESSONS_COLOR = (176, 176, 176)
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+@dataclass(frozen=True, slots=True)
+class MonthProgress:
+    year: int
+    month: int
+    lessons_count: int = 0
+    homework_done_count: int = 0
+    homework_partial_count: int = 0
+    proactive_count: int = 0
+
+    # Partly done homework counts as half
+    @property
+    def homework_share(self) -> float:
+        if not self.lessons_count:
+            return 0
+        return (
+            self.homework_done_count + self.homework_partial_count / 2
+        ) / self.lessons_count
+
+    @property
+    def proactive_share(self) -> float:
+        if not self.lessons_count:
+            return 0
+        return self.proactive_count / self.lessons_count
+
+
+# The last months up to the latest one with lessons, months without lessons
+# included
+def fill_months(months: list[MonthProgress]) -> list[MonthProgress]:
+    if not months:
+        return []
+    by_month = {(month.year, month.month): month for month in months}
+    year, month = max(by_month)
+    filled = []
+    for _ in range(MAX_CHART_MONTHS):
+        filled.append(by_month.get((year, month), MonthProgress(year, month)))
+        if (year, month) <= min(by_month):
+            break
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return filled[::-1]
+
+
+# Same data, same version: a chart is only rendered again once it changes
+def chart_version(months: list[MonthProgress]) -> str:
+    digest = hashlib.sha256(str(CHART_STYLE_VERSION).encode())
+    for month in fill_months(months):
+        digest.update(repr(astuple(month)).encode())
+    return digest.hexdigest()[:32]
+
+
+class Canvas:
+    def __init__(self, width: int, height: int, color: tuple[int, int, int]) -> None:
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(bytes(color) * width * height)
+
+    def fill_rect(
+        self, left: int, top: int, right: int, bottom: int, color: tuple[int, int, int]
+    ) -> None:
+        left, right = max(left, 0), min(right, self.width)
+        top, bottom = max(top, 0), min(bottom, self.height)
+        if left >= right:
+            return
+        row = bytes(color) * (right - left)
+        for y in range(top, bottom):
+            start = (y * self.width + left) * 3
+            self.pixels[start : start + len(row)] = row
+
+    def to_png(self) -> bytes:
+        stride = self.width * 3
+        # Every row starts with filter type 0, the bytes are stored as is
+        raw = b''.join(
+            b'\x00' + self.pixels[y * stride : (y + 1) * stride]
+            for y in range(self.height)
+        )
+        header = struct.pack('>IIBBBBB', self.width, self.height, 8, 2, 0, 0, 0)
+        return (
+            PNG_SIGNATURE
+            + png_chunk(b'IHDR', header)
+            + png_chunk(b'IDAT', zlib.compress(raw, 9))
+            + png_chunk(b'IEND', b'')
+        )
+
+
+def png_chunk(kind: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack('>I', len(data))
+        + kind
+        + data
+        + struct.pack('>I', zlib.crc32(kind + data))
+    )
+
+
+# One group of bars per month: homework and activity as shares of the
+# month's lessons, and the number of lessons below them. Legend and numbers
+# go into the message caption.
+def render_progress_chart(months: list[MonthProgress]) -> bytes:
+    canvas = Canvas(WIDTH, HEIGHT, BACKGROUND_COLOR)
+    plot_width = WIDTH - 2 * MARGIN
+    shares_bottom = MARGIN + SHARES_AREA_HEIGHT
+    counts_bottom = COUNTS_AREA_TOP + COUNTS_AREA_HEIGHT
+
+    for quarter in range(1, 5):
+        y = shares_bottom - SHARES_AREA_HEIGHT * quarter // 4
+        canvas.fill_rect(MARGIN, y, WIDTH - MARGIN, y + 1, GRID_COLOR)
+
+    filled_months = fill_months(months)
+    max_lessons_count = max((month.lessons_count for month in filled_months), default=0)
+    slot_width = plot_width // max(len(filled_months), 1)
+    bar_width = max(slot_width * 3 // 8, 1)
+    for index, month in enumerate(filled_months):
+        left = MARGIN + index * slot_width + (slot_width - 2 * bar_width) // 2
+        for offset, share, color in (
+            (0, month.homework_share, HOMEWORK_COLOR),
+            (bar_width, month.proactive_share, PROACTIVE_COLOR),
+        ):
+            canvas.fill_rect(
+                left + offset,
+                shares_bottom - round(SHARES_AREA_HEIGHT * share),
+                left + offset + bar_width,
+                shares_bottom,
+                color,
+            )
+        if max_lessons_count:
+            canvas.fill_rect(
+                left,
+                counts_bottom
+                - round(COUNTS_AREA_HEIGHT * month.lessons_count / max_lessons_count),
+                left + 2 * bar_width,
+                counts_bottom,
+                LESSONS_COLOR,
+            )
+
+    canvas.fill_rect(
+        MARGIN, shares_bottom, WIDTH - MARGIN, shares_bottom + 2, AXIS_COLOR
+    )
+    canvas.fill_rect(
+        MARGIN, counts_bottom, WIDTH - MARGIN, counts_bottom + 2, AXIS_COLOR
+    )
+    return canvas.to_png()
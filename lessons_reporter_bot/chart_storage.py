@@ -0,0 +1,52 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlmodel import select, update
+
+from lessons_reporter_bot.database import unit_of_work
+from lessons_reporter_bot.models import Student, StudentChart
+
+
+class ChartStorage:
+    def __init__(self, engine) -> None:
+        self.engine = engine
+
+    # Charts aren't tenant rows, they're found through the student so that
+    # only the current teacher's students are seen
+    def get_chart(self, student_id: int) -> Optional[StudentChart]:
+        with unit_of_work(self.engine) as session:
+            statement = (
+                select(StudentChart)
+                .join(Student, Student.student_id == StudentChart.student_id)
+                .where(StudentChart.student_id == student_id)
+            )
+            return session.exec(statement).first()
+
+    def save_chart(self, student_id: int, version: str) -> None:
+        with unit_of_work(self.engine) as session:
+            if chart := session.get(StudentChart, student_id):
+                chart.version = version
+                chart.rendered_at = datetime.now()
+                chart.telegram_file_id = None
+            else:
+                session.add(
+                    StudentChart(
+                        student_id=student_id,
+                        version=version,
+                        rendered_at=datetime.now(),
+                    )
+                )
+
+    # Ignored if the chart was rendered again since it was uploaded
+    def set_telegram_file_id(
+        self, student_id: int, version: str, telegram_file_id: str
+    ) -> None:
+        with unit_of_work(self.engine) as session:
+            session.exec(
+                update(StudentChart)
+                .where(
+                    StudentChart.student_id == student_id,
+                    StudentChart.version == version,
+                )
+                .values(telegram_file_id=telegram_file_id)
+            )
@@ -0,0 +1,87 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+
+from lessons_reporter_bot.chart_rendering import (
+    MonthProgress,
+    chart_version,
+    render_progress_chart,
+)
+from lessons_reporter_bot.chart_storage import ChartStorage
+from lessons_reporter_bot.report_storage import ReportStorage
+
+
+# Charts are rendered in worker processes, so drawing them takes neither the
+# GIL from the handlers nor more than one core per chart. A chart is only
+# rendered again once its data changes, until then Telegram sends it again
+# by its cached file_id.
+class ProgressCharts:
+    def __init__(
+        self,
+        report_storage: ReportStorage,
+        chart_storage: ChartStorage,
+        directory: str | os.PathLike,
+        workers: int | None = None,
+    ) -> None:
+        self.report_storage = report_storage
+        self.chart_storage = chart_storage
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.workers = workers
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def chart_path(self, student_id: int) -> Path:
+        return self.directory / f'{student_id}.png'
+
+    # Returns the data of every student that has a chart to send. Missing
+    # charts are all submitted before any is waited for, so they are rendered
+    # in parallel.
+    def prepare_charts(self, student_ids: list[int]) -> dict[int, list[MonthProgress]]:
+        months_by_student_id = {}
+        pending: dict[int, tuple[str, Future[bytes]]] = {}
+        for student_id in student_ids:
+            if not (months := self.report_storage.monthly_progress(student_id)):
+                continue
+            months_by_student_id[student_id] = months
+            version = chart_version(months)
+            chart = self.chart_storage.get_chart(student_id)
+            if (
+                chart is None
+                or chart.version != version
+                or not (chart.telegram_file_id or self.chart_path(student_id).exists())
+            ):
+                pending[student_id] = (
+                    version,
+                    self._get_executor().submit(render_progress_chart, months),
+                )
+
+        for student_id, (version, future) in pending.items():
+            self._write_chart(student_id, future.result())
+            self.chart_storage.save_chart(student_id, version)
+        return months_by_student_id
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Forking a process with running threads may copy held locks
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+            return self._executor
+
+    def _write_chart(self, student_id: int, png: bytes) -> None:
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(file_descriptor, 'wb') as temp_file:
+            temp_file.write(png)
+        os.replace(temp_path, self.chart_path(student_id))
@@ -0,0 +1,107 @@
+import json
+import logging
+import threading
+from collections import deque
+from typing import Callable
+
+from lessons_reporter_bot.callback_data import (
+    GoBackToAdminPanelCallbackData,
+    ReportBuilderShowItemListCallbackData,
+    ShowDebtorsCallbackData,
+    ShowItemsListCallbackData,
+    ShowOneItemCallbackData,
+    ShowParentReportsCallbackData,
+    ShowStudentChartCallbackData,
+)
+
+logger = logging.getLogger(__name__)
+
+# Callbacks that only render a screen. When several of them are waiting for
+# the same chat, only the latest one is worth rendering. Anything that
+# changes data is never skipped.
+NAVIGATION_CALLBACK_TYPES = frozenset(
+    callback_data_type.model_fields['type'].default
+    for callback_data_type in (
+        GoBackToAdminPanelCallbackData,
+        ReportBuilderShowItemListCallbackData,
+        ShowDebtorsCallbackData,
+        ShowItemsListCallbackData,
+        ShowOneItemCallbackData,
+        ShowParentReportsCallbackData,
+        ShowStudentChartCallbackData,
+    )
+)
+
+
+def is_navigation_payload(payload: str | None) -> bool:
+    try:
+        return json.loads(payload)['type'] in NAVIGATION_CALLBACK_TYPES
+    except (TypeError, ValueError, KeyError):
+        return False
+
+
+# Used when handlers run in a thread pool: updates of one chat are handled
+# one at a time, in order. An update that arrives while its chat is busy is
+# queued and the thread handling the chat runs it next, so a chat never holds
+# more than one thread. A queued navigation callback is dropped once a newer
+# one is queued behind it.
+class NavigationCoalescer:
+    def __init__(self) -> None:
+        self._queues: dict[int, deque[tuple[bool, Callable[[], None]]]] = {}
+        self._lock = threading.Lock()
+
+    def run(
+        self, chat_id: int, payload: str | None, handler: Callable[[], None]
+    ) -> None:
+        is_navigation = is_navigation_payload(payload)
+        with self._lock:
+            if (queue := self._queues.get(chat_id)) is not None:
+                if is_navigation:
+                    self._queues[chat_id] = deque(
+                        entry for entry in queue if not entry[0]
+                    )
+                self._queues[chat_id].append((is_navigation, handler))
+                return
+            self._queues[chat_id] = deque()
+
+        try:
+            handler()
+        finally:
+            self._run_queued(chat_id)
+
+    # Queued updates were already handed over by their own threads, their
+    # errors are only printed
+    def _run_queued(self, chat_id: int) -> None:
+        while True:
+            with self._lock:
+                if not (queue := self._queues[chat_id]):
+                    del self._queues[chat_id]
+                    return
+                _, handler = queue.popleft()
+            try:
+                handler()
+            except Exception:
+                logger.exception('Failed to handle an update of chat %s', chat_id)
+
+
+def get_update_callback_payload(update: dict) -> str | None:
+    return (update.get('callback_query') or {}).get('data')
+
+
+# Used by worker processes on the updates already waiting in their queue:
+# a navigation callback is dropped when the next update of the same chat is
+# a navigation callback too
+def coalesce_updates(
+    updates: list[dict], get_chat_id: Callable[[dict], int | None]
+) -> tuple[list[dict], list[dict]]:
+    kept, dropped = [], []
+    next_is_navigation: dict[int | None, bool] = {}
+    for update in reversed(updates):
+        chat_id = get_chat_id(update)
+        is_navigation = is_navigation_payload(get_update_callback_payload(update))
+        if is_navigation and next_is_navigation.get(chat_id, False):
+            dropped.append(update)
+        else:
+            kept.append(update)
+        next_is_navigation[chat_id] = is_navigation
+    return kept[::-1], dropped[::-1]
@@ -0,0 +1,156 @@
+import hashlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+
+from sqlalchemy import Engine, event, inspect, make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateColumn
+from sqlmodel import Session, SQLModel, create_engine
+
+from lessons_reporter_bot.models import SchemaVersion
+from lessons_reporter_bot.settings import Settings
+from lessons_reporter_bot.tenancy import TenantSession
+
+
+def is_sqlite_url(database_url: str) -> bool:
+    return make_url(database_url).get_backend_name() == 'sqlite'
+
+
+def is_sqlite_memory_url(database_url: str) -> bool:
+    url = make_url(database_url)
+    return is_sqlite_url(database_url) and url.database in (None, '', ':memory:')
+
+
+def create_database_engine(settings: Settings) -> Engine:
+    engine_kwargs: dict[str, Any] = {
+        'pool_pre_ping': settings.database_pool_pre_ping,
+        'pool_recycle': settings.database_pool_recycle,
+    }
+    if not is_sqlite_memory_url(settings.database_url):
+        engine_kwargs['pool_size'] = settings.database_pool_size
+        engine_kwargs['max_overflow'] = settings.database_max_overflow
+
+    engine = create_engine(settings.database_url, **engine_kwargs)
+
+    if is_sqlite_url(settings.database_url):
+        set_sqlite_pragmas_on_connect(engine, settings)
+
+    return engine
+
+
+def set_sqlite_pragmas_on_connect(engine: Engine, settings: Settings) -> None:
+    pragmas = (
+        f'PRAGMA journal_mode={settings.sqlite_journal_mode}',
+        f'PRAGMA synchronous={settings.sqlite_synchronous}',
+        f'PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}',
+        f'PRAGMA mmap_size={settings.sqlite_mmap_size}',
+        # Negative value is interpreted by SQLite as KiB instead of pages
+        f'PRAGMA cache_size=-{settings.sqlite_cache_size_kib}',
+    )
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+_current_session: ContextVar[Session | None] = ContextVar(
+    'current_session', default=None
+)
+
+
+# The outermost scope owns the session and commits it on exit. Nested scopes
+# in the same context reuse it and only flush, so generated ids are available.
+# Nothing is sent to Telegram inside a scope, a write would hold the SQLite
+# lock for the whole round-trip.
+@contextmanager
+def unit_of_work(engine: Engine) -> Iterator[Session]:
+    if (session := _current_session.get()) is not None:
+        yield session
+        session.flush()
+        return
+
+    with TenantSession(engine, expire_on_commit=False) as session:
+        token = _current_session.set(session)
+        try:
+            yield session
+            session.commit()
+        except BaseException:
+            session.rollback()
+            raise
+        finally:
+            _current_session.reset(token)
+
+
+def get_schema_fingerprint() -> str:
+    parts = []
+    for table in sorted(SQLModel.metadata.tables.values(), key=lambda t: t.name):
+        parts.append(table.name)
+        parts.extend(
+            f'{column.name}:{column.type}:{column.nullable}:{column.primary_key}'
+            for column in table.columns
+        )
+        parts.extend(sorted(index.name for index in table.indexes))
+    return hashlib.sha1('\n'.join(parts).encode()).hexdigest()
+
+
+# Only columns that are nullable or have a server default can be added this way
+def add_missing_columns(engine: Engine) -> None:
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in SQLModel.metadata.sorted_tables:
+            existing_columns = {
+                column['name'] for column in inspector.get_columns(table.name)
+            }
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                connection.exec_driver_sql(
+                    f'ALTER TABLE {table.name} ADD COLUMN {column_ddl}'
+                )
+
+
+# Indexes renamed or removed in the models are dropped, so writes stop
+# maintaining them
+def drop_undeclared_indexes(engine: Engine) -> None:
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in SQLModel.metadata.sorted_tables:
+            declared_names = {index.name for index in table.indexes}
+            for index in inspector.get_indexes(table.name):
+                if index['name'].startswith('ix_') and (
+                    index['name'] not in declared_names
+                ):
+                    connection.exec_driver_sql(f'DROP INDEX {index["name"]}')
+
+
+# Reflecting every table on each boot is skipped while the stored fingerprint
+# matches the models
+def ensure_schema(engine: Engine) -> bool:
+    fingerprint = get_schema_fingerprint()
+    try:
+        with Session(engine) as session:
+            schema_version = session.get(SchemaVersion, 1)
+    except DBAPIError:
+        schema_version = None
+
+    if schema_version is not None and schema_version.fingerprint == fingerprint:
+        return False
+
+    SQLModel.metadata.create_all(engine)
+    # `create_all` skips columns and indexes of tables that already exist
+    add_missing_columns(engine)
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    drop_undeclared_indexes(engine)
+    with Session(engine) as session:
+        session.merge(SchemaVersion(schema_version_id=1, fingerprint=fingerprint))
+        session.commit()
+    return True
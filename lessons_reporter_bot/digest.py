@@ -0,0 +1,97 @@
+import threading
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Callable
+
+from lessons_reporter_bot.bot_service import BotService
+from lessons_reporter_bot.charts import ProgressCharts
+from lessons_reporter_bot.job_storage import JobStorage
+from lessons_reporter_bot.models import MonthlySummary
+from lessons_reporter_bot.report_storage import ReportStorage
+from lessons_reporter_bot.sender import RateLimitedSender
+
+MONTHLY_DIGEST_JOB_NAME = 'monthly_digest'
+
+
+class MonthlyDigestScheduler:
+    def __init__(
+        self,
+        bot_service: BotService,
+        report_storage: ReportStorage,
+        job_storage: JobStorage,
+        sender: RateLimitedSender,
+        progress_charts: ProgressCharts,
+        day_of_month: int,
+        at: time,
+        clock: Callable[[], datetime] = datetime.now,
+    ) -> None:
+        self.bot_service = bot_service
+        self.report_storage = report_storage
+        self.job_storage = job_storage
+        self.sender = sender
+        self.progress_charts = progress_charts
+        self.day_of_month = day_of_month
+        self.at = at
+        self.clock = clock
+
+    def due_period(self) -> tuple[date, date] | None:
+        now = self.clock()
+        scheduled_at = datetime.combine(
+            now.date().replace(day=self.day_of_month), self.at
+        )
+        if now < scheduled_at:
+            return None
+
+        # The digest sent this month covers the whole previous month
+        period_end = now.date().replace(day=1)
+        period_start = (period_end - timedelta(days=1)).replace(day=1)
+        if self.job_storage.get_last_period(MONTHLY_DIGEST_JOB_NAME) == (
+            period_start.isoformat()
+        ):
+            return None
+        return period_start, period_end
+
+    def run_pending(self) -> int:
+        if (period := self.due_period()) is None:
+            return 0
+
+        period_start, period_end = period
+        summaries = self.report_storage.monthly_summaries(
+            start=period_start, end=period_end
+        )
+        summaries_by_parent_id: dict[int, list[MonthlySummary]] = defaultdict(list)
+        for summary in summaries:
+            summaries_by_parent_id[summary.parent_id].append(summary)
+        # Rendered for all students at once, across all chart workers
+        charted_student_ids = self.progress_charts.prepare_charts(
+            [summary.student_id for summary in summaries]
+        )
+
+        for parent_id, parent_summaries in summaries_by_parent_id.items():
+            self.sender.enqueue(
+                parent_id,
+                self.bot_service.build_monthly_digest_message(
+                    parent_summaries,
+                    period_start,
+                    chart_student_ids=[
+                        summary.student_id
+                        for summary in parent_summaries
+                        if summary.student_id in charted_student_ids
+                    ],
+                ),
+            )
+
+        self.job_storage.set_last_period(
+            MONTHLY_DIGEST_JOB_NAME, period_start.isoformat()
+        )
+        return len(summaries_by_parent_id)
+
+    def run_forever(
+        self, stop_event: threading.Event, poll_interval_seconds: float = 60
+    ) -> None:
+        while not stop_event.is_set():
+            try:
+                self.run_pending()
+            except Exception as e:
+                print(f'Monthly digest failed: {e!r}')
+            stop_event.wait(poll_interval_seconds)
@@ -0,0 +1,32 @@
+from datetime import datetime
+from typing import Optional
+
+from lessons_reporter_bot.database import unit_of_work
+from lessons_reporter_bot.models import ReportDraft
+
+
+class DraftStorage:
+    def __init__(self, engine) -> None:
+        self.engine = engine
+
+    def get_draft(self, chat_id: int) -> Optional[str]:
+        with unit_of_work(self.engine) as session:
+            draft = session.get(ReportDraft, chat_id)
+            return draft.payload if draft else None
+
+    def save_draft(self, chat_id: int, payload: str) -> None:
+        with unit_of_work(self.engine) as session:
+            if draft := session.get(ReportDraft, chat_id):
+                draft.payload = payload
+                draft.updated_at = datetime.now()
+            else:
+                session.add(
+                    ReportDraft(
+                        chat_id=chat_id, payload=payload, updated_at=datetime.now()
+                    )
+                )
+
+    def delete_draft(self, chat_id: int) -> None:
+        with unit_of_work(self.engine) as session:
+            if draft := session.get(ReportDraft, chat_id):
+                session.delete(draft)
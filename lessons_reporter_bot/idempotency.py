@@ -0,0 +1,92 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable
+
+from sqlalchemy import Engine
+from sqlmodel import delete
+
+from lessons_reporter_bot.database import unit_of_work
+from lessons_reporter_bot.models import ProcessedCallback
+
+logger = logging.getLogger(__name__)
+
+
+# Updates that change data are keyed by chat, message and payload, and their
+# keys are stored, so a double tap on a button or an update Telegram delivers
+# again after a restart is handled once. Navigation is keyed by the callback
+# query id and only remembered in memory, every new tap of it gets handled.
+class CallbackDeduplicator:
+    def __init__(
+        self,
+        engine: Engine,
+        ttl: timedelta,
+        max_entries: int,
+        clock: Callable[[], datetime] = datetime.now,
+    ) -> None:
+        self.engine = engine
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._recent: OrderedDict[str, datetime] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def build_key(chat_id: int, message_id: int | str, payload: str) -> str:
+        raw_key = f'{chat_id}:{message_id}:{payload}'.encode()
+        return hashlib.sha1(raw_key).hexdigest()
+
+    def claim(self, key: str, persist: bool = True) -> bool:
+        now = self.clock()
+
+        with self._lock:
+            processed_at = self._recent.get(key)
+            if processed_at is not None and now - processed_at < self.ttl:
+                return False
+            self._remember(key, now)
+        if not persist:
+            return True
+
+        with unit_of_work(self.engine) as session:
+            processed = session.get(ProcessedCallback, key)
+            if processed is not None and now - processed.processed_at < self.ttl:
+                return False
+            if processed is None:
+                session.add(ProcessedCallback(key=key, processed_at=now))
+            else:
+                processed.processed_at = now
+        return True
+
+    # A failed update is handled again if Telegram delivers it again
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._recent.pop(key, None)
+        with unit_of_work(self.engine) as session:
+            session.exec(delete(ProcessedCallback).where(ProcessedCallback.key == key))
+
+    def prune(self) -> int:
+        with unit_of_work(self.engine) as session:
+            result = session.exec(
+                delete(ProcessedCallback).where(
+                    ProcessedCallback.processed_at < self.clock() - self.ttl
+                )
+            )
+            return result.rowcount
+
+    def run_forever(
+        self, stop_event: threading.Event, poll_interval_seconds: float | None = None
+    ) -> None:
+        while not stop_event.is_set():
+            try:
+                self.prune()
+            except Exception:
+                logger.exception('Pruning processed updates failed')
+            stop_event.wait(poll_interval_seconds or self.ttl.total_seconds())
+
+    def _remember(self, key: str, processed_at: datetime) -> None:
+        self._recent[key] = processed_at
+        self._recent.move_to_end(key)
+        while len(self._recent) > self.max_entries:
+            self._recent.popitem(last=False)
@@ -0,0 +1,21 @@
+from typing import Optional
+
+from lessons_reporter_bot.database import unit_of_work
+from lessons_reporter_bot.models import ScheduledJobRun
+
+
+class JobStorage:
+    def __init__(self, engine) -> None:
+        self.engine = engine
+
+    def get_last_period(self, job_name: str) -> Optional[str]:
+        with unit_of_work(self.engine) as session:
+            job_run = session.get(ScheduledJobRun, job_name)
+            return job_run.period if job_run else None
+
+    def set_last_period(self, job_name: str, period: str) -> None:
+        with unit_of_work(self.engine) as session:
+            if job_run := session.get(ScheduledJobRun, job_name):
+                job_run.period = period
+            else:
+                session.add(ScheduledJobRun(job_name=job_name, period=period))
@@ -1,24 +1,26 @@
-import time
-from collections import defaultdict
+import logging
+import threading
 from contextlib import suppress
+from functools import cache, partial
+from typing import TYPE_CHECKING, BinaryIO, Callable, ContextManager, Iterator
 
-import telebot
 from pydantic import ValidationError
-from sqlmodel import SQLModel, create_engine
-from telebot.apihelper import ApiTelegramException
-from telebot.types import CallbackQuery, Message
-from telebot.util import quick_markup
 
-from lessons_reporter_bot.authorization_service import AuthorizationService
-from lessons_reporter_bot.bot_service import BotService
+from lessons_reporter_bot.app import Application
 from lessons_reporter_bot.callback_data import (
     # Topic's callback's
     AddParentIdToStudentCallbackData,
+    # Payment callback's
+    AddPaymentCallbackData,
+    # Teacher's callback's
+    AddTeacherCallbackData,
+    AnyCallbackData,
     # Student's callback's
     CreateStudentCallbackData,
     CreateTopicCallbackData,
     DeleteConfirmedItemCallbackData,
     DeleteOneItemCallbackData,
+    EditReportCallbackData,
     # Back to calback's
     GoBackToAdminPanelCallbackData,
     ReportBuilder1CallbackData,
@@ -28,158 +30,635 @@ from lessons_reporter_bot.callback_data import (
     ReportBuilder6SetIsProactiveCallbackData,
     ReportBuilder7SetIsPaidCallbackData,
     ReportBuilder8AddCommentQuestionCallbackData,
+    ReportBuilder9AddAttachmentCallbackData,
     ReportBuilderChooseItemListCallbackData,
     # Report builder's callback's
     ReportBuilderShowItemListCallbackData,
     ReportBuilderShowReportPreviewCallbackData,
     SaveConfirmedReportCallbackData,
     SendSavedReportsCallbackData,
+    ShowDebtorsCallbackData,
     ShowItemsListCallbackData,
     ShowOneItemCallbackData,
+    ShowParentReportsCallbackData,
+    ShowStudentChartCallbackData,
     UpdateStudentNameCallbackData,
     any_callback_data_validator,
 )
-from lessons_reporter_bot.models import (
-    BotServiceMessage,
-    BotServiceRegisterNextMessageHandler,
-)
-from lessons_reporter_bot.report_builder import ReportBuilder
-from lessons_reporter_bot.report_storage import ReportStorage
-from lessons_reporter_bot.settings import Settings
-from lessons_reporter_bot.student_storage import StudentStorage
-from lessons_reporter_bot.topic_storage import TopicStorage
-from lessons_reporter_bot.utils import FIRST_PAGE
-
-settings = Settings()
-
-engine = create_engine(settings.database_url)
-
-topic_storage = TopicStorage(engine=engine)
-report_builder = ReportBuilder()
-student_storage = StudentStorage(engine=engine)
-report_storage = ReportStorage(engine=engine)
-authorization_service = AuthorizationService(superusers=settings.superusers)
-bot_service = BotService(
-    topic_storage=topic_storage,
-    report_builder=report_builder,
-    student_storage=student_storage,
-    report_storage=report_storage,
-    authorization_service=authorization_service,
+
+if TYPE_CHECKING:
+    from sqlmodel import Session
+    from telebot import TeleBot
+    from telebot.types import CallbackQuery, InlineKeyboardMarkup, Message
+
+    from lessons_reporter_bot.models import (
+        AttachmentData,
+        BotServiceMessage,
+        BotServiceRegisterNextMessageHandler,
+        Report,
+    )
+    from lessons_reporter_bot.progress import ProgressReporter
+    from lessons_reporter_bot.sender import RateLimitedSender
+
+app = Application()
+logger = logging.getLogger(__name__)
+
+# The only callbacks of users who aren't teachers, the parent screens
+PARENT_CALLBACK_TYPES = (
+    GoBackToAdminPanelCallbackData,
+    ShowParentReportsCallbackData,
+    ShowStudentChartCallbackData,
 )
-telegram_bot = telebot.TeleBot(token=settings.bot_token)
 
-LAST_MESSAGE_IDS: dict[int, list[int]] = defaultdict(list)
+
+def get_last_message_ids(chat_id: int) -> list[int]:
+    return app.shared_store.get(f'last_message_ids:{chat_id}') or []
+
+
+def set_last_message_ids(chat_id: int, message_ids: list[int]) -> None:
+    app.shared_store.set(f'last_message_ids:{chat_id}', message_ids)
+
+
+def get_awaited_input(chat_id: int) -> AnyCallbackData | None:
+    if (awaited_input := app.shared_store.get(f'awaited_input:{chat_id}')) is None:
+        return None
+    return any_callback_data_validator.validate_json(awaited_input)
+
+
+def set_awaited_input(chat_id: int, awaited_input: AnyCallbackData) -> None:
+    app.shared_store.set(
+        f'awaited_input:{chat_id}',
+        awaited_input.model_dump_json(),
+        ttl_seconds=app.settings.next_step_ttl_seconds,
+    )
+
+
+def clear_awaited_input(chat_id: int) -> None:
+    app.shared_store.delete(f'awaited_input:{chat_id}')
+
+
+def build_reply_markup(message: 'BotServiceMessage') -> 'InlineKeyboardMarkup | None':
+    from telebot.util import quick_markup
+
+    if not message.buttons:
+        return None
+    buttons = {
+        button.title: {'callback_data': button.callback_data.model_dump_json()}
+        for button in message.buttons
+    }
+    return quick_markup(buttons, row_width=message.row_width)
 
 
 def process_bot_service_handler_results(
-    *results: BotServiceMessage | BotServiceRegisterNextMessageHandler, chat_id: int
-) -> Message:
+    *results: 'BotServiceMessage | BotServiceRegisterNextMessageHandler',
+    chat_id: int,
+) -> 'Message':
+    from telebot.apihelper import ApiTelegramException
+
+    from lessons_reporter_bot.models import (
+        BotServiceMessage,
+        BotServiceRegisterNextMessageHandler,
+    )
+
+    telegram_bot = app.telegram_bot
+    is_teacher = app.authorization_service.has_teacher_access(user_id=chat_id)
     sent_message = None
 
     for result in results:
         match result:
             case BotServiceMessage() as message:
-                telegram_bot.clear_step_handler_by_chat_id(chat_id)
+                clear_awaited_input(chat_id)
 
-                if authorization_service.has_teacher_access(user_id=chat_id):
-                    for message_id in LAST_MESSAGE_IDS[chat_id]:
+                if is_teacher:
+                    for message_id in get_last_message_ids(chat_id):
                         # Ignore if the message is already deleted or not found
                         with suppress(ApiTelegramException):
                             telegram_bot.delete_message(chat_id, message_id)
+                    set_last_message_ids(chat_id, [])
 
-                buttons = {
-                    button.title: {
-                        'callback_data': button.callback_data.model_dump_json()
-                    }
-                    for button in message.buttons
-                }
-                reply_markup = (
-                    quick_markup(buttons, row_width=message.row_width)
-                    if message.buttons
-                    else None
-                )
+                sent_message, *file_messages = send_message_parts(chat_id, message)
+                if is_teacher:
+                    set_last_message_ids(
+                        chat_id,
+                        [sent_message.message_id]
+                        + [
+                            file_message.message_id
+                            for file_message in file_messages
+                            if file_message
+                        ],
+                    )
 
-                sent_message = telegram_bot.send_message(
-                    chat_id,
-                    message.text,
-                    reply_markup=reply_markup,
-                    parse_mode='MARKDOWN',
-                )
+            case BotServiceRegisterNextMessageHandler():
+                set_awaited_input(chat_id, result.awaited_input)
+
+    return sent_message
 
-                if authorization_service.has_teacher_access(user_id=chat_id):
-                    LAST_MESSAGE_IDS[chat_id].append(sent_message.message_id)
 
-            case BotServiceRegisterNextMessageHandler():
-                def callback(message: Message) -> None:
-                    process_bot_service_handler_results(
-                        *result.callback(message.text), chat_id=chat_id
-                    )
+# Sends the text of the message, then each of its files as a reply to it, and
+# yields every message sent, None for a file that no longer exists. With
+# `reply_to` the text was already sent as that message and the first
+# `sent_file_count` files were sent too, only the rest is sent.
+def send_message_parts(
+    chat_id: int,
+    message: 'BotServiceMessage',
+    reply_to: int | None = None,
+    sent_file_count: int = 0,
+) -> 'Iterator[Message | None]':
+    if reply_to is None:
+        sent_message = app.telegram_bot.send_message(
+            chat_id,
+            message.text,
+            reply_markup=build_reply_markup(message),
+            parse_mode='MARKDOWN',
+        )
+        reply_to = sent_message.message_id
+        yield sent_message
 
-                telegram_bot.register_next_step_handler_by_chat_id(
-                    chat_id=chat_id, callback=callback
-                )
+    send_files = [
+        partial(send_attachment, chat_id, attachment_id)
+        for attachment_id in message.attachment_ids
+    ] + [
+        partial(send_student_chart, chat_id, student_id)
+        for student_id in message.chart_student_ids
+    ]
+    for send_file in send_files[sent_file_count:]:
+        yield send_file(reply_to=reply_to)
+
+
+# Sent by the cached file_id, so Telegram already has the bytes. The stored
+# file is uploaded only if Telegram doesn't know the id, e.g. after the bot
+# token changed. Returns the id of the upload, to be cached instead.
+def send_cached_file(
+    send: 'Callable[[object], Message]',
+    telegram_file_id: str | None,
+    open_file: 'Callable[[], BinaryIO]',
+) -> 'tuple[Message, str | None]':
+    from telebot.apihelper import ApiTelegramException
+
+    if telegram_file_id:
+        try:
+            return send(telegram_file_id), None
+        except ApiTelegramException as e:
+            if not (e.error_code == 400 and 'file' in e.description.lower()):
+                raise
+
+    with open_file() as file:
+        sent_message = send(file)
+    if sent_message.photo:
+        return sent_message, sent_message.photo[-1].file_id
+    return sent_message, sent_message.document.file_id
+
+
+def send_attachment(
+    chat_id: int, attachment_id: int, reply_to: int
+) -> 'Message | None':
+    from telebot.types import ReplyParameters
+
+    from lessons_reporter_bot.models import AttachmentKind
+
+    attachment_storage = app.attachment_storage
+    if (attachment := attachment_storage.get_attachment(attachment_id)) is None:
+        return None
+    telegram_bot = app.telegram_bot
+    reply_parameters = ReplyParameters(reply_to, allow_sending_without_reply=True)
+
+    def send(file: object) -> 'Message':
+        if attachment.kind == AttachmentKind.PHOTO:
+            return telegram_bot.send_photo(
+                chat_id, file, reply_parameters=reply_parameters
+            )
+        return telegram_bot.send_document(
+            chat_id,
+            file,
+            visible_file_name=attachment.file_name,
+            reply_parameters=reply_parameters,
+        )
+
+    sent_message, uploaded_file_id = send_cached_file(
+        send,
+        attachment.telegram_file_id,
+        lambda: app.attachment_store.open(attachment.sha256),
+    )
+    if uploaded_file_id:
+        attachment_storage.set_telegram_file_id(attachment_id, uploaded_file_id)
+    return sent_message
+
+
+def send_student_chart(
+    chat_id: int, student_id: int, reply_to: int
+) -> 'Message | None':
+    from telebot.types import ReplyParameters
+
+    if (chart := app.chart_storage.get_chart(student_id)) is None:
+        return None
+    chart_path = app.progress_charts.chart_path(student_id)
+    if not (chart.telegram_file_id or chart_path.exists()):
+        return None
+
+    sent_message, uploaded_file_id = send_cached_file(
+        lambda file: app.telegram_bot.send_photo(
+            chat_id,
+            file,
+            reply_parameters=ReplyParameters(
+                reply_to, allow_sending_without_reply=True
+            ),
+        ),
+        chart.telegram_file_id,
+        lambda: open(chart_path, 'rb'),
+    )
+    if uploaded_file_id:
+        app.chart_storage.set_telegram_file_id(
+            student_id, chart.version, uploaded_file_id
+        )
+    return sent_message
+
+
+# Streams the file into the attachment store. Returns None if it's larger
+# than allowed.
+def download_attachment(message: 'Message') -> 'AttachmentData | None':
+    from lessons_reporter_bot.attachment_store import AttachmentTooLarge
+    from lessons_reporter_bot.models import AttachmentData, AttachmentKind
+    from lessons_reporter_bot.telegram_transport import stream_file
+
+    if message.photo:
+        # The largest of the sizes Telegram made
+        telegram_file, kind, file_name = message.photo[-1], AttachmentKind.PHOTO, None
+    else:
+        telegram_file = message.document
+        kind, file_name = AttachmentKind.DOCUMENT, message.document.file_name
+    if (telegram_file.file_size or 0) > app.settings.attachment_max_bytes:
+        return None
 
+    file_path = app.telegram_bot.get_file(telegram_file.file_id).file_path
+    try:
+        stored_file = app.attachment_store.save(
+            stream_file(app.telegram_transport, app.settings.bot_token, file_path)
+        )
+    except AttachmentTooLarge:
+        return None
+    return AttachmentData(
+        kind=kind,
+        sha256=stored_file.sha256,
+        size_bytes=stored_file.size_bytes,
+        file_name=file_name,
+        telegram_file_id=telegram_file.file_id,
+    )
+
+
+# Sends messages of bulk jobs. Digests and reports that hit a Telegram outage
+# wait for it in the spool, so they survive restarts.
+@cache
+def get_bulk_sender() -> 'RateLimitedSender':
+    from lessons_reporter_bot.sender import RateLimitedSender
+    from lessons_reporter_bot.telegram_transport import is_transient_error
+
+    return RateLimitedSender(
+        send=send_message_parts,
+        rate_limiter=app.bulk_rate_limiter,
+        spool=app.message_spool,
+        record_sent_report=lambda report_id, chat_id, sent_message: (
+            app.report_storage.set_is_sent(
+                report_id, sent_chat_id=chat_id, sent_message_id=sent_message.message_id
+            )
+        ),
+        is_transient_error=is_transient_error,
+        before_send=app.scheduler.yield_to_interactive,
+        backoff_seconds=app.settings.spool_retry_backoff_seconds,
+        max_backoff_seconds=app.settings.spool_retry_max_backoff_seconds,
+    )
+
+
+# Returns None if the message was spooled, because Telegram can't be reached
+# or older spooled messages are still waiting to be sent. A spooled report is
+# recorded as delivered once the spool sends its text. Once the text is sent,
+# only the files that weren't sent yet are spooled, so nothing is sent twice.
+def send_or_spool(
+    chat_id: int, message: 'BotServiceMessage', report_id: int | None = None
+) -> 'Message | None':
+    from lessons_reporter_bot.telegram_transport import is_transient_error
+
+    bulk_sender = get_bulk_sender()
+    if bulk_sender.pending_count():
+        bulk_sender.enqueue(chat_id, message, report_id=report_id)
+        return None
+
+    sent_message = None
+    sent_file_count = 0
+    try:
+        for part_message in send_message_parts(chat_id, message):
+            if sent_message is None:
+                sent_message = part_message
+            else:
+                sent_file_count += 1
+    except Exception as e:
+        if sent_message is None:
+            if not is_transient_error(e):
+                raise
+            bulk_sender.enqueue(chat_id, message, report_id=report_id)
+        elif is_transient_error(e):
+            bulk_sender.enqueue(
+                chat_id,
+                message,
+                reply_to=sent_message.message_id,
+                sent_file_count=sent_file_count,
+            )
+        else:
+            logger.warning('Failed to send a file to %s: %r', chat_id, e)
     return sent_message
 
 
-@telegram_bot.message_handler(['start', 'help'])
-def welcome(message: Message) -> None:
+def start_bulk_sender(stop_event: threading.Event) -> None:
+    threading.Thread(
+        target=get_bulk_sender().run_forever, args=(stop_event,), daemon=True
+    ).start()
+
+
+# Used for read-only browsing, where replacing the message keeps the chat
+# free of stale pages
+def edit_bot_service_message(
+    message: 'BotServiceMessage', chat_id: int, message_id: int
+) -> None:
+    from telebot.apihelper import ApiTelegramException
+
+    try:
+        app.telegram_bot.edit_message_text(
+            message.text,
+            chat_id,
+            message_id,
+            reply_markup=build_reply_markup(message),
+            parse_mode='MARKDOWN',
+        )
+    except ApiTelegramException as e:
+        if 'message is not modified' not in e.description:
+            process_bot_service_handler_results(message, chat_id=chat_id)
+
+
+def edit_progress_message(chat_id: int, message_id: int, text: str) -> None:
+    from telebot.apihelper import ApiTelegramException
+
+    # The message is gone once the user moves on to another screen
+    with suppress(ApiTelegramException):
+        app.telegram_bot.edit_message_text(text, chat_id, message_id)
+
+
+# Returns False if Telegram refused, e.g. because the user deleted the message
+def edit_delivered_message(
+    message: 'BotServiceMessage', chat_id: int, message_id: int
+) -> bool:
+    from telebot.apihelper import ApiTelegramException
+
+    try:
+        app.telegram_bot.edit_message_text(
+            message.text,
+            chat_id,
+            message_id,
+            reply_markup=build_reply_markup(message),
+            parse_mode='MARKDOWN',
+        )
+    except ApiTelegramException as e:
+        return 'message is not modified' in e.description
+    return True
+
+
+def user_unit_of_work(user_id: int) -> 'ContextManager[Session]':
+    if app.authorization_service.has_teacher_access(user_id):
+        return app.unit_of_work(user_id)
+    return app.parent_unit_of_work()
+
+
+def welcome(message: 'Message') -> None:
+    user_id = message.from_user.id
+    with user_unit_of_work(user_id):
+        results = app.bot_service.welcome(user_id)
+    process_bot_service_handler_results(*results, chat_id=user_id)
+
+
+# Messages that change something are handled once, also when Telegram
+# delivers them again after a restart
+def handle_message_once(message: 'Message', handle: 'Callable[[], None]') -> None:
+    callback_deduplicator = app.callback_deduplicator
+    message_key = callback_deduplicator.build_key(
+        message.chat.id, message.message_id, 'message'
+    )
+    if not callback_deduplicator.claim(message_key):
+        return
+    try:
+        handle()
+    except BaseException:
+        callback_deduplicator.release(message_key)
+        raise
+
+
+def backup_command_handler(message: 'Message') -> None:
     user_id = message.from_user.id
-    process_bot_service_handler_results(*bot_service.welcome(user_id), chat_id=user_id)
+    if not app.authorization_service.has_teacher_access(user_id=user_id):
+        return
+    handle_message_once(message, lambda: start_backup(user_id))
+
+
+def start_backup(user_id: int) -> None:
+    process_bot_service_handler_results(
+        app.bot_service.backup_started(), chat_id=user_id
+    )
+
+    def create_backup() -> Iterator[None]:
+        result = app.backup_service.create_backup()
+        yield
+        process_bot_service_handler_results(
+            app.bot_service.backup_finished(result), chat_id=user_id
+        )
+
+    app.scheduler.submit_bulk(create_backup(), name='backup')
+
+
+# Text is queued with the chat's callbacks, so it's read against the input
+# the last of them asked for
+def text_input_handler(message: 'Message') -> None:
+    app.navigation_coalescer.run(
+        message.chat.id, None, lambda: handle_text_message(message)
+    )
+
+
+def handle_text_message(message: 'Message') -> None:
+    chat_id = message.chat.id
+    if (awaited_input := get_awaited_input(chat_id)) is None:
+        return
+    handle_message_once(
+        message, lambda: process_text_message(message, chat_id, awaited_input)
+    )
+
+
+def process_text_message(
+    message: 'Message', chat_id: int, awaited_input: AnyCallbackData
+) -> None:
+    try:
+        with app.unit_of_work(chat_id):
+            results = app.bot_service.process_text_input(
+                awaited_input=awaited_input,
+                chat_id=chat_id,
+                message_text=message.text,
+            )
+            app.report_builder.flush(chat_id)
+    except BaseException:
+        app.report_builder.discard(chat_id)
+        raise
+    process_bot_service_handler_results(*results, chat_id=chat_id)
+
+
+# Photos of an album arrive as separate messages at once, they are taken one
+# at a time so none of them is lost from the draft
+def attachment_input_handler(message: 'Message') -> None:
+    app.navigation_coalescer.run(
+        message.chat.id,
+        None,
+        lambda: handle_message_once(
+            message, lambda: process_attachment_message(message)
+        ),
+    )
+
+
+def process_attachment_message(message: 'Message') -> None:
+    chat_id = message.chat.id
+    if not isinstance(
+        get_awaited_input(chat_id), ReportBuilder9AddAttachmentCallbackData
+    ):
+        return
+
+    attachment = download_attachment(message)
+    try:
+        with app.unit_of_work(chat_id):
+            results = app.bot_service.process_attachment_input(
+                chat_id=chat_id, attachment=attachment
+            )
+            app.report_builder.flush(chat_id)
+    except BaseException:
+        app.report_builder.discard(chat_id)
+        raise
+    process_bot_service_handler_results(*results, chat_id=chat_id)
+
+
+def catchall_callback_handler(call: 'CallbackQuery') -> None:
+    from telebot.apihelper import ApiTelegramException
+
+    # Acknowledge first, so the button stops spinning before any slow work
+    with suppress(ApiTelegramException):
+        app.telegram_bot.answer_callback_query(call.id)
+
+    app.navigation_coalescer.run(
+        call.from_user.id, call.data, lambda: process_callback(call)
+    )
+
 
+# Database work of an update is committed before anything is sent, so no
+# transaction waits on Telegram. The returned function does the sending.
+def process_callback(call: 'CallbackQuery') -> None:
+    from lessons_reporter_bot.coalescing import is_navigation_payload
 
-@telegram_bot.callback_query_handler(lambda call: call)
-def catchall_callback_handler(call: CallbackQuery) -> None:
     user_id = call.from_user.id
-    match data := any_callback_data_validator.validate_json(call.data):
+    data = any_callback_data_validator.validate_json(call.data)
+    if not app.authorization_service.has_teacher_access(user_id) and not isinstance(
+        data, PARENT_CALLBACK_TYPES
+    ):
+        logger.warning('Ignored %s of user %s', type(data).__name__, user_id)
+        return
+
+    callback_deduplicator = app.callback_deduplicator
+    is_navigation = is_navigation_payload(call.data)
+    if is_navigation or call.message is None:
+        callback_key = call.id
+    else:
+        callback_key = callback_deduplicator.build_key(
+            user_id, call.message.message_id, call.data
+        )
+    # A duplicate was already answered, it's skipped without a reply
+    if not callback_deduplicator.claim(callback_key, persist=not is_navigation):
+        return
+    try:
+        with user_unit_of_work(user_id):
+            send_replies = handle_callback(call, data)
+            app.report_builder.flush(user_id)
+    except BaseException:
+        callback_deduplicator.release(callback_key)
+        app.report_builder.discard(user_id)
+        raise
+    send_replies()
+
+
+def reply(
+    *results: 'BotServiceMessage | BotServiceRegisterNextMessageHandler',
+    chat_id: int,
+) -> 'Callable[[], Message]':
+    return lambda: process_bot_service_handler_results(*results, chat_id=chat_id)
+
+
+def handle_callback(
+    call: 'CallbackQuery', data: AnyCallbackData
+) -> 'Callable[[], object]':
+    from lessons_reporter_bot.utils import FIRST_PAGE
+
+    bot_service = app.bot_service
+    report_builder = app.report_builder
+    report_storage = app.report_storage
+    user_id = call.from_user.id
+    match data:
         case GoBackToAdminPanelCallbackData():
-            process_bot_service_handler_results(
-                *bot_service.welcome(user_id), chat_id=user_id
-            )
+            return reply(*bot_service.welcome(user_id), chat_id=user_id)
 
         case CreateTopicCallbackData():
-            process_bot_service_handler_results(
-                *bot_service.create_topic(data), chat_id=user_id
-            )
+            return reply(*bot_service.create_topic(data), chat_id=user_id)
 
         case CreateStudentCallbackData():
-            process_bot_service_handler_results(
-                *bot_service.create_student(data), chat_id=user_id
-            )
+            return reply(*bot_service.create_student(data), chat_id=user_id)
 
         case AddParentIdToStudentCallbackData():
-            process_bot_service_handler_results(
-                *bot_service.add_parent_id_to_student(data, student_id=data.student_id),
-                chat_id=user_id,
-            )
+            return reply(*bot_service.add_parent_id_to_student(data), chat_id=user_id)
 
         case UpdateStudentNameCallbackData():
-            process_bot_service_handler_results(
-                *bot_service.update_student_name(data), chat_id=user_id
+            return reply(*bot_service.update_student_name(data), chat_id=user_id)
+
+        case ShowDebtorsCallbackData():
+            return reply(bot_service.show_debtors(data), chat_id=user_id)
+
+        case AddPaymentCallbackData():
+            return reply(*bot_service.add_payment(data), chat_id=user_id)
+
+        case AddTeacherCallbackData():
+            return reply(*bot_service.add_teacher(data), chat_id=user_id)
+
+        case ShowParentReportsCallbackData():
+            message = bot_service.show_parent_reports(parent_id=user_id, data=data)
+            if call.message:
+                return lambda: edit_bot_service_message(
+                    message, chat_id=user_id, message_id=call.message.message_id
+                )
+            return reply(message, chat_id=user_id)
+
+        case ShowStudentChartCallbackData():
+            return reply(
+                bot_service.show_student_chart(user_id=user_id, data=data),
+                chat_id=user_id,
             )
 
         case ReportBuilder1CallbackData():
-            report_builder.clear_temp_report()
-            process_bot_service_handler_results(
+            report_builder.clear_temp_report(chat_id=user_id)
+            return reply(
                 bot_service.build_report_1_lesson_date_setting(), chat_id=user_id
             )
 
         case ReportBuilder1SetValueFromButtonCallbackData():
-            process_bot_service_handler_results(
+            return reply(
                 *bot_service.build_report_1_lesson_date_from_button(
-                    lesson_day=data.lesson_day
+                    chat_id=user_id, lesson_day=data.lesson_day
                 ),
                 chat_id=user_id,
             )
 
         case ReportBuilder1EnterManuallyCallbackData():
-            process_bot_service_handler_results(
-                *bot_service.build_report_1_manual(), chat_id=user_id
-            )
+            return reply(*bot_service.build_report_1_manual(data), chat_id=user_id)
 
         case ReportBuilderShowItemListCallbackData():
             if data.i_t == 'T':
-                process_bot_service_handler_results(
+                return reply(
                     bot_service.build_report_2_topic_setting(
                         data=ReportBuilderShowItemListCallbackData(
                             i_t='T', page=data.page
@@ -188,7 +667,7 @@ def catchall_callback_handler(call: CallbackQuery) -> None:
                     chat_id=user_id,
                 )
             elif data.i_t == 'S':
-                process_bot_service_handler_results(
+                return reply(
                     bot_service.build_report_3_student_setting(
                         data=ReportBuilderShowItemListCallbackData(
                             i_t='S', page=data.page
@@ -199,8 +678,8 @@ def catchall_callback_handler(call: CallbackQuery) -> None:
 
         case ReportBuilderChooseItemListCallbackData():
             if data.i_t == 'T':
-                report_builder.set_topic_id_(topic_id=data.i_id)
-                process_bot_service_handler_results(
+                report_builder.set_topic_id_(chat_id=user_id, topic_id=data.i_id)
+                return reply(
                     bot_service.build_report_3_student_setting(
                         data=ReportBuilderShowItemListCallbackData(
                             i_t='S', page=FIRST_PAGE
@@ -209,132 +688,423 @@ def catchall_callback_handler(call: CallbackQuery) -> None:
                     chat_id=user_id,
                 )
             elif data.i_t == 'S':
-                report_builder.set_student_id_3(student_id=data.i_id)
-                report_builder.set_lesson_count_4(
-                    report_storage.lessons_count_by_student_id(student_id=data.i_id) + 1
-                )
-                process_bot_service_handler_results(
+                temp_report = report_builder.get_temp_report(user_id)
+                # A corrected report keeps its number unless it moves to
+                # another student
+                if not (
+                    temp_report.editing_report_id
+                    and temp_report.student_id == data.i_id
+                ):
+                    report_builder.set_lesson_count_4(
+                        chat_id=user_id,
+                        lesson_count=report_storage.lessons_count_by_student_id(
+                            student_id=data.i_id
+                        )
+                        + 1,
+                    )
+                report_builder.set_student_id_3(chat_id=user_id, student_id=data.i_id)
+                return reply(
                     bot_service.build_report_5_homework_status_setting(),
                     chat_id=user_id,
                 )
 
         case ReportBuilder5SetHomeworkStatusCallbackData():
-            print('data.homework_status:', data.homework_status)
-            report_builder.set_homework_status_5(data.homework_status)
-            process_bot_service_handler_results(
+            report_builder.set_homework_status_5(
+                chat_id=user_id, homework_status=data.homework_status
+            )
+            return reply(
                 bot_service.build_report_6_is_proactive_setting(),
                 chat_id=user_id,
             )
 
         case ReportBuilder6SetIsProactiveCallbackData():
-            report_builder.set_is_proactive_6(bool(data.is_active))
-            process_bot_service_handler_results(
+            report_builder.set_is_proactive_6(
+                chat_id=user_id, is_proactive=bool(data.is_active)
+            )
+            return reply(
                 bot_service.build_report_7_payment_status_setting(),
                 chat_id=user_id,
             )
 
         case ReportBuilder7SetIsPaidCallbackData():
-            report_builder.set_is_paid_7(bool(data.payment_status))
-            process_bot_service_handler_results(
+            report_builder.set_is_paid_7(
+                chat_id=user_id, is_paid=bool(data.payment_status)
+            )
+            return reply(
                 bot_service.build_report_8_ask_comment(),
                 chat_id=user_id,
             )
 
         case ReportBuilder8AddCommentQuestionCallbackData():
-            process_bot_service_handler_results(
-                *bot_service.build_report_8_get_comment(),
+            return reply(
+                *bot_service.build_report_8_get_comment(data),
                 chat_id=user_id,
             )
 
-        case ReportBuilderShowReportPreviewCallbackData():
-            process_bot_service_handler_results(
-                bot_service.build_report_preview(),
+        case ReportBuilder9AddAttachmentCallbackData():
+            return reply(
+                *bot_service.build_report_9_ask_attachment(data),
                 chat_id=user_id,
             )
 
-        case SaveConfirmedReportCallbackData():
-            try:
-                report_id, complete_report = bot_service.save_report()
+        case ReportBuilderShowReportPreviewCallbackData():
+            return reply(
+                bot_service.build_report_preview(chat_id=user_id),
+                chat_id=user_id,
+            )
 
-                if data.parent_id:
-                    sent_message = process_bot_service_handler_results(
-                        bot_service.build_report_message(complete_report),
-                        chat_id=data.parent_id,
-                    )
+        case EditReportCallbackData():
+            return reply(
+                bot_service.edit_report(chat_id=user_id, data=data), chat_id=user_id
+            )
 
-                    if sent_message:
-                        process_bot_service_handler_results(
-                            bot_service.get_message_report_successfully_sent(),
-                            chat_id=user_id,
-                        )
-                        report_storage.set_is_sent(report_id)
-                    else:
-                        process_bot_service_handler_results(
-                            bot_service.get_message_report_unsuccessfully_sent(),
-                            chat_id=user_id,
-                        )
+        case SaveConfirmedReportCallbackData() if (
+            report_builder.get_temp_report(user_id).editing_report_id is not None
+        ):
+            # The parent's copy is corrected in place. A correction message is
+            # sent only if that's not possible.
+            try:
+                report, complete_report = bot_service.save_edited_report(
+                    chat_id=user_id
+                )
+            except ValidationError:
+                notice = bot_service.get_error_message_temp_report_must_be_filled()
+                return reply(
+                    bot_service.show_admin_panel(notice=notice.text), chat_id=user_id
+                )
 
-                    # # Introduce a delay to make the success message appear later
-                    time.sleep(1.5)
+            if report is None:
+                notice = bot_service.get_message_report_not_found()
+            elif not report.is_sent or not data.parent_id:
+                notice = bot_service.get_message_report_updated(
+                    is_parent_notified=False
+                )
+            else:
+                report_message = bot_service.build_report_message(complete_report)
+                correction_message = bot_service.build_report_correction_message(
+                    complete_report
+                )
 
-            except ApiTelegramException as e:
-                if e.error_code == 400 and 'chat not found' in e.description.lower():
+                def correct_report() -> None:
+                    notice = correct_delivered_report(
+                        user_id,
+                        report,
+                        data.parent_id,
+                        report_message,
+                        correction_message,
+                    )
                     process_bot_service_handler_results(
-                        bot_service.get_message_report_unsuccessfully_sent(),
+                        bot_service.show_admin_panel(notice=notice.text),
                         chat_id=user_id,
                     )
 
+                return correct_report
+
+            return reply(
+                bot_service.show_admin_panel(notice=notice.text), chat_id=user_id
+            )
+
+        case SaveConfirmedReportCallbackData():
+            # The outcome is shown above the menu instead of as a separate
+            # message that would be replaced by the menu right away
+            try:
+                report_id, complete_report = bot_service.save_report(chat_id=user_id)
             except ValidationError:
-                process_bot_service_handler_results(
-                    bot_service.get_error_message_temp_report_must_be_filled()
+                notice = bot_service.get_error_message_temp_report_must_be_filled()
+                return reply(
+                    bot_service.show_admin_panel(notice=notice.text), chat_id=user_id
                 )
 
-            process_bot_service_handler_results(
-                *bot_service.welcome(user_id),
-                chat_id=user_id,
+            if not data.parent_id:
+                return reply(bot_service.show_admin_panel(), chat_id=user_id)
+
+            report_message = bot_service.build_report_message(
+                complete_report, report_id
             )
 
+            def send_report() -> None:
+                notice = deliver_report(
+                    user_id, report_id, data.parent_id, report_message
+                )
+                process_bot_service_handler_results(
+                    bot_service.show_admin_panel(notice=notice.text), chat_id=user_id
+                )
+
+            return send_report
+
         case SendSavedReportsCallbackData():
-            for sent_message, report_id, parent_id in bot_service.send_saved_reports():
-                try:
-                    process_bot_service_handler_results(sent_message, chat_id=parent_id)
-                    report_storage.set_is_sent(report_id)
-                except ApiTelegramException as e:
-                    if (
-                        e.error_code == 400
-                        and 'chat not found' in e.description.lower()
-                    ):
-                        process_bot_service_handler_results(
-                            'Пользователь (родитель) не найден. Проверьте id.',
-                            chat_id=parent_id,
-                        )
+            saved_reports = bot_service.send_saved_reports()
+            return lambda: start_sending_saved_reports(user_id, saved_reports)
 
         case ShowItemsListCallbackData():
-            process_bot_service_handler_results(
-                bot_service.show_items_list(data), chat_id=user_id
-            )
+            return reply(bot_service.show_items_list(data), chat_id=user_id)
 
         case ShowOneItemCallbackData():
-            process_bot_service_handler_results(
-                bot_service.show_one_item(data), chat_id=user_id
-            )
+            return reply(bot_service.show_one_item(data), chat_id=user_id)
 
         case DeleteOneItemCallbackData():
-            process_bot_service_handler_results(
-                bot_service.delete_one_item(data), chat_id=user_id
-            )
+            return reply(bot_service.delete_one_item(data), chat_id=user_id)
 
         case DeleteConfirmedItemCallbackData():
-            process_bot_service_handler_results(
+            return reply(
                 bot_service.delete_confirmed_one_item(data),
                 chat_id=user_id,
             )
 
         case other_callback_data:
-            print('other_callback_data', other_callback_data)
+            logger.warning('Unhandled callback data: %r', other_callback_data)
 
+    return lambda: None
+
+
+# Parents who never started the bot can't be sent anything, that's expected
+def is_chat_not_found(error: Exception) -> bool:
+    from telebot.apihelper import ApiTelegramException
+
+    return (
+        isinstance(error, ApiTelegramException)
+        and error.error_code == 400
+        and 'chat not found' in error.description.lower()
+    )
+
+
+# The report is already committed when it's sent. Failing to reach the parent
+# is only reported to the teacher, the report stays saved and unsent.
+def deliver_report(
+    user_id: int, report_id: int, parent_id: int, message: 'BotServiceMessage'
+) -> 'BotServiceMessage':
+    bot_service = app.bot_service
+    report_storage = app.report_storage
+    with app.unit_of_work(user_id):
+        if not report_storage.claim_unsent_report(report_id):
+            # Already sent by a mass send
+            return bot_service.get_message_report_successfully_sent()
+
+    try:
+        sent_message = send_or_spool(parent_id, message, report_id=report_id)
+    except Exception as e:
+        with app.unit_of_work(user_id):
+            report_storage.set_is_sent(report_id, is_sent=False)
+        if not is_chat_not_found(e):
+            logger.warning('Failed to send report %s: %r', report_id, e)
+        return bot_service.get_message_report_unsuccessfully_sent()
+
+    if sent_message is None:
+        return bot_service.get_message_report_queued()
+    with app.unit_of_work(user_id):
+        report_storage.set_is_sent(
+            report_id, sent_chat_id=parent_id, sent_message_id=sent_message.message_id
+        )
+    return bot_service.get_message_report_successfully_sent()
+
+
+# The correction is already committed, as for `deliver_report`
+def correct_delivered_report(
+    user_id: int,
+    report: 'Report',
+    parent_id: int,
+    report_message: 'BotServiceMessage',
+    correction_message: 'BotServiceMessage',
+) -> 'BotServiceMessage':
+    from telebot.apihelper import ApiTelegramException
+
+    bot_service = app.bot_service
+    try:
+        is_edited = (
+            report.sent_message_id is not None
+            and report.sent_chat_id == parent_id
+            and edit_delivered_message(
+                report_message,
+                chat_id=report.sent_chat_id,
+                message_id=report.sent_message_id,
+            )
+        )
+        if not is_edited and (
+            sent_message := send_or_spool(
+                parent_id, correction_message, report_id=report.report_id
+            )
+        ):
+            with app.unit_of_work(user_id):
+                app.report_storage.set_is_sent(
+                    report.report_id,
+                    sent_chat_id=parent_id,
+                    sent_message_id=sent_message.message_id,
+                )
+    except ApiTelegramException as e:
+        if not is_chat_not_found(e):
+            logger.warning('Failed to correct report %s: %r', report.report_id, e)
+        return bot_service.get_message_report_unsuccessfully_sent()
+    return bot_service.get_message_report_updated(is_parent_notified=True)
+
+
+def start_sending_saved_reports(
+    user_id: int, saved_reports: list[tuple['BotServiceMessage', int, int]]
+) -> None:
+    from lessons_reporter_bot.progress import ProgressReporter
+
+    bot_service = app.bot_service
+    progress = ProgressReporter(
+        edit=lambda text: edit_progress_message(
+            user_id, progress_message.message_id, text
+        ),
+        title='Отправка отчётов',
+        total=len(saved_reports),
+        min_interval_seconds=app.settings.progress_update_interval_seconds,
+    )
+    progress_message = process_bot_service_handler_results(
+        bot_service.build_progress_message(progress.text), chat_id=user_id
+    )
+    # Sending goes on in the background, the teacher can keep working
+    app.scheduler.submit_bulk(
+        send_saved_reports(
+            user_id, saved_reports, progress, progress_message.message_id
+        ),
+        name='send_saved_reports',
+    )
+
+
+# Runs as a bulk job, one report per step. Each report is claimed in its own
+# short transaction before it's sent and released again if sending fails.
+def send_saved_reports(
+    user_id: int,
+    saved_reports: list[tuple['BotServiceMessage', int, int]],
+    progress: 'ProgressReporter',
+    progress_message_id: int,
+) -> Iterator[None]:
+    bot_service = app.bot_service
+    report_storage = app.report_storage
+    sent_count = queued_count = 0
+    for sent_message, report_id, parent_id in saved_reports:
+        app.bulk_rate_limiter.acquire()
+        with app.unit_of_work(user_id):
+            is_claimed = report_storage.claim_unsent_report(report_id)
+        if not is_claimed:
+            # Already sent by another mass send that is still running
+            sent_count += 1
+        else:
+            try:
+                if delivered_message := send_or_spool(
+                    parent_id, sent_message, report_id=report_id
+                ):
+                    with app.unit_of_work(user_id):
+                        report_storage.set_is_sent(
+                            report_id,
+                            sent_chat_id=parent_id,
+                            sent_message_id=delivered_message.message_id,
+                        )
+                    sent_count += 1
+                else:
+                    queued_count += 1
+            except Exception as e:
+                with app.unit_of_work(user_id):
+                    report_storage.set_is_sent(report_id, is_sent=False)
+                if not is_chat_not_found(e):
+                    logger.warning('Failed to send report %s: %r', report_id, e)
+        progress.advance()
+        yield
+
+    notice = bot_service.get_saved_reports_sent_notice(
+        sent_count, len(saved_reports), queued_count
+    )
+    last_message_ids = get_last_message_ids(user_id)
+    if last_message_ids == [progress_message_id]:
+        process_bot_service_handler_results(
+            bot_service.show_admin_panel(notice=notice), chat_id=user_id
+        )
+    else:
+        # The teacher is on another screen, the result is added below it and
+        # goes away with it
+        notice_message = app.telegram_bot.send_message(user_id, notice)
+        set_last_message_ids(user_id, last_message_ids + [notice_message.message_id])
+
+
+def register_handlers(telegram_bot: 'TeleBot') -> None:
+    telegram_bot.register_message_handler(welcome, commands=['start', 'help'])
+    telegram_bot.register_message_handler(backup_command_handler, commands=['backup'])
+    telegram_bot.register_message_handler(
+        text_input_handler, func=lambda message: True, content_types=['text']
+    )
+    telegram_bot.register_message_handler(
+        attachment_input_handler, content_types=['photo', 'document']
+    )
+    telegram_bot.register_callback_query_handler(
+        catchall_callback_handler, func=lambda call: call
+    )
+
+
+def start_background_jobs() -> None:
+    from lessons_reporter_bot.archive import ReportArchiver
+    from lessons_reporter_bot.digest import MonthlyDigestScheduler
+    from lessons_reporter_bot.purge import DeletedDataPurger
+
+    settings = app.settings
+    monthly_digest_scheduler = MonthlyDigestScheduler(
+        bot_service=app.bot_service,
+        report_storage=app.report_storage,
+        job_storage=app.job_storage,
+        sender=get_bulk_sender(),
+        progress_charts=app.progress_charts,
+        day_of_month=settings.digest_day_of_month,
+        at=settings.digest_time,
+    )
+    report_archiver = ReportArchiver(
+        report_storage=app.report_storage,
+        archive_after_days=settings.report_archive_after_days,
+        batch_size=settings.report_archive_batch_size,
+    )
+    deleted_data_purger = DeletedDataPurger(
+        student_storage=app.student_storage,
+        topic_storage=app.topic_storage,
+        attachment_storage=app.attachment_storage,
+        attachment_store=app.attachment_store,
+        retention_days=settings.deleted_data_retention_days,
+        batch_size=settings.purge_batch_size,
+        batch_pause_seconds=settings.purge_batch_pause_seconds,
+    )
+
+    stop_event = threading.Event()
+    start_bulk_sender(stop_event)
+    threading.Thread(
+        target=app.callback_deduplicator.run_forever, args=(stop_event,), daemon=True
+    ).start()
+    threading.Thread(
+        target=report_archiver.run_forever, args=(stop_event,), daemon=True
+    ).start()
+    threading.Thread(
+        target=deleted_data_purger.run_forever, args=(stop_event,), daemon=True
+    ).start()
+    if settings.backup_interval_hours > 0:
+        threading.Thread(
+            target=app.backup_service.run_forever,
+            args=(stop_event, settings.backup_interval_hours * 3600),
+            daemon=True,
+        ).start()
+    if settings.digest_enabled:
+        threading.Thread(
+            target=monthly_digest_scheduler.run_forever,
+            args=(stop_event,),
+            daemon=True,
+        ).start()
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+    )
+    app.prepare_database()
+    start_background_jobs()
 
-if __name__ == '__main__':
-    SQLModel.metadata.create_all(engine)
     print('Started bot')
-    telegram_bot.polling(non_stop=True, interval=0.5)
+    if app.settings.workers > 1:
+        from lessons_reporter_bot.supervisor import run_supervisor
+
+        # Long polling in the supervisor goes through the pooled transport too
+        app.telegram_transport
+        run_supervisor(bot_token=app.settings.bot_token, workers=app.settings.workers)
+    else:
+        register_handlers(app.telegram_bot)
+        app.telegram_bot.polling(non_stop=True, interval=0.5)
+
+
+if __name__ == '__main__':
+    main()
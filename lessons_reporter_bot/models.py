@@ -1,10 +1,11 @@
 import enum
 from dataclasses import dataclass, field
-from datetime import date
-from typing import Optional, Protocol, TypedDict
+from datetime import date, datetime
+from typing import Optional, TypedDict
 
 import pydantic
-from sqlmodel import Field, Relationship, SQLModel
+from sqlalchemy import text
+from sqlmodel import Field, Index, Relationship, SQLModel
 
 from lessons_reporter_bot.callback_data import AnyCallbackData
 
@@ -14,17 +15,32 @@ class BotServiceMessage:
     text: str
     buttons: list['BotServiceMessageButton'] = field(default_factory=list)
     row_width: int = 2
+    # Sent right after the text, as replies to it
+    attachment_ids: list[int] = field(default_factory=list)
+    chart_student_ids: list[int] = field(default_factory=list)
 
 
-class NextMessageCallback(Protocol):
-    def __call__(
-        self, message_text: str
-    ) -> list['BotServiceMessage | BotServiceRegisterNextMessageHandler']: ...
-
-
+# The next text message from the chat is handled as input for the callback
+# that asked for it, see `BotService.process_text_input`
 @dataclass
 class BotServiceRegisterNextMessageHandler:
-    callback: NextMessageCallback
+    awaited_input: AnyCallbackData
+
+
+# Report joined with the names it is rendered with, see `rendering.py`
+@dataclass(slots=True)
+class ReportRow:
+    report_id: int
+    lesson_date: date
+    lesson_count: int
+    homework_status: int
+    is_proactive: bool
+    is_paid: bool
+    comment: str | None
+    student_id: int
+    student_name: str
+    parent_id: int | None
+    topic: str | None
 
 
 class FormattedPaginationItem(TypedDict):
@@ -32,24 +48,60 @@ class FormattedPaginationItem(TypedDict):
     id: int
 
 
-class Topic(SQLModel, table=True):
+# Rows of these models belong to the teacher who created them. Queries are
+# filtered by the current teacher automatically, see `tenancy`.
+class TenantModel(SQLModel):
+    teacher_id: Optional[int] = Field(default=None)
+
+
+# Rows that are never shown again, skipped by the partial indexes below
+IS_LIVE = text('deleted_at IS NULL')
+
+
+# A deleted topic only disappears from the topic lists: its reports keep
+# showing it, and it's purged once no report refers to it
+class Topic(TenantModel, table=True):
+    __table_args__ = (
+        Index(
+            'ix_topic_live_teacher_id_topic',
+            'teacher_id',
+            'topic',
+            sqlite_where=IS_LIVE,
+            postgresql_where=IS_LIVE,
+        ),
+    )
+
     topic_id: int = Field(default=None, primary_key=True)
     topic: str
+    deleted_at: Optional[datetime] = Field(default=None)
 
     reports: list['Report'] = Relationship(back_populates='topic')
 
 
-class Student(SQLModel, table=True):
+# A deleted student's reports, payments and balance are hidden together with
+# the student and purged with it
+class Student(TenantModel, table=True):
+    __table_args__ = (
+        Index(
+            'ix_student_live_teacher_id_name',
+            'teacher_id',
+            'name',
+            sqlite_where=IS_LIVE,
+            postgresql_where=IS_LIVE,
+        ),
+    )
+
     student_id: int = Field(default=None, primary_key=True)
     name: str
-    parent_id: Optional[int] = Field(default=None)
+    parent_id: Optional[int] = Field(default=None, index=True)
+    deleted_at: Optional[datetime] = Field(default=None)
 
     reports: list['Report'] = Relationship(back_populates='student')
 
 
-class Report(SQLModel, table=True):
+class ReportBase(TenantModel):
     report_id: int = Field(default=None, primary_key=True)
-    lesson_date: date
+    lesson_date: date = Field(index=True)
     lesson_count: int
     topic_id: int = Field(foreign_key='topic.topic_id', nullable=True)
     student_id: int = Field(foreign_key='student.student_id', nullable=True)
@@ -58,11 +110,97 @@ class Report(SQLModel, table=True):
     is_paid: bool
     is_sent: bool
     comment: str = Field(nullable=True)
+    # The parent's copy, edited in place when the report is corrected
+    sent_chat_id: Optional[int] = Field(default=None)
+    sent_message_id: Optional[int] = Field(default=None)
+
+
+class Report(ReportBase, table=True):
+    __table_args__ = (
+        Index('ix_report_student_id_lesson_date', 'student_id', 'lesson_date'),
+        Index('ix_report_teacher_id_lesson_date', 'teacher_id', 'lesson_date'),
+    )
 
     topic: Topic = Relationship(back_populates='reports')
     student: Student = Relationship(back_populates='reports')
 
 
+# Reports older than the archive horizon are moved here by `ReportArchiver`,
+# keeping the live table small for everyday listings
+class ArchivedReport(ReportBase, table=True):
+    __tablename__ = 'archived_report'
+    __table_args__ = (
+        Index('ix_archived_report_student_id_lesson_date', 'student_id', 'lesson_date'),
+        Index('ix_archived_report_teacher_id_lesson_date', 'teacher_id', 'lesson_date'),
+    )
+
+
+# Photos and files attached to a report. The content is kept by
+# `AttachmentStore` under its SHA-256. `report_id` isn't a foreign key, since
+# archived reports keep their id.
+class Attachment(TenantModel, table=True):
+    attachment_id: int = Field(default=None, primary_key=True)
+    report_id: int = Field(index=True)
+    kind: str
+    sha256: str = Field(index=True)
+    size_bytes: int
+    file_name: Optional[str] = Field(default=None)
+    # Lets Telegram send the file again without uploading it
+    telegram_file_id: Optional[str] = Field(default=None)
+    created_at: datetime
+
+
+class Payment(SQLModel, table=True):
+    payment_id: int = Field(default=None, primary_key=True)
+    student_id: int = Field(foreign_key='student.student_id', index=True)
+    lessons_count: int
+    paid_at: datetime
+
+
+class Teacher(SQLModel, table=True):
+    user_id: int = Field(primary_key=True)
+    created_at: datetime
+
+
+# Maintained together with report and payment inserts, so balances and the
+# debtors list never have to aggregate the report table
+class StudentBalance(SQLModel, table=True):
+    student_id: int = Field(foreign_key='student.student_id', primary_key=True)
+    lessons_count: int = 0
+    paid_lessons_count: int = 0
+    debt: int = Field(default=0, index=True)
+
+
+# The latest progress chart rendered for a student, see `ProgressCharts`
+class StudentChart(SQLModel, table=True):
+    student_id: int = Field(foreign_key='student.student_id', primary_key=True)
+    version: str
+    rendered_at: datetime
+    # Cleared whenever the chart is rendered again
+    telegram_file_id: Optional[str] = Field(default=None)
+
+
+class ReportDraft(SQLModel, table=True):
+    chat_id: int = Field(primary_key=True)
+    payload: str
+    updated_at: datetime
+
+
+class SchemaVersion(SQLModel, table=True):
+    schema_version_id: int = Field(default=1, primary_key=True)
+    fingerprint: str
+
+
+class ProcessedCallback(SQLModel, table=True):
+    key: str = Field(primary_key=True)
+    processed_at: datetime = Field(index=True)
+
+
+class ScheduledJobRun(SQLModel, table=True):
+    job_name: str = Field(primary_key=True)
+    period: str
+
+
 class BotServiceMessageButton(pydantic.BaseModel):
     title: str
     callback_data: AnyCallbackData
@@ -77,3 +215,26 @@ class ReportData(pydantic.BaseModel):
     is_proactive: bool
     is_paid: bool
     comment: str | None
+
+
+class AttachmentKind(str, enum.Enum):
+    PHOTO = 'photo'
+    DOCUMENT = 'document'
+
+
+class AttachmentData(pydantic.BaseModel):
+    kind: AttachmentKind
+    sha256: str
+    size_bytes: int
+    file_name: str | None = None
+    telegram_file_id: str | None = None
+
+
+class MonthlySummary(pydantic.BaseModel):
+    student_id: int
+    student_name: str
+    parent_id: int
+    lessons_count: int
+    homework_done_count: int
+    homework_partial_count: int
+    unpaid_count: int
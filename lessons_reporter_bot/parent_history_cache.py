@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from lessons_reporter_bot.models import BotServiceMessage
+from lessons_reporter_bot.shared_store import SharedStore
+
+
+# Rendered report pages for parents, kept per process. Every parent has a
+# version stamp in the shared store, so a new report saved by any worker makes
+# all cached pages of that parent unreachable. Entries also expire after
+# `ttl_seconds`, which bounds staleness if a page is rendered while the
+# transaction that invalidated it is still being committed. A disabled cache
+# keeps nothing but still bumps versions.
+class ParentHistoryCache:
+    def __init__(
+        self,
+        shared_store: SharedStore,
+        max_entries: int = 1000,
+        ttl_seconds: float = 600,
+        clock: Callable[[], float] = time.monotonic,
+        enabled: bool = True,
+    ) -> None:
+        self.shared_store = shared_store
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._pages: OrderedDict[tuple, tuple[BotServiceMessage, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+        self, parent_id: int, student_id: int, page: int
+    ) -> BotServiceMessage | None:
+        if not self.enabled:
+            return None
+        key = self._key(parent_id, student_id, page)
+        with self._lock:
+            if (entry := self._pages.get(key)) is None:
+                return None
+            message, cached_at = entry
+            if self.clock() - cached_at >= self.ttl_seconds:
+                del self._pages[key]
+                return None
+            self._pages.move_to_end(key)
+            return message
+
+    def set(
+        self, parent_id: int, student_id: int, page: int, message: BotServiceMessage
+    ) -> None:
+        if not self.enabled:
+            return
+        key = self._key(parent_id, student_id, page)
+        with self._lock:
+            self._pages[key] = (message, self.clock())
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+
+    def invalidate(self, parent_id: int | None) -> None:
+        if parent_id is not None:
+            self.shared_store.set(self._version_key(parent_id), time.time_ns())
+
+    def _key(self, parent_id: int, student_id: int, page: int) -> tuple:
+        version = self.shared_store.get(self._version_key(parent_id))
+        return parent_id, version, student_id, page
+
+    def _version_key(self, parent_id: int) -> str:
+        return f'parent_history_version:{parent_id}'
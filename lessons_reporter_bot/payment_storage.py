@@ -0,0 +1,120 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, delete, desc, func, select
+
+from lessons_reporter_bot.database import unit_of_work
+from lessons_reporter_bot.models import (
+    ArchivedReport,
+    Payment,
+    Report,
+    Student,
+    StudentBalance,
+)
+
+
+# One upsert, so concurrent writers neither lose a change nor race to create
+# the row. Only SQLite and PostgreSQL have the needed ON CONFLICT clause.
+def apply_balance_change(
+    session: Session, student_id: int, lessons_delta: int = 0, paid_delta: int = 0
+) -> None:
+    match dialect_name := session.get_bind().dialect.name:
+        case 'postgresql':
+            insert = postgresql.insert
+        case 'sqlite':
+            insert = sqlite.insert
+        case _:
+            raise NotImplementedError(f'Balances are not supported on {dialect_name}')
+    statement = insert(StudentBalance).values(
+        student_id=student_id,
+        lessons_count=lessons_delta,
+        paid_lessons_count=paid_delta,
+        debt=lessons_delta - paid_delta,
+    )
+    session.exec(
+        statement.on_conflict_do_update(
+            index_elements=[StudentBalance.student_id],
+            set_={
+                'lessons_count': StudentBalance.lessons_count
+                + statement.excluded.lessons_count,
+                'paid_lessons_count': StudentBalance.paid_lessons_count
+                + statement.excluded.paid_lessons_count,
+                'debt': StudentBalance.debt + statement.excluded.debt,
+            },
+        )
+    )
+
+
+def is_student_visible(session: Session, student_id: int) -> bool:
+    statement = select(Student.student_id).where(Student.student_id == student_id)
+    return session.exec(statement).first() is not None
+
+
+class PaymentStorage:
+    def __init__(self, engine) -> None:
+        self.engine = engine
+
+    # Payments and balances aren't tenant rows themselves, the student is
+    # looked up first so that only the current teacher's students are seen
+    def add_payment(self, student_id: int, lessons_count: int) -> Optional[int]:
+        with unit_of_work(self.engine) as session:
+            if not is_student_visible(session, student_id):
+                return None
+            payment = Payment(
+                student_id=student_id,
+                lessons_count=lessons_count,
+                paid_at=datetime.now(),
+            )
+            session.add(payment)
+            apply_balance_change(session, student_id, paid_delta=lessons_count)
+        return payment.payment_id
+
+    def get_balance(self, student_id: int) -> Optional[StudentBalance]:
+        with unit_of_work(self.engine) as session:
+            statement = (
+                select(StudentBalance)
+                .join(Student, Student.student_id == StudentBalance.student_id)
+                .where(StudentBalance.student_id == student_id)
+            )
+            return session.exec(statement).first()
+
+    def list_debtors(self) -> list[tuple[Student, StudentBalance]]:
+        with unit_of_work(self.engine) as session:
+            statement = (
+                select(Student, StudentBalance)
+                .join(StudentBalance, StudentBalance.student_id == Student.student_id)
+                .where(StudentBalance.debt > 0, Student.deleted_at == None)
+                .order_by(desc(StudentBalance.debt))
+            )
+            return session.exec(statement).all()
+
+    def has_balances(self) -> bool:
+        with unit_of_work(self.engine) as session:
+            return session.exec(select(StudentBalance).limit(1)).first() is not None
+
+    def rebuild_balances(self) -> None:
+        with unit_of_work(self.engine) as session:
+            session.exec(delete(StudentBalance))
+            for model in (Report, ArchivedReport):
+                lessons_statement = select(
+                    model.student_id,
+                    func.count(model.report_id),
+                    func.count(model.report_id).filter(model.is_paid == True),
+                ).group_by(model.student_id)
+                for student_id, lessons_count, paid_count in session.exec(
+                    lessons_statement
+                ):
+                    if student_id is not None:
+                        apply_balance_change(
+                            session,
+                            student_id,
+                            lessons_delta=lessons_count,
+                            paid_delta=paid_count,
+                        )
+
+            payments_statement = select(
+                Payment.student_id, func.sum(Payment.lessons_count)
+            ).group_by(Payment.student_id)
+            for student_id, lessons_count in session.exec(payments_statement):
+                apply_balance_change(session, student_id, paid_delta=lessons_count)
@@ -0,0 +1,45 @@
+import time
+from typing import Callable
+
+render_progress = '{title}: {done} из {total}'.format
+
+
+# Reports progress of a long operation by editing one message. Telegram
+# limits how often a message can be edited, so intermediate updates closer
+# than `min_interval_seconds` to the previous one are skipped.
+class ProgressReporter:
+    def __init__(
+        self,
+        edit: Callable[[str], None],
+        title: str,
+        total: int,
+        min_interval_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.edit = edit
+        self.title = title
+        self.total = total
+        self.min_interval_seconds = min_interval_seconds
+        self.clock = clock
+        self.done = 0
+        # The caller sends the initial message with `text`
+        self._edited_at = clock()
+        self._last_text = self.text
+
+    @property
+    def text(self) -> str:
+        return render_progress(title=self.title, done=self.done, total=self.total)
+
+    def advance(self, count: int = 1) -> None:
+        self.done += count
+        now = self.clock()
+        if self.done < self.total and now - self._edited_at < self.min_interval_seconds:
+            return
+        self._edit(now)
+
+    def _edit(self, now: float) -> None:
+        if (text := self.text) == self._last_text:
+            return
+        self.edit(text)
+        self._edited_at = now
+        self._last_text = text
@@ -0,0 +1,67 @@
+import threading
+from datetime import datetime, timedelta
+from typing import Callable
+
+from lessons_reporter_bot.attachment_storage import AttachmentStorage
+from lessons_reporter_bot.attachment_store import AttachmentStore
+from lessons_reporter_bot.student_storage import StudentStorage
+from lessons_reporter_bot.topic_storage import TopicStorage
+
+
+# Each batch is its own short transaction, with a pause after it, so the bot
+# is never locked out of writing for long
+class DeletedDataPurger:
+    def __init__(
+        self,
+        student_storage: StudentStorage,
+        topic_storage: TopicStorage,
+        attachment_storage: AttachmentStorage,
+        attachment_store: AttachmentStore,
+        retention_days: int,
+        batch_size: int,
+        batch_pause_seconds: float = 0,
+        now: Callable[[], datetime] = datetime.now,
+    ) -> None:
+        self.student_storage = student_storage
+        self.topic_storage = topic_storage
+        self.attachment_storage = attachment_storage
+        self.attachment_store = attachment_store
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.batch_pause_seconds = batch_pause_seconds
+        self.now = now
+
+    def run_pending(self, stop_event: threading.Event | None = None) -> int:
+        deleted_before = self.now() - timedelta(days=self.retention_days)
+        purged_count = 0
+        # Students go first, their reports may be what still keeps a topic
+        for purge_batch in (
+            self.student_storage.purge_deleted_students,
+            self.topic_storage.purge_deleted_topics,
+        ):
+            while batch_count := purge_batch(deleted_before, self.batch_size):
+                purged_count += batch_count
+                if stop_event is not None and stop_event.wait(self.batch_pause_seconds):
+                    return purged_count
+        if purged_count:
+            print(f'Purged {purged_count} rows deleted before {deleted_before}')
+
+        # Stored files are shared by content, one is removed only once no
+        # attachment refers to it
+        deleted_files_count = self.attachment_store.delete_unreferenced(
+            self.attachment_storage.list_hashes(),
+            older_than_seconds=self.retention_days * 24 * 3600,
+        )
+        if deleted_files_count:
+            print(f'Deleted {deleted_files_count} unreferenced attachment files')
+        return purged_count
+
+    def run_forever(
+        self, stop_event: threading.Event, poll_interval_seconds: float = 6 * 3600
+    ) -> None:
+        while not stop_event.is_set():
+            try:
+                self.run_pending(stop_event)
+            except Exception as e:
+                print(f'Purging deleted data failed: {e!r}')
+            stop_event.wait(poll_interval_seconds)
@@ -0,0 +1,135 @@
+import gzip
+import json
+import os
+import threading
+import time
+import zlib
+from contextlib import suppress
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+import requests
+
+UPDATE_LOG_FILE_PREFIX = 'updates-'
+
+# Names users gave themselves and their chats. The ids stay, replays need them.
+SCRUBBED_FIELDS = {
+    'first_name': 'User',
+    'last_name': None,
+    'username': None,
+    'title': None,
+    'phone_number': None,
+}
+
+
+# Typed by users: student names, comments, file names. They are masked rather
+# than dropped, so replayed input still parses the same way.
+MASKED_FIELDS = ('text', 'caption', 'file_name')
+
+
+# Letters become `x`, digits, punctuation and spacing stay, so ids and dates
+# still parse and entity offsets still fit. A command keeps its name.
+def mask_text(text: str) -> str:
+    command, separator, rest = (
+        text.partition(' ') if text.startswith('/') else ('', '', text)
+    )
+    return (
+        command + separator + ''.join('x' if char.isalpha() else char for char in rest)
+    )
+
+
+def scrub(value: Any) -> Any:
+    if isinstance(value, list):
+        return [scrub(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    scrubbed = {}
+    for key, item in value.items():
+        if key in MASKED_FIELDS and isinstance(item, str):
+            scrubbed[key] = mask_text(item)
+        elif key not in SCRUBBED_FIELDS:
+            scrubbed[key] = scrub(item)
+        elif (replacement := SCRUBBED_FIELDS[key]) is not None:
+            scrubbed[key] = replacement
+    return scrubbed
+
+
+def scrub_update(update: dict[str, Any]) -> dict[str, Any]:
+    update = scrub(update)
+    # The message a button belongs to was written by the bot and shows
+    # students' names and comments. Only its id is used by the handlers.
+    if message := (update.get('callback_query') or {}).get('message'):
+        update['callback_query']['message'] = {
+            key: message[key]
+            for key in ('message_id', 'date', 'chat', 'from')
+            if key in message
+        }
+    return update
+
+
+# Appends incoming updates to a gzipped JSON lines file, one file per process
+# start. The file is flushed after every batch, so a crash loses nothing but
+# the gzip trailer.
+class UpdateRecorder:
+    def __init__(
+        self,
+        directory: str | os.PathLike,
+        name: str,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.clock = clock
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        timestamp = datetime.fromtimestamp(clock()).strftime('%Y%m%d-%H%M%S')
+        self.path = directory / f'{UPDATE_LOG_FILE_PREFIX}{name}-{timestamp}.jsonl.gz'
+        self._file = gzip.open(self.path, 'at', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def record_updates(self, updates: list[dict[str, Any]]) -> None:
+        received_at = self.clock()
+        with self._lock:
+            for update in updates:
+                self._file.write(
+                    json.dumps(
+                        {'received_at': received_at, 'update': scrub_update(update)},
+                        ensure_ascii=False,
+                    )
+                    + '\n'
+                )
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    # Wraps the function telebot sends API requests with, so updates are
+    # recorded however they are fetched
+    def wrap_transport(
+        self, send: Callable[..., requests.Response]
+    ) -> Callable[..., requests.Response]:
+        def send_and_record(
+            method: str, url: str, *args: Any, **kwargs: Any
+        ) -> requests.Response:
+            response = send(method, url, *args, **kwargs)
+            if url.endswith('/getUpdates') and response.status_code == 200:
+                with suppress(ValueError, KeyError, TypeError):
+                    if updates := response.json()['result']:
+                        self.record_updates(updates)
+            return response
+
+        return send_and_record
+
+
+# Yields `(received_at, update)` pairs. A log cut short by a crash is read up
+# to its last complete line.
+def read_update_log(
+    path: str | os.PathLike,
+) -> Iterator[tuple[float, dict[str, Any]]]:
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        with suppress(EOFError, zlib.error):
+            for line in file:
+                if not line.endswith('\n'):
+                    return
+                record = json.loads(line)
+                yield record['received_at'], record['update']
@@ -0,0 +1,104 @@
+from datetime import date
+from typing import Iterable
+
+from lessons_reporter_bot.chart_rendering import MonthProgress, fill_months
+from lessons_reporter_bot.models import MonthlySummary, Report, ReportData, ReportRow
+
+FORMATTED_HOMEWORK_STATUS_MAP = {
+    2: 'выполнено',
+    1: 'частично выполнено',
+    0: 'не выполнено',
+}
+MISSING_TOPIC = '—'
+
+# Messages are sent with parse_mode='MARKDOWN' (legacy Markdown), where only
+# these characters start an entity
+MARKDOWN_ESCAPE_TABLE = str.maketrans({'_': '\\_', '*': '\\*', '`': '\\`', '[': '\\['})
+
+render_report_body = (
+    'ФИО: {student_name}\n'
+    'Занятие № {lesson_count} от {lesson_date:%d-%m-%Y}\n'
+    'Тема: {topic}\n'
+    'Д/З: {homework_status}\n'
+    'Активность на занятии {activity}\n'
+    'Занятие {payment}'
+).format
+render_report_comment = '\nКомментарий:\n{comment}'.format
+render_digest_header = 'Итоги за {period_start:%m.%Y}'.format
+render_digest_section = (
+    'ФИО: {student_name}\n'
+    'Проведено занятий: {lessons_count}\n'
+    'Д/З выполнено: {homework_done_count} из {lessons_count}'
+    ' (частично: {homework_partial_count})\n'
+    'Не оплачено занятий: {unpaid_count}'
+).format
+
+render_chart_header = (
+    'ФИО: {student_name}\n'
+    'Зелёный — выполненные Д/З, синий — активность на занятиях,'
+    ' серый — число занятий.'
+).format
+render_chart_month = (
+    '{year}.{month:02d}: занятий {lessons_count}, Д/З {homework_percent}%,'
+    ' активность {proactive_percent}%'
+).format
+
+
+def escape_markdown(text: str) -> str:
+    return text.translate(MARKDOWN_ESCAPE_TABLE)
+
+
+def render_report(
+    report: Report | ReportData | ReportRow, student_name: str, topic: str | None
+) -> str:
+    text = render_report_body(
+        student_name=escape_markdown(student_name),
+        lesson_count=report.lesson_count,
+        lesson_date=report.lesson_date,
+        topic=escape_markdown(topic) if topic is not None else MISSING_TOPIC,
+        homework_status=FORMATTED_HOMEWORK_STATUS_MAP[report.homework_status],
+        activity='высокая' if report.is_proactive else 'слабая',
+        payment='оплачено' if report.is_paid else 'не оплачено',
+    )
+    if report.comment is not None:
+        text += render_report_comment(comment=escape_markdown(report.comment))
+    return text
+
+
+def render_report_row(row: ReportRow) -> str:
+    return render_report(row, student_name=row.student_name, topic=row.topic)
+
+
+def render_reports(rows: Iterable[ReportRow]) -> list[str]:
+    return [render_report(row, row.student_name, row.topic) for row in rows]
+
+
+def render_monthly_digest(summaries: list[MonthlySummary], period_start: date) -> str:
+    sections = [
+        render_digest_section(
+            student_name=escape_markdown(summary.student_name),
+            lessons_count=summary.lessons_count,
+            homework_done_count=summary.homework_done_count,
+            homework_partial_count=summary.homework_partial_count,
+            unpaid_count=summary.unpaid_count,
+        )
+        for summary in summaries
+    ]
+    return '\n\n'.join((render_digest_header(period_start=period_start), *sections))
+
+
+# The numbers behind the chart, month by month
+def render_chart_caption(student_name: str, months: list[MonthProgress]) -> str:
+    lines = [
+        render_chart_month(
+            year=month.year,
+            month=month.month,
+            lessons_count=month.lessons_count,
+            homework_percent=round(month.homework_share * 100),
+            proactive_percent=round(month.proactive_share * 100),
+        )
+        for month in fill_months(months)
+    ]
+    return '\n'.join(
+        (render_chart_header(student_name=escape_markdown(student_name)), '', *lines)
+    )
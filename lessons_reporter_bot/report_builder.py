@@ -1,9 +1,12 @@
-from dataclasses import dataclass, field
+import threading
 from datetime import date
 
 import pydantic
 
-from lessons_reporter_bot.models import ReportData
+from lessons_reporter_bot.draft_storage import DraftStorage
+from lessons_reporter_bot.models import AttachmentData, Report, ReportData
+
+EMPTY_DRAFT_PAYLOAD = '{}'
 
 
 class TempReport(pydantic.BaseModel):
@@ -15,43 +18,98 @@ class TempReport(pydantic.BaseModel):
     is_proactive: bool | None = None
     is_paid: bool | None = None
     comment: str | None = None
+    attachments: list[AttachmentData] | None = None
+    # Set when the wizard corrects a saved report instead of creating one
+    editing_report_id: int | None = None
 
 
-@dataclass
 class ReportBuilder:
-    temp_report: TempReport = field(default_factory=TempReport)
-
-    def clear_temp_report(self) -> None:
-        self.temp_report = TempReport()
-
-    def set_lesson_date_1(self, lesson_date: date) -> None:
-        self.temp_report.lesson_date = lesson_date
-
-    def set_lesson_count_4(self, lesson_count: int) -> None:
-        self.temp_report.lesson_count = lesson_count
-
-    def set_topic_id_(self, topic_id: int) -> None:
-        self.temp_report.topic_id = topic_id
-
-    def set_student_id_3(self, student_id: int) -> None:
-        self.temp_report.student_id = student_id
-
-    def set_homework_status_5(self, homework_status: int) -> None:
-        self.temp_report.homework_status = homework_status
-
-    def set_is_proactive_6(self, is_proactive: bool) -> None:
-        self.temp_report.is_proactive = is_proactive
-
-    def set_is_paid_7(self, is_paid: bool) -> None:
-        self.temp_report.is_paid = is_paid
-
-    def set_comment_8(self, text: str | None) -> None:
-        self.temp_report.comment = text
-
-    def preview_complete_report(self) -> ReportData:
-        return ReportData.model_validate(self.temp_report, from_attributes=True)
-
-    def complete_report(self) -> ReportData:
-        report = self.preview_complete_report()
-        self.clear_temp_report()
+    # Drafts are loaded lazily on first access during an update and written
+    # back once by `flush`, so several setters in one update cost one write
+    def __init__(self, draft_storage: DraftStorage) -> None:
+        self.draft_storage = draft_storage
+        self._temp_reports: dict[int, TempReport] = {}
+        self._loaded_payloads: dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def get_temp_report(self, chat_id: int) -> TempReport:
+        with self._lock:
+            if temp_report := self._temp_reports.get(chat_id):
+                return temp_report
+
+        payload = self.draft_storage.get_draft(chat_id) or EMPTY_DRAFT_PAYLOAD
+        temp_report = TempReport.model_validate_json(payload)
+        with self._lock:
+            self._loaded_payloads[chat_id] = payload
+            return self._temp_reports.setdefault(chat_id, temp_report)
+
+    def flush(self, chat_id: int) -> None:
+        with self._lock:
+            temp_report = self._temp_reports.pop(chat_id, None)
+            loaded_payload = self._loaded_payloads.pop(chat_id, EMPTY_DRAFT_PAYLOAD)
+
+        if temp_report is None:
+            return
+
+        payload = temp_report.model_dump_json(exclude_none=True)
+        if payload == loaded_payload:
+            return
+        if payload == EMPTY_DRAFT_PAYLOAD:
+            self.draft_storage.delete_draft(chat_id)
+        else:
+            self.draft_storage.save_draft(chat_id, payload)
+
+    def discard(self, chat_id: int) -> None:
+        with self._lock:
+            self._temp_reports.pop(chat_id, None)
+            self._loaded_payloads.pop(chat_id, None)
+
+    def clear_temp_report(self, chat_id: int) -> None:
+        self.get_temp_report(chat_id)
+        with self._lock:
+            self._temp_reports[chat_id] = TempReport()
+
+    def load_report(self, chat_id: int, report: Report) -> None:
+        self.get_temp_report(chat_id)
+        temp_report = TempReport.model_validate(report, from_attributes=True)
+        temp_report.editing_report_id = report.report_id
+        with self._lock:
+            self._temp_reports[chat_id] = temp_report
+
+    def set_lesson_date_1(self, chat_id: int, lesson_date: date) -> None:
+        self.get_temp_report(chat_id).lesson_date = lesson_date
+
+    def set_lesson_count_4(self, chat_id: int, lesson_count: int) -> None:
+        self.get_temp_report(chat_id).lesson_count = lesson_count
+
+    def set_topic_id_(self, chat_id: int, topic_id: int) -> None:
+        self.get_temp_report(chat_id).topic_id = topic_id
+
+    def set_student_id_3(self, chat_id: int, student_id: int) -> None:
+        self.get_temp_report(chat_id).student_id = student_id
+
+    def set_homework_status_5(self, chat_id: int, homework_status: int) -> None:
+        self.get_temp_report(chat_id).homework_status = homework_status
+
+    def set_is_proactive_6(self, chat_id: int, is_proactive: bool) -> None:
+        self.get_temp_report(chat_id).is_proactive = is_proactive
+
+    def set_is_paid_7(self, chat_id: int, is_paid: bool) -> None:
+        self.get_temp_report(chat_id).is_paid = is_paid
+
+    def set_comment_8(self, chat_id: int, text: str | None) -> None:
+        self.get_temp_report(chat_id).comment = text
+
+    def add_attachment_9(self, chat_id: int, attachment: AttachmentData) -> None:
+        temp_report = self.get_temp_report(chat_id)
+        temp_report.attachments = (temp_report.attachments or []) + [attachment]
+
+    def preview_complete_report(self, chat_id: int) -> ReportData:
+        return ReportData.model_validate(
+            self.get_temp_report(chat_id), from_attributes=True
+        )
+
+    def complete_report(self, chat_id: int) -> ReportData:
+        report = self.preview_complete_report(chat_id)
+        self.clear_temp_report(chat_id)
         return report
@@ -1,8 +1,31 @@
+from datetime import date
 from typing import Optional
 
-from sqlmodel import Session, create_engine, desc, func, select
+from sqlmodel import (
+    case,
+    create_engine,
+    delete,
+    desc,
+    extract,
+    func,
+    insert,
+    select,
+    union_all,
+    update,
+)
 
-from lessons_reporter_bot.models import Report, ReportData
+from lessons_reporter_bot.chart_rendering import MonthProgress
+from lessons_reporter_bot.database import unit_of_work
+from lessons_reporter_bot.models import (
+    ArchivedReport,
+    MonthlySummary,
+    Report,
+    ReportData,
+    ReportRow,
+    Student,
+    Topic,
+)
+from lessons_reporter_bot.payment_storage import apply_balance_change
 
 
 class ReportStorage:
@@ -10,22 +33,26 @@ class ReportStorage:
         self.engine = engine
 
     def count_reports(self) -> int:
-        with Session(self.engine) as session:
+        with unit_of_work(self.engine) as session:
             statement = select(Report)
             result = session.exec(statement)
             return len(result.all())
 
     def add_report(self, report: ReportData) -> None:
-        with Session(self.engine) as session:
+        with unit_of_work(self.engine) as session:
             session.add(report)
-            session.commit()
-            session.refresh(report)
-            return report.report_id
+            apply_balance_change(
+                session,
+                report.student_id,
+                lessons_delta=1,
+                paid_delta=int(report.is_paid),
+            )
+        return report.report_id
 
     def list_reports(
         self, order_by: str | None = None, descending: bool = False
     ) -> list[Report]:
-        with Session(self.engine) as session:
+        with unit_of_work(self.engine) as session:
             statement = select(Report)
             if order_by:
                 column = getattr(Report, order_by)
@@ -39,7 +66,7 @@ class ReportStorage:
     def list_reports_by_student_id(
         self, student_id: int, order_by: str | None = None, descending: bool = False
     ) -> list[Report]:
-        with Session(self.engine) as session:
+        with unit_of_work(self.engine) as session:
             statement = select(Report).where(Report.student_id == student_id)
             if order_by:
                 column = getattr(Report, order_by)
@@ -50,25 +77,260 @@ class ReportStorage:
                 )
             return session.exec(statement).all()
 
-    def get_report_by_id(self, report_id: int) -> Optional[Report]:
-        with Session(self.engine) as session:
-            statement = select(Report).where(Report.report_id == report_id)
-            return session.exec(statement).first()
+    def get_report_by_id(self, report_id: int) -> Optional[Report | ArchivedReport]:
+        with unit_of_work(self.engine) as session:
+            return session.get(Report, report_id) or session.get(
+                ArchivedReport, report_id
+            )
+
+    def get_report_row(self, report_id: int) -> Optional[ReportRow]:
+        with unit_of_work(self.engine) as session:
+            for model in (Report, ArchivedReport):
+                statement = self._report_rows_statement(model).where(
+                    model.report_id == report_id
+                )
+                if row := session.exec(statement).first():
+                    return ReportRow(*row)
+            return None
+
+    # Newest first. The archive is only queried once the requested page runs
+    # past the live reports, so recent pages never touch it.
+    def list_report_rows_page(
+        self, offset: int, limit: int, student_id: int | None = None
+    ) -> tuple[list[ReportRow], bool]:
+        with unit_of_work(self.engine) as session:
+            rows = []
+            for model in (Report, ArchivedReport):
+                statement = self._report_rows_statement(model)
+                count_statement = (
+                    select(func.count(model.report_id))
+                    .join(Student, Student.student_id == model.student_id)
+                    .where(Student.deleted_at == None)
+                )
+                if student_id is not None:
+                    statement = statement.where(model.student_id == student_id)
+                    count_statement = count_statement.where(
+                        model.student_id == student_id
+                    )
+                statement = statement.order_by(
+                    desc(model.lesson_date), desc(model.report_id)
+                )
+
+                model_offset = max(offset, 0)
+                rows += [
+                    ReportRow(*row)
+                    for row in session.exec(
+                        statement.offset(model_offset).limit(limit - len(rows) + 1)
+                    )
+                ]
+                if len(rows) > limit:
+                    return rows[:limit], False
+
+                offset -= session.exec(count_statement).one()
+
+            return rows, True
+
+    def list_saved_report_rows(self) -> list[ReportRow]:
+        with unit_of_work(self.engine) as session:
+            statement = self._report_rows_statement().where(
+                Report.is_sent == False, Student.parent_id != None
+            )
+            return [ReportRow(*row) for row in session.exec(statement)]
+
+    # Reports of deleted students are left out by the join, there's no need
+    # to check each row
+    def _report_rows_statement(
+        self, model: type[Report] | type[ArchivedReport] = Report
+    ):
+        return (
+            select(
+                model.report_id,
+                model.lesson_date,
+                model.lesson_count,
+                model.homework_status,
+                model.is_proactive,
+                model.is_paid,
+                model.comment,
+                model.student_id,
+                Student.name,
+                Student.parent_id,
+                Topic.topic,
+            )
+            .join(Student, Student.student_id == model.student_id)
+            .outerjoin(Topic, Topic.topic_id == model.topic_id)
+            .where(Student.deleted_at == None)
+        )
 
     def lessons_count_by_student_id(self, student_id: int) -> int:
-        with Session(self.engine) as session:
-            statement = select(func.count(Report.report_id)).where(
-                Report.student_id == student_id
+        with unit_of_work(self.engine) as session:
+            return sum(
+                session.exec(
+                    select(func.count(model.report_id)).where(
+                        model.student_id == student_id
+                    )
+                ).one()
+                for model in (Report, ArchivedReport)
             )
-            return session.exec(statement).first()
 
     def get_saved_reports(self) -> list:
-        with Session(self.engine) as session:
+        with unit_of_work(self.engine) as session:
             statement = select(Report).where(Report.is_sent == False)
             return session.exec(statement).all()
 
-    def set_is_sent(self, report_id: int) -> None:
-        with Session(self.engine) as session:
-            report = session.get(Report, report_id)
-            report.is_sent = True
-            session.commit()
+    # The report may have been archived while it was being sent. Returns
+    # False if it's gone altogether.
+    def set_is_sent(
+        self,
+        report_id: int,
+        is_sent: bool = True,
+        sent_chat_id: int | None = None,
+        sent_message_id: int | None = None,
+    ) -> bool:
+        values = {'is_sent': is_sent}
+        if sent_message_id is not None:
+            values.update(sent_chat_id=sent_chat_id, sent_message_id=sent_message_id)
+        with unit_of_work(self.engine) as session:
+            for model in (Report, ArchivedReport):
+                result = session.exec(
+                    update(model).where(model.report_id == report_id).values(**values)
+                )
+                if result.rowcount:
+                    return True
+            return False
+
+    # Only the columns that differ are written, in a single UPDATE. Balances
+    # follow a change of the student or of the payment status.
+    def update_report(self, report_id: int, report_data: ReportData) -> Report | None:
+        with unit_of_work(self.engine) as session:
+            if (report := session.get(Report, report_id)) is None:
+                return None
+            previous_student_id, previous_is_paid = report.student_id, report.is_paid
+            for name, value in report_data.model_dump().items():
+                if getattr(report, name) != value:
+                    setattr(report, name, value)
+
+            if (report.student_id, report.is_paid) != (
+                previous_student_id,
+                previous_is_paid,
+            ):
+                apply_balance_change(
+                    session,
+                    previous_student_id,
+                    lessons_delta=-1,
+                    paid_delta=-int(previous_is_paid),
+                )
+                apply_balance_change(
+                    session,
+                    report.student_id,
+                    lessons_delta=1,
+                    paid_delta=int(report.is_paid),
+                )
+            return report
+
+    # Marks the report as sent unless it already is, so overlapping mass sends
+    # never deliver one report twice
+    def claim_unsent_report(self, report_id: int) -> bool:
+        with unit_of_work(self.engine) as session:
+            result = session.exec(
+                update(Report)
+                .where(Report.report_id == report_id, Report.is_sent == False)
+                .values(is_sent=True)
+            )
+            return result.rowcount == 1
+
+    # Each batch is moved with one INSERT ... SELECT and one DELETE in its own
+    # transaction, so the bot keeps writing between batches. Unsent reports
+    # stay, mass sends only look for them in the live table.
+    def archive_reports_older_than(self, cutoff: date, batch_size: int) -> int:
+        columns = [column.name for column in ArchivedReport.__table__.columns]
+        archived_count = 0
+        while True:
+            with unit_of_work(self.engine) as session:
+                report_ids = session.exec(
+                    select(Report.report_id)
+                    .where(Report.lesson_date < cutoff, Report.is_sent == True)
+                    .order_by(Report.lesson_date)
+                    .limit(batch_size)
+                ).all()
+                if not report_ids:
+                    return archived_count
+
+                session.exec(
+                    insert(ArchivedReport).from_select(
+                        columns,
+                        select(*(Report.__table__.c[name] for name in columns)).where(
+                            Report.report_id.in_(report_ids)
+                        ),
+                    )
+                )
+                session.exec(delete(Report).where(Report.report_id.in_(report_ids)))
+            archived_count += len(report_ids)
+
+    # One aggregate query over the live and archived reports of the student
+    def monthly_progress(self, student_id: int) -> list[MonthProgress]:
+        with unit_of_work(self.engine) as session:
+            reports = union_all(
+                *(
+                    select(
+                        model.lesson_date, model.homework_status, model.is_proactive
+                    ).where(model.student_id == student_id)
+                    for model in (Report, ArchivedReport)
+                )
+            ).subquery()
+            year = extract('year', reports.c.lesson_date)
+            month = extract('month', reports.c.lesson_date)
+            statement = (
+                select(
+                    year,
+                    month,
+                    func.count(),
+                    func.sum(case((reports.c.homework_status == 2, 1), else_=0)),
+                    func.sum(case((reports.c.homework_status == 1, 1), else_=0)),
+                    func.sum(case((reports.c.is_proactive == True, 1), else_=0)),
+                )
+                .group_by(year, month)
+                .order_by(year, month)
+            )
+            return [MonthProgress(*row) for row in session.exec(statement)]
+
+    def monthly_summaries(self, start: date, end: date) -> list[MonthlySummary]:
+        with unit_of_work(self.engine) as session:
+            statement = (
+                select(
+                    Student.student_id,
+                    Student.name,
+                    Student.parent_id,
+                    func.count(Report.report_id),
+                    func.sum(case((Report.homework_status == 2, 1), else_=0)),
+                    func.sum(case((Report.homework_status == 1, 1), else_=0)),
+                    func.sum(case((Report.is_paid == False, 1), else_=0)),
+                )
+                .join(Report, Report.student_id == Student.student_id)
+                .where(
+                    Student.parent_id != None,
+                    Student.deleted_at == None,
+                    Report.lesson_date >= start,
+                    Report.lesson_date < end,
+                )
+                .group_by(Student.student_id, Student.name, Student.parent_id)
+            )
+            return [
+                MonthlySummary(
+                    student_id=student_id,
+                    student_name=student_name,
+                    parent_id=parent_id,
+                    lessons_count=lessons_count,
+                    homework_done_count=homework_done_count,
+                    homework_partial_count=homework_partial_count,
+                    unpaid_count=unpaid_count,
+                )
+                for (
+                    student_id,
+                    student_name,
+                    parent_id,
+                    lessons_count,
+                    homework_done_count,
+                    homework_partial_count,
+                    unpaid_count,
+                ) in session.exec(statement)
+            ]
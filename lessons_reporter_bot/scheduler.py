@@ -0,0 +1,74 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable
+
+from telebot import TeleBot
+
+
+# Two priority classes with separate worker budgets. Interactive handlers run
+# on the bot's own threads and are only counted here, so a bulk job can never
+# take their place. Bulk jobs run on a small pool of their own and are
+# iterables: between two steps the job steps aside while any interactive
+# handler is running.
+class PriorityScheduler:
+    def __init__(self, bulk_workers: int, max_yield_seconds: float) -> None:
+        self.max_yield_seconds = max_yield_seconds
+        self._bulk_executor = ThreadPoolExecutor(
+            max_workers=bulk_workers, thread_name_prefix='bulk'
+        )
+        self._interactive_count = 0
+        self._idle = threading.Condition()
+
+    # The task counts as interactive from now until it finishes, so bulk jobs
+    # also step aside while it still waits for a free thread
+    def interactive_task(self, task: Callable[..., None]) -> Callable[..., None]:
+        with self._idle:
+            self._interactive_count += 1
+
+        def run(*args, **kwargs) -> None:
+            try:
+                task(*args, **kwargs)
+            finally:
+                with self._idle:
+                    self._interactive_count -= 1
+                    if not self._interactive_count:
+                        self._idle.notify_all()
+
+        return run
+
+    @property
+    def interactive_count(self) -> int:
+        return self._interactive_count
+
+    # The wait is bounded, so bulk work still moves forward on a busy bot
+    def yield_to_interactive(self) -> None:
+        with self._idle:
+            self._idle.wait_for(
+                lambda: not self._interactive_count, timeout=self.max_yield_seconds
+            )
+
+    def submit_bulk(self, job: Iterable[object], name: str) -> Future:
+        return self._bulk_executor.submit(self._run_bulk, job, name)
+
+    def _run_bulk(self, job: Iterable[object], name: str) -> int:
+        steps = 0
+        try:
+            for _ in job:
+                steps += 1
+                self.yield_to_interactive()
+        except Exception as e:
+            print(f'Bulk job {name} failed: {e!r}')
+        return steps
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._bulk_executor.shutdown(wait=wait)
+
+
+# Every handler the bot dispatches is counted as interactive work
+class PriorityTeleBot(TeleBot):
+    def __init__(self, *args, scheduler: PriorityScheduler, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.scheduler = scheduler
+
+    def _exec_task(self, task: Callable[..., None], *args, **kwargs) -> None:
+        super()._exec_task(self.scheduler.interactive_task(task), *args, **kwargs)
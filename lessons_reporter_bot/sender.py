@@ -0,0 +1,155 @@
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator
+
+import pydantic
+
+from lessons_reporter_bot.models import BotServiceMessage
+from lessons_reporter_bot.rate_limiter import RateLimiter
+from lessons_reporter_bot.spool import MessageSpool, SpoolPosition
+
+# Called with the chat id, the message, the id of its text if that's already
+# sent and the number of its files already sent. Yields every message sent,
+# the text first.
+SendMessage = Callable[[int, BotServiceMessage, int | None, int], Iterator[Any]]
+# Called with the report id, the chat id and the sent text
+RecordSentReport = Callable[[int, int, Any], None]
+
+message_adapter = pydantic.TypeAdapter(BotServiceMessage)
+
+logger = logging.getLogger(__name__)
+
+
+# What is already sent of the message at the head of the spool
+@dataclass
+class DeliveryProgress:
+    position: SpoolPosition
+    reply_to: int | None
+    sent_file_count: int
+
+
+# Messages are written to the spool first and sent from there in order. While
+# sending fails with a transient error the same message is retried with
+# growing pauses, from the part that failed, anything Telegram rejects is
+# dropped. Messages that deliver a report are recorded once their text is
+# sent, so the report can be corrected later.
+class RateLimitedSender:
+    def __init__(
+        self,
+        send: SendMessage,
+        rate_limiter: RateLimiter,
+        spool: MessageSpool,
+        record_sent_report: RecordSentReport | None = None,
+        is_transient_error: Callable[[Exception], bool] = lambda error: False,
+        before_send: Callable[[], None] | None = None,
+        backoff_seconds: float = 1,
+        max_backoff_seconds: float = 60,
+    ) -> None:
+        self.send = send
+        self.rate_limiter = rate_limiter
+        self.spool = spool
+        self.record_sent_report = record_sent_report
+        self.is_transient_error = is_transient_error
+        self.before_send = before_send
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self._failed_attempts = 0
+        self._progress: DeliveryProgress | None = None
+
+    # With `reply_to` the text of the message and its first `sent_file_count`
+    # files were already sent, only the rest is spooled
+    def enqueue(
+        self,
+        chat_id: int,
+        message: BotServiceMessage,
+        report_id: int | None = None,
+        reply_to: int | None = None,
+        sent_file_count: int = 0,
+    ) -> None:
+        self.spool.append(
+            {
+                'chat_id': chat_id,
+                'message': message_adapter.dump_python(message, mode='json'),
+                'report_id': report_id,
+                'reply_to': reply_to,
+                'sent_file_count': sent_file_count,
+            }
+        )
+
+    def pending_count(self) -> int:
+        return self.spool.pending_count
+
+    # Stops early at the first transient failure
+    def drain(self) -> int:
+        sent_count = 0
+        while (entry := self.spool.peek()) is not None:
+            if not self._send_one(*entry):
+                return sent_count
+            sent_count += 1
+        return sent_count
+
+    def run_forever(self, stop_event: threading.Event) -> None:
+        while not stop_event.is_set():
+            if (entry := self.spool.peek()) is None:
+                self.spool.wait(timeout=0.5)
+            elif not self._send_one(*entry):
+                stop_event.wait(self._backoff())
+
+    # Returns False if the message should be retried later
+    def _send_one(self, record: dict, position: SpoolPosition) -> bool:
+        chat_id = record['chat_id']
+        if self._progress is None or self._progress.position != position:
+            # Records spooled before parts were tracked have neither field
+            self._progress = DeliveryProgress(
+                position, record.get('reply_to'), record.get('sent_file_count', 0)
+            )
+        progress = self._progress
+        if self.before_send is not None:
+            self.before_send()
+        self.rate_limiter.acquire()
+        try:
+            for sent_message in self.send(
+                chat_id,
+                message_adapter.validate_python(record['message']),
+                progress.reply_to,
+                progress.sent_file_count,
+            ):
+                if progress.reply_to is None:
+                    progress.reply_to = sent_message.message_id
+                    self._record_sent_report(
+                        record.get('report_id'), chat_id, sent_message
+                    )
+                else:
+                    progress.sent_file_count += 1
+        except Exception as e:
+            if self.is_transient_error(e):
+                if not self._failed_attempts:
+                    print(f'Sending is paused, {self.pending_count()} pending: {e!r}')
+                self._failed_attempts += 1
+                return False
+            logger.warning('Failed to send message to %s: %r', chat_id, e)
+
+        if self._failed_attempts:
+            print(f'Sending resumed, {self.pending_count()} pending')
+            self._failed_attempts = 0
+        self.spool.ack(position)
+        self._progress = None
+        return True
+
+    def _record_sent_report(
+        self, report_id: int | None, chat_id: int, sent_message: Any
+    ) -> None:
+        # Records spooled before reports were tracked have no report id
+        if self.record_sent_report is None or not report_id:
+            return
+        try:
+            self.record_sent_report(report_id, chat_id, sent_message)
+        except Exception:
+            logger.exception('Failed to record sent report %s', report_id)
+
+    def _backoff(self) -> float:
+        return min(
+            self.max_backoff_seconds,
+            self.backoff_seconds * 2 ** (self._failed_attempts - 1),
+        )
@@ -1,3 +1,6 @@
+from datetime import time
+
+import pydantic
 import pydantic_settings
 
 UserId = int
@@ -11,5 +14,105 @@ class Settings(pydantic_settings.BaseSettings):
     model_config = pydantic_settings.SettingsConfigDict(env_file='.env')
 
     bot_token: str
+    # Added as teachers on startup, more can be added from the bot
     superusers: list[UserId]
     database_url: str
+    # Role checks are cached and reloaded from the database this often
+    role_cache_ttl_seconds: float = 60
+
+    # Connection pool, ignored for in-memory SQLite databases
+    database_pool_size: int = 5
+    database_max_overflow: int = 10
+    database_pool_recycle: int = 3600
+    database_pool_pre_ping: bool = True
+
+    # Applied to every new SQLite connection
+    sqlite_journal_mode: str = 'WAL'
+    sqlite_synchronous: str = 'NORMAL'
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_cache_size_kib: int = 16 * 1024
+
+    # Repeated presses of a button that changes data, and updates Telegram
+    # delivers again, are dropped within this window. Also how often the
+    # stored keys are pruned.
+    callback_dedup_ttl_seconds: int = 600
+    callback_dedup_max_entries: int = 10_000
+
+    # Monthly digest for parents, sent on the given day for the previous month
+    digest_enabled: bool = True
+    digest_day_of_month: int = pydantic.Field(default=1, ge=1, le=28)
+    digest_time: time = time(hour=10)
+
+    # Reports older than this are moved to the archive table. Kept above two
+    # months so the monthly digest only ever reads live reports.
+    report_archive_after_days: int = pydantic.Field(default=365, ge=62)
+    report_archive_batch_size: int = 500
+
+    # Deleted students and topics are hidden right away and removed for good
+    # after this many days, a small batch per transaction
+    deleted_data_retention_days: int = pydantic.Field(default=30, ge=0)
+    purge_batch_size: int = pydantic.Field(default=200, ge=1)
+    purge_batch_pause_seconds: float = 0.1
+
+    # Compressed snapshots made by /backup and, if the interval is positive,
+    # periodically in the background
+    backup_dir: str = 'backups'
+    backup_keep: int = pydantic.Field(default=7, ge=1)
+    backup_interval_hours: float = 24
+    backup_pages_per_step: int = 256
+    backup_step_sleep_seconds: float = 0.01
+
+    # Photos and files attached to reports, stored under their SHA-256. The
+    # Bot API doesn't let bots download files larger than 20 MB.
+    attachment_dir: str = 'attachments'
+    attachment_max_bytes: int = pydantic.Field(default=20 * 1024 * 1024, ge=1)
+    attachments_per_report: int = pydantic.Field(default=10, ge=1)
+
+    # Progress charts are rendered by this many processes, one per core if
+    # unset, and kept here until their data changes
+    chart_dir: str = 'charts'
+    chart_workers: int | None = pydantic.Field(default=None, ge=1)
+
+    # HTTP client for the Bot API. The URL points to a local Bot API server,
+    # api.telegram.org is used if unset.
+    telegram_api_url: str | None = None
+    telegram_pool_size: int = 16
+    telegram_connect_timeout: float = 5
+    telegram_read_timeout: float = 15
+    telegram_max_retries: int = 3
+    telegram_retry_backoff_seconds: float = 0.5
+    telegram_retry_max_backoff_seconds: float = 10
+
+    # Reports and digests that can't be sent right away are written here and
+    # sent once Telegram is reachable again. Each process has its own
+    # subdirectory.
+    spool_dir: str = 'spool'
+    spool_segment_max_bytes: int = 1024 * 1024
+    spool_retry_backoff_seconds: float = 1
+    spool_retry_max_backoff_seconds: float = 60
+
+    # Incoming updates are recorded here with users' names removed, to be
+    # replayed by benchmarks/replay_updates.py. Nothing is recorded if unset.
+    update_log_dir: str | None = None
+
+    # Progress messages of long operations are edited at most this often
+    progress_update_interval_seconds: float = 2
+
+    # Telegram allows about 30 messages per second for a single bot
+    telegram_bulk_messages_per_second: float = 20
+
+    # Updates from users are handled by their own threads. Bulk jobs like mass
+    # sends, digests and backups run on a separate pool and pause, at most
+    # this long at a time, while updates are being handled.
+    interactive_workers: int = 4
+    bulk_workers: int = 2
+    bulk_max_yield_seconds: float = 1
+
+    # More than one worker runs a supervisor that routes updates by chat id
+    workers: int = 1
+    # Directory for state shared between workers, in-process memory if unset.
+    # With more than one worker, parent history is only cached if it's set.
+    shared_state_dir: str | None = None
+    # How long the bot waits for text input requested by a button
+    next_step_ttl_seconds: int = 3600
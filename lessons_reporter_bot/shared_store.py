@@ -0,0 +1,83 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Protocol
+
+
+class SharedStore(Protocol):
+    def get(self, key: str) -> Any | None: ...
+
+    def set(self, key: str, value: Any, ttl_seconds: float | None = None) -> None: ...
+
+    def delete(self, key: str) -> None: ...
+
+
+class MemorySharedStore:
+    def __init__(self) -> None:
+        self._values: dict[str, tuple[Any, float | None]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            value, expires_at = self._values.get(key, (None, None))
+            if expires_at is not None and expires_at <= time.time():
+                del self._values[key]
+                return None
+            return value
+
+    def set(self, key: str, value: Any, ttl_seconds: float | None = None) -> None:
+        expires_at = time.time() + ttl_seconds if ttl_seconds is not None else None
+        with self._lock:
+            self._values[key] = (value, expires_at)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._values.pop(key, None)
+
+
+# Local stand-in for a networked store: one JSON file per key, replaced
+# atomically. Chat state is only touched by the worker the chat is routed to.
+# Parent history versions are written by the teacher's worker and read by the
+# parent's, they're replaced whole and the last write wins, so no
+# cross-process locking is needed either.
+class FileSharedStore:
+    def __init__(self, directory: str | Path) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def get(self, key: str) -> Any | None:
+        path = self._path(key)
+        try:
+            record = json.loads(path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if record['expires_at'] is not None and record['expires_at'] <= time.time():
+            path.unlink(missing_ok=True)
+            return None
+        return record['value']
+
+    def set(self, key: str, value: Any, ttl_seconds: float | None = None) -> None:
+        record = {
+            'value': value,
+            'expires_at': time.time() + ttl_seconds
+            if ttl_seconds is not None
+            else None,
+        }
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(file_descriptor, 'w') as temp_file:
+            json.dump(record, temp_file)
+        os.replace(temp_path, self._path(key))
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f'{hashlib.sha1(key.encode()).hexdigest()}.json'
+
+
+def create_shared_store(directory: str | None) -> SharedStore:
+    return FileSharedStore(directory) if directory else MemorySharedStore()
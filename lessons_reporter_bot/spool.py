@@ -0,0 +1,200 @@
+import json
+import os
+import tempfile
+import threading
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, BinaryIO
+
+SEGMENT_SUFFIX = '.log'
+CURSOR_FILE_NAME = 'cursor.json'
+
+
+@dataclass(frozen=True, slots=True, order=True)
+class SpoolPosition:
+    segment: int
+    offset: int
+
+
+# Append-only log of outgoing messages kept in numbered segment files of JSON
+# lines. Threads appending at the same time share one fsync. A single reader
+# takes records in order and acknowledges them; the acknowledged position is
+# kept in a cursor file and segments behind it are deleted.
+class MessageSpool:
+    def __init__(self, directory: str | os.PathLike, segment_max_bytes: int) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_max_bytes = segment_max_bytes
+
+        self._condition = threading.Condition()
+        self._appended_count = 0
+        self._synced_count = 0
+        self._is_syncing = False
+        self._cursor = self._load_cursor()
+        self._reader: BinaryIO | None = None
+        self._reader_segment = -1
+
+        segments = self._list_segments()
+        self._pending_count = self._count_records_after_cursor(segments)
+        # Writing always starts a new segment, the last one may end with a
+        # line cut short by a crash
+        self._segment = max(segments[-1] + 1 if segments else 0, self._cursor.segment)
+        self._file = self._open_segment(self._segment)
+
+    @property
+    def pending_count(self) -> int:
+        return self._pending_count
+
+    # Returns once the record is on disk
+    def append(self, record: dict[str, Any]) -> None:
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode()
+        with self._condition:
+            if self._file.tell() and self._file.tell() + len(line) > (
+                self.segment_max_bytes
+            ):
+                self._rotate()
+            self._file.write(line)
+            self._file.flush()
+            self._appended_count += 1
+            self._pending_count += 1
+            self._condition.notify_all()
+            self._wait_synced(self._appended_count)
+
+    # The first thread to find the tail unsynced syncs it for everybody
+    # waiting behind it
+    def _wait_synced(self, count: int) -> None:
+        while self._synced_count < count:
+            if self._is_syncing:
+                self._condition.wait()
+                continue
+            self._is_syncing = True
+            target_count = self._appended_count
+            file = self._file
+            self._condition.release()
+            try:
+                os.fsync(file.fileno())
+            finally:
+                self._condition.acquire()
+                self._is_syncing = False
+                self._condition.notify_all()
+            self._synced_count = max(self._synced_count, target_count)
+
+    def _rotate(self) -> None:
+        self._condition.wait_for(lambda: not self._is_syncing)
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._synced_count = self._appended_count
+        self._segment += 1
+        self._file = self._open_segment(self._segment)
+
+    def _open_segment(self, segment: int) -> BinaryIO:
+        file = open(self._segment_path(segment), 'ab')
+        # Makes the new file itself survive a crash
+        directory_descriptor = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(directory_descriptor)
+        finally:
+            os.close(directory_descriptor)
+        return file
+
+    # Returns the oldest record that isn't acknowledged yet, with the position
+    # to acknowledge it with
+    def peek(self) -> tuple[dict[str, Any], SpoolPosition] | None:
+        while True:
+            reader = self._open_reader()
+            line = reader.readline() if reader is not None else b''
+            if line.endswith(b'\n'):
+                return json.loads(line), SpoolPosition(
+                    self._cursor.segment, self._cursor.offset + len(line)
+                )
+
+            with self._condition:
+                writing_segment = self._segment
+            if self._cursor.segment >= writing_segment:
+                return None
+            # Anything left in an older segment is a line cut short by a crash
+            next_segments = [
+                segment
+                for segment in self._list_segments()
+                if segment > self._cursor.segment
+            ]
+            self._move_cursor(
+                SpoolPosition(min(next_segments, default=writing_segment), 0)
+            )
+
+    def ack(self, position: SpoolPosition) -> None:
+        with self._condition:
+            self._pending_count -= 1
+        self._move_cursor(position)
+
+    def wait(self, timeout: float) -> bool:
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self._pending_count > 0, timeout=timeout
+            )
+
+    def close(self) -> None:
+        with self._condition:
+            self._condition.wait_for(lambda: not self._is_syncing)
+            os.fsync(self._file.fileno())
+            self._file.close()
+        if self._reader is not None:
+            self._reader.close()
+
+    def _open_reader(self) -> BinaryIO | None:
+        if self._reader_segment != self._cursor.segment:
+            if self._reader is not None:
+                self._reader.close()
+            try:
+                self._reader = open(self._segment_path(self._cursor.segment), 'rb')
+            except FileNotFoundError:
+                self._reader = None
+            self._reader_segment = self._cursor.segment
+        if self._reader is not None:
+            self._reader.seek(self._cursor.offset)
+        return self._reader
+
+    # A crash may lose the latest acknowledgements, so a message can be sent
+    # twice, but never gets lost
+    def _move_cursor(self, position: SpoolPosition) -> None:
+        previous_segment = self._cursor.segment
+        self._cursor = position
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(file_descriptor, 'w') as temp_file:
+            json.dump(asdict(position), temp_file)
+        os.replace(temp_path, self.directory / CURSOR_FILE_NAME)
+
+        if position.segment > previous_segment:
+            for segment in self._list_segments():
+                if segment < position.segment:
+                    self._segment_path(segment).unlink(missing_ok=True)
+
+    def _load_cursor(self) -> SpoolPosition:
+        try:
+            return SpoolPosition(
+                **json.loads((self.directory / CURSOR_FILE_NAME).read_text())
+            )
+        except (FileNotFoundError, json.JSONDecodeError, TypeError):
+            segments = self._list_segments()
+            return SpoolPosition(segments[0] if segments else 0, 0)
+
+    def _count_records_after_cursor(self, segments: list[int]) -> int:
+        count = 0
+        for segment in segments:
+            if segment < self._cursor.segment:
+                continue
+            with open(self._segment_path(segment), 'rb') as file:
+                if segment == self._cursor.segment:
+                    file.seek(self._cursor.offset)
+                count += sum(1 for line in file if line.endswith(b'\n'))
+        return count
+
+    def _list_segments(self) -> list[int]:
+        return sorted(
+            int(path.stem)
+            for path in self.directory.glob(f'*{SEGMENT_SUFFIX}')
+            if path.stem.isdigit()
+        )
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.directory / f'{segment:012d}{SEGMENT_SUFFIX}'
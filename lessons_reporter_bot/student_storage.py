@@ -1,8 +1,18 @@
+from datetime import datetime
 from typing import List, Optional
 
-from sqlmodel import Session, desc, select
+from sqlmodel import delete, desc, or_, select
 
-from lessons_reporter_bot.models import Student
+from lessons_reporter_bot.database import unit_of_work
+from lessons_reporter_bot.models import (
+    ArchivedReport,
+    Attachment,
+    Payment,
+    Report,
+    Student,
+    StudentBalance,
+    StudentChart,
+)
 
 
 class StudentStorage:
@@ -10,44 +20,60 @@ class StudentStorage:
         self.engine = engine
 
     def count_students(self) -> int:
-        with Session(self.engine) as session:
-            return session.exec(select(Student)).count()
+        with unit_of_work(self.engine) as session:
+            return session.exec(
+                select(Student).where(Student.deleted_at == None)
+            ).count()
 
     def add_student(self, student_name: str) -> int:
         new_student = Student(name=student_name)
-        with Session(self.engine) as session:
+        with unit_of_work(self.engine) as session:
             session.add(new_student)
-            session.commit()
-            session.refresh(new_student)
         return new_student.student_id
 
     def add_parent_id_to_student(self, student_id: int, parent_id: int) -> None:
-        with Session(self.engine) as session:
-            student = session.exec(
-                select(Student).where(Student.student_id == student_id)
-            ).first()
-            if student:
+        with unit_of_work(self.engine) as session:
+            if student := session.get(Student, student_id):
                 student.parent_id = parent_id
-                session.commit()
 
-    def get_student_by_id(self, student_id: int) -> Optional[Student]:
-        with Session(self.engine) as session:
-            return session.exec(
-                select(Student).where(Student.student_id == student_id)
-            ).first()
+    # Deleted students are only looked up to render their old reports
+    def get_student_by_id(
+        self, student_id: int, include_deleted: bool = False
+    ) -> Optional[Student]:
+        with unit_of_work(self.engine) as session:
+            student = session.get(Student, student_id)
+            if student and (include_deleted or student.deleted_at is None):
+                return student
+            return None
 
     def get_parent_id(self, student_id: int) -> int:
-        with Session(self.engine) as session:
-            student = session.exec(
-                select(Student).where(Student.student_id == student_id)
-            ).first()
+        with unit_of_work(self.engine) as session:
+            student = session.get(Student, student_id)
             return student.parent_id if student else None
 
+    def list_parent_ids(self) -> list[int]:
+        with unit_of_work(self.engine) as session:
+            statement = (
+                select(Student.parent_id)
+                .where(Student.parent_id != None, Student.deleted_at == None)
+                .distinct()
+            )
+            return session.exec(statement).all()
+
+    def list_students_by_parent_id(self, parent_id: int) -> List[Student]:
+        with unit_of_work(self.engine) as session:
+            statement = (
+                select(Student)
+                .where(Student.parent_id == parent_id, Student.deleted_at == None)
+                .order_by(Student.name)
+            )
+            return session.exec(statement).all()
+
     def list_students(
         self, order_by: str | None = None, descending: bool = False
     ) -> List[Student]:
-        with Session(self.engine) as session:
-            statement = select(Student)
+        with unit_of_work(self.engine) as session:
+            statement = select(Student).where(Student.deleted_at == None)
             if order_by:
                 column = getattr(Student, order_by)
                 statement = (
@@ -58,21 +84,63 @@ class StudentStorage:
             return session.exec(statement).all()
 
     def update_student_name(self, student_id: int, student_name: str) -> None:
-        with Session(self.engine) as session:
-            student = session.exec(
-                select(Student).where(Student.student_id == student_id)
-            ).first()
-            if student:
+        with unit_of_work(self.engine) as session:
+            if student := session.get(Student, student_id):
                 student.name = student_name
-                session.commit()
 
+    # The student's reports, attachments, payments and balance go with it: hidden right
+    # away, removed by `DeletedDataPurger` later
     def delete_student(self, student_id: int) -> bool:
-        with Session(self.engine) as session:
-            student = session.exec(
-                select(Student).where(Student.student_id == student_id)
-            ).first()
-            if student:
-                session.delete(student)
-                session.commit()
+        with unit_of_work(self.engine) as session:
+            student = session.get(Student, student_id)
+            if student and student.deleted_at is None:
+                student.deleted_at = datetime.now()
                 return True
             return False
+
+    # Removes at most `batch_size` rows of students deleted before the given
+    # time, dependent rows first, and returns how many. Zero means done.
+    def purge_deleted_students(self, deleted_before: datetime, batch_size: int) -> int:
+        with unit_of_work(self.engine) as session:
+            student_ids = session.exec(
+                select(Student.student_id)
+                .where(Student.deleted_at < deleted_before)
+                .limit(batch_size)
+            ).all()
+            if not student_ids:
+                return 0
+
+            for model, id_column, condition in (
+                (
+                    Attachment,
+                    Attachment.attachment_id,
+                    or_(
+                        *(
+                            Attachment.report_id.in_(
+                                select(report_model.report_id).where(
+                                    report_model.student_id.in_(student_ids)
+                                )
+                            )
+                            for report_model in (Report, ArchivedReport)
+                        )
+                    ),
+                ),
+                (Report, Report.report_id, Report.student_id.in_(student_ids)),
+                (
+                    ArchivedReport,
+                    ArchivedReport.report_id,
+                    ArchivedReport.student_id.in_(student_ids),
+                ),
+                (Payment, Payment.payment_id, Payment.student_id.in_(student_ids)),
+            ):
+                row_ids = session.exec(
+                    select(id_column).where(condition).limit(batch_size)
+                ).all()
+                if row_ids:
+                    session.exec(delete(model).where(id_column.in_(row_ids)))
+                    return len(row_ids)
+
+            for model in (StudentBalance, StudentChart):
+                session.exec(delete(model).where(model.student_id.in_(student_ids)))
+            session.exec(delete(Student).where(Student.student_id.in_(student_ids)))
+            return len(student_ids)
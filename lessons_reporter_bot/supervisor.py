@@ -0,0 +1,128 @@
+import multiprocessing
+import time
+from contextlib import suppress
+from multiprocessing.queues import Queue
+from queue import Empty
+from typing import Any, Callable
+
+from telebot import apihelper
+from telebot.types import Update
+
+from lessons_reporter_bot.coalescing import coalesce_updates
+
+UpdateWorkerTarget = Callable[[Queue, int], None]
+WORKER_BATCH_SIZE = 100
+
+
+def get_update_chat_id(update: dict[str, Any]) -> int:
+    if callback_query := update.get('callback_query'):
+        return callback_query['from']['id']
+    for message_key in ('message', 'edited_message'):
+        if message := update.get(message_key):
+            return message['chat']['id']
+    return update['update_id']
+
+
+def get_worker_index(chat_id: int, workers: int) -> int:
+    return hash(chat_id) % workers
+
+
+class WorkerPool:
+    def __init__(
+        self, target: UpdateWorkerTarget, workers: int, queue_size: int = 1000
+    ) -> None:
+        self.target = target
+        self.workers = workers
+        self._context = multiprocessing.get_context('spawn')
+        self._queues = [self._context.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._processes: list[multiprocessing.Process | None] = [None] * workers
+
+    def start(self) -> None:
+        for index in range(self.workers):
+            self._start_worker(index)
+
+    def ensure_alive(self) -> None:
+        for index, process in enumerate(self._processes):
+            if process is None or not process.is_alive():
+                print(f'Worker {index} is not running, restarting it')
+                self._start_worker(index)
+
+    def dispatch(self, update: dict[str, Any]) -> None:
+        index = get_worker_index(get_update_chat_id(update), self.workers)
+        self._queues[index].put(update)
+
+    def stop(self) -> None:
+        for queue in self._queues:
+            queue.put(None)
+        for process in self._processes:
+            if process is not None:
+                process.join()
+
+    def _start_worker(self, index: int) -> None:
+        process = self._context.Process(
+            target=self.target, args=(self._queues[index], index), daemon=True
+        )
+        process.start()
+        self._processes[index] = process
+
+
+def run_update_worker(queue: Queue, index: int) -> None:
+    import threading
+
+    # Imported here so that only worker processes build the bot application
+    from lessons_reporter_bot import main
+
+    # A restarted worker takes over the spool of the one it replaces
+    main.app.process_name = f'worker-{index}'
+    main.start_bulk_sender(threading.Event())
+    telegram_bot = main.app.telegram_bot
+    main.register_handlers(telegram_bot)
+
+    is_running = True
+    while is_running:
+        # Everything already waiting is taken at once, so a burst of
+        # navigation taps from one chat is rendered only once
+        updates = [queue.get()]
+        with suppress(Empty):
+            while len(updates) < WORKER_BATCH_SIZE:
+                updates.append(queue.get_nowait())
+        if None in updates:
+            is_running = False
+            updates = updates[: updates.index(None)]
+
+        updates, dropped_updates = coalesce_updates(updates, get_update_chat_id)
+        for update in dropped_updates:
+            with suppress(Exception):
+                telegram_bot.answer_callback_query(update['callback_query']['id'])
+
+        for update in updates:
+            try:
+                telegram_bot.process_new_updates([Update.de_json(update)])
+            except Exception as e:
+                print(f'Failed to process update {update.get("update_id")}: {e!r}')
+
+
+def run_supervisor(
+    bot_token: str, workers: int, long_polling_timeout: int = 20
+) -> None:
+    pool = WorkerPool(target=run_update_worker, workers=workers)
+    pool.start()
+    offset = None
+
+    while True:
+        pool.ensure_alive()
+        try:
+            updates = apihelper.get_updates(
+                bot_token,
+                offset=offset,
+                timeout=long_polling_timeout,
+                long_polling_timeout=long_polling_timeout,
+            )
+        except Exception as e:
+            print(f'Failed to fetch updates: {e!r}')
+            time.sleep(1)
+            continue
+
+        for update in updates:
+            pool.dispatch(update)
+            offset = update['update_id'] + 1
@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from sqlmodel import select
+
+from lessons_reporter_bot.database import unit_of_work
+from lessons_reporter_bot.models import Teacher
+
+
+class TeacherStorage:
+    def __init__(self, engine) -> None:
+        self.engine = engine
+
+    def list_teacher_ids(self) -> list[int]:
+        with unit_of_work(self.engine) as session:
+            return session.exec(select(Teacher.user_id)).all()
+
+    def add_teacher(self, user_id: int) -> bool:
+        with unit_of_work(self.engine) as session:
+            if session.get(Teacher, user_id):
+                return False
+            session.add(Teacher(user_id=user_id, created_at=datetime.now()))
+            return True
+
+    def add_missing_teachers(self, user_ids: list[int]) -> int:
+        with unit_of_work(self.engine) as session:
+            existing_ids = set(
+                session.exec(
+                    select(Teacher.user_id).where(Teacher.user_id.in_(user_ids))
+                ).all()
+            )
+            missing_ids = set(user_ids) - existing_ids
+            session.add_all(
+                Teacher(user_id=user_id, created_at=datetime.now())
+                for user_id in missing_ids
+            )
+            return len(missing_ids)
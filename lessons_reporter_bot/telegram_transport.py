@@ -0,0 +1,238 @@
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator
+
+import requests
+from requests.adapters import HTTPAdapter
+from telebot import apihelper
+from telebot.apihelper import ApiException
+
+# Telegram answers these when it is overloaded or asks to slow down
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+DEFAULT_FILE_URL = 'https://api.telegram.org/file/bot{0}/{1}'
+FILE_CHUNK_BYTES = 64 * 1024
+
+
+# Failures that may go away on their own, unlike requests Telegram rejected
+def is_transient_error(error: Exception) -> bool:
+    if isinstance(error, requests.RequestException):
+        return True
+    if isinstance(error, ApiException):
+        return error.result.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def install_transport(
+    send: Callable[..., requests.Response],
+    connect_timeout: float,
+    read_timeout: float,
+    api_url: str | None = None,
+) -> None:
+    apihelper.CUSTOM_REQUEST_SENDER = send
+    apihelper.CONNECT_TIMEOUT = connect_timeout
+    apihelper.READ_TIMEOUT = read_timeout
+    if api_url:
+        # A local Bot API server serves both methods and files under its own URL
+        base_url = api_url.rstrip('/')
+        apihelper.API_URL = base_url + '/bot{0}/{1}'
+        apihelper.FILE_URL = base_url + '/file/bot{0}/{1}'
+
+
+# Yields the content of a file returned by getFile in chunks, so it's never
+# held in memory whole. A local Bot API server started with --local returns
+# the path of the file on its own disk instead.
+def stream_file(
+    transport: 'TelegramTransport | StubTelegramTransport', token: str, file_path: str
+) -> Iterator[bytes]:
+    if os.path.isabs(file_path):
+        with open(file_path, 'rb') as file:
+            while chunk := file.read(FILE_CHUNK_BYTES):
+                yield chunk
+    else:
+        yield from transport.stream(
+            (apihelper.FILE_URL or DEFAULT_FILE_URL).format(token, file_path)
+        )
+
+
+# Plugged into telebot as `apihelper.CUSTOM_REQUEST_SENDER`, so every API call
+# of the bot and of the supervisor reuses one keep-alive connection pool.
+class TelegramTransport:
+    def __init__(
+        self,
+        pool_size: int,
+        max_retries: int,
+        backoff_seconds: float,
+        max_backoff_seconds: float,
+        sleep: Callable[[float], None] = time.sleep,
+        jitter: Callable[[float, float], float] = random.uniform,
+    ) -> None:
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.sleep = sleep
+        self.jitter = jitter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, pool_block=True
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    # Only failures that happen before Telegram could act on the request are
+    # retried, a read timeout might mean the message was already sent
+    def __call__(
+        self,
+        method: str,
+        url: str,
+        params: dict | None = None,
+        files: dict | None = None,
+        timeout: tuple[float, float] | None = None,
+        proxies: dict | None = None,
+    ) -> requests.Response:
+        # Uploaded files are consumed by the first attempt
+        attempts = 1 if files else self.max_retries + 1
+        for attempt in range(attempts):
+            is_last_attempt = attempt == attempts - 1
+            try:
+                response = self.session.request(
+                    method,
+                    url,
+                    params=params,
+                    files=files,
+                    timeout=timeout,
+                    proxies=proxies,
+                )
+            except requests.ConnectionError:
+                if is_last_attempt:
+                    raise
+                self.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code not in RETRYABLE_STATUS_CODES or is_last_attempt:
+                return response
+            self.sleep(self._retry_after(response) or self._backoff(attempt))
+
+    def stream(self, url: str) -> Iterator[bytes]:
+        with self.session.get(
+            url,
+            stream=True,
+            timeout=(apihelper.CONNECT_TIMEOUT, apihelper.READ_TIMEOUT),
+        ) as response:
+            response.raise_for_status()
+            yield from response.iter_content(FILE_CHUNK_BYTES)
+
+    def _backoff(self, attempt: int) -> float:
+        return self.jitter(
+            0, min(self.max_backoff_seconds, self.backoff_seconds * 2**attempt)
+        )
+
+    def _retry_after(self, response: requests.Response) -> float | None:
+        try:
+            retry_after = response.json()['parameters']['retry_after']
+        except (ValueError, KeyError, TypeError):
+            return None
+        return min(float(retry_after), self.max_backoff_seconds)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+@dataclass(slots=True)
+class TelegramCall:
+    method_name: str
+    params: dict
+
+
+# Answers API calls locally and records them, so tests and replays can run
+# the bot without network access and assert how many round trips were made
+@dataclass
+class StubTelegramTransport:
+    results: dict[str, Any | Callable[[dict], Any]] = field(default_factory=dict)
+    calls: list[TelegramCall] = field(default_factory=list)
+    # Content served for getFile, by file id
+    files: dict[str, bytes] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self._message_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def __call__(
+        self,
+        method: str,
+        url: str,
+        params: dict | None = None,
+        files: dict | None = None,
+        timeout: tuple[float, float] | None = None,
+        proxies: dict | None = None,
+    ) -> requests.Response:
+        method_name = url.rsplit('/', 1)[-1]
+        params = dict(params or {})
+        if files:
+            params.update({name: f'upload:{name}' for name in files})
+        with self._lock:
+            self.calls.append(TelegramCall(method_name=method_name, params=params))
+            if method_name not in self.results:
+                result = self._default_result(method_name, params)
+            elif callable(result := self.results[method_name]):
+                result = result(params)
+
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({'ok': True, 'result': result}).encode()
+        return response
+
+    def stream(self, url: str) -> Iterator[bytes]:
+        content = self.files[url.rsplit('/', 1)[-1]]
+        for offset in range(0, len(content), FILE_CHUNK_BYTES):
+            yield content[offset : offset + FILE_CHUNK_BYTES]
+
+    def count(self, method_name: str | None = None) -> int:
+        return sum(
+            1
+            for call in self.calls
+            if method_name is None or call.method_name == method_name
+        )
+
+    def _default_result(self, method_name: str, params: dict) -> Any:
+        if method_name in ('sendMessage', 'editMessageText'):
+            return {
+                'message_id': params.get('message_id') or next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'},
+                'text': params.get('text'),
+            }
+        if method_name in ('sendPhoto', 'sendDocument'):
+            message_id = next(self._message_ids)
+            file = {
+                'file_id': params.get('photo') or params.get('document'),
+                'file_unique_id': str(message_id),
+            }
+            return {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'},
+                **(
+                    {'photo': [{**file, 'width': 1, 'height': 1}]}
+                    if method_name == 'sendPhoto'
+                    else {'document': file}
+                ),
+            }
+        if method_name == 'getFile':
+            file_id = params['file_id']
+            return {
+                'file_id': file_id,
+                'file_unique_id': file_id,
+                'file_size': len(self.files.get(file_id, b'')),
+                'file_path': f'files/{file_id}',
+            }
+        if method_name == 'getUpdates':
+            return []
+        if method_name == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'Stub', 'username': 'stub'}
+        return True
@@ -0,0 +1,100 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import Enum
+from typing import Iterator
+
+from sqlalchemy import event, false
+from sqlalchemy.orm import ORMExecuteState, with_loader_criteria
+from sqlmodel import Session, update
+
+from lessons_reporter_bot.models import (
+    ArchivedReport,
+    Attachment,
+    Report,
+    Student,
+    TenantModel,
+    Topic,
+)
+
+TENANT_MODELS = (Student, Topic, Report, ArchivedReport, Attachment)
+
+
+class TenantScope(Enum):
+    # Updates from users who aren't teachers see no tenant's rows
+    DENY_ALL = 'deny_all'
+
+
+class TenantScopeError(Exception):
+    pass
+
+
+_current_teacher_id: ContextVar[int | TenantScope | None] = ContextVar(
+    'current_teacher_id', default=None
+)
+
+
+def get_current_teacher_id() -> int | TenantScope | None:
+    return _current_teacher_id.get()
+
+
+# Handlers run in the scope of the teacher who sent the update. Only system
+# jobs and the read-only parent screens run without a scope and see every
+# tenant.
+@contextmanager
+def tenant_scope(teacher_id: int | TenantScope | None) -> Iterator[None]:
+    token = _current_teacher_id.set(teacher_id)
+    try:
+        yield
+    finally:
+        _current_teacher_id.reset(token)
+
+
+class TenantSession(Session):
+    pass
+
+
+@event.listens_for(TenantSession, 'do_orm_execute')
+def add_tenant_criteria(orm_execute_state: ORMExecuteState) -> None:
+    if (teacher_id := _current_teacher_id.get()) is None:
+        return
+    if orm_execute_state.is_column_load or orm_execute_state.is_relationship_load:
+        return
+    if (
+        orm_execute_state.is_select
+        or orm_execute_state.is_update
+        or orm_execute_state.is_delete
+    ):
+        criteria = (
+            false()
+            if teacher_id is TenantScope.DENY_ALL
+            else lambda cls: cls.teacher_id == teacher_id
+        )
+        orm_execute_state.statement = orm_execute_state.statement.options(
+            *(
+                with_loader_criteria(model, criteria, include_aliases=True)
+                for model in TENANT_MODELS
+            )
+        )
+
+
+@event.listens_for(TenantSession, 'before_flush')
+def set_tenant_on_new_rows(session: Session, flush_context, instances) -> None:
+    if (teacher_id := _current_teacher_id.get()) is None:
+        return
+    for instance in session.new:
+        if not isinstance(instance, TenantModel):
+            continue
+        if teacher_id is TenantScope.DENY_ALL:
+            raise TenantScopeError(
+                f'{type(instance).__name__} created outside of a teacher scope'
+            )
+        if instance.teacher_id is None:
+            instance.teacher_id = teacher_id
+
+
+# Rows created before tenants existed are given to one teacher
+def claim_unowned_rows(session: Session, teacher_id: int) -> None:
+    for model in TENANT_MODELS:
+        session.exec(
+            update(model).where(model.teacher_id == None).values(teacher_id=teacher_id)
+        )
@@ -1,8 +1,10 @@
+from datetime import datetime
 from typing import List, Optional
 
-from sqlmodel import Session, desc, select
+from sqlmodel import delete, desc, exists, select
 
-from lessons_reporter_bot.models import Topic
+from lessons_reporter_bot.database import unit_of_work
+from lessons_reporter_bot.models import ArchivedReport, Report, Topic
 from lessons_reporter_bot.settings import TopicId
 
 
@@ -11,22 +13,20 @@ class TopicStorage:
         self.engine = engine
 
     def count_topics(self) -> int:
-        with Session(self.engine) as session:
-            return session.exec(select(Topic)).count()
+        with unit_of_work(self.engine) as session:
+            return session.exec(select(Topic).where(Topic.deleted_at == None)).count()
 
     def add_topic(self, topic: str) -> int:
         new_topic = Topic(topic=topic)
-        with Session(self.engine) as session:
+        with unit_of_work(self.engine) as session:
             session.add(new_topic)
-            session.commit()
-            session.refresh(new_topic)
         return new_topic.topic_id
 
     def list_topics(
         self, order_by: str | None = None, descending: bool = False
     ) -> List[Topic]:
-        with Session(self.engine) as session:
-            statement = select(Topic)
+        with unit_of_work(self.engine) as session:
+            statement = select(Topic).where(Topic.deleted_at == None)
             if order_by:
                 column = getattr(Topic, order_by)
                 statement = (
@@ -36,17 +36,37 @@ class TopicStorage:
                 )
             return session.exec(statement).all()
 
-    def get_topic_by_id(self, topic_id: TopicId) -> Optional[Topic]:
-        with Session(self.engine) as session:
-            return session.exec(select(Topic).where(Topic.topic_id == topic_id)).first()
+    # Deleted topics are only looked up to render the reports that use them
+    def get_topic_by_id(
+        self, topic_id: TopicId, include_deleted: bool = False
+    ) -> Optional[Topic]:
+        with unit_of_work(self.engine) as session:
+            topic = session.get(Topic, topic_id)
+            if topic and (include_deleted or topic.deleted_at is None):
+                return topic
+            return None
 
     def delete_topic(self, topic_id: TopicId) -> bool:
-        with Session(self.engine) as session:
-            topic = session.exec(
-                select(Topic).where(Topic.topic_id == topic_id)
-            ).first()
-            if topic:
-                session.delete(topic)
-                session.commit()
+        with unit_of_work(self.engine) as session:
+            topic = session.get(Topic, topic_id)
+            if topic and topic.deleted_at is None:
+                topic.deleted_at = datetime.now()
                 return True
             return False
+
+    # Removes at most `batch_size` topics deleted before the given time that
+    # no report refers to anymore, and returns how many
+    def purge_deleted_topics(self, deleted_before: datetime, batch_size: int) -> int:
+        with unit_of_work(self.engine) as session:
+            topic_ids = session.exec(
+                select(Topic.topic_id)
+                .where(
+                    Topic.deleted_at < deleted_before,
+                    ~exists().where(Report.topic_id == Topic.topic_id),
+                    ~exists().where(ArchivedReport.topic_id == Topic.topic_id),
+                )
+                .limit(batch_size)
+            ).all()
+            if topic_ids:
+                session.exec(delete(Topic).where(Topic.topic_id.in_(topic_ids)))
+            return len(topic_ids)
@@ -2,6 +2,7 @@ from dataclasses import dataclass
 
 from lessons_reporter_bot.callback_data import (
     ReportBuilderShowItemListCallbackData,
+    ShowDebtorsCallbackData,
     ShowItemsListCallbackData,
 )
 from lessons_reporter_bot.models import FormattedPaginationItem
@@ -18,7 +19,11 @@ class PaginationResult:
 
 def paginate(
     items: list[FormattedPaginationItem],
-    data: ShowItemsListCallbackData | ReportBuilderShowItemListCallbackData,
+    data: (
+        ShowItemsListCallbackData
+        | ReportBuilderShowItemListCallbackData
+        | ShowDebtorsCallbackData
+    ),
     page_size: int,
 ) -> PaginationResult:
     start = (data.page - 1) * page_size
@@ -0,0 +1,104 @@
+import os
+import tempfile
+import types
+import unittest
+
+from lessons_reporter_bot import main as bot_main
+from lessons_reporter_bot.app import Application
+from lessons_reporter_bot.callback_data import (
+    AnyCallbackData,
+    ReportBuilder1CallbackData,
+    ReportBuilder1SetValueFromButtonCallbackData,
+    ReportBuilder5SetHomeworkStatusCallbackData,
+    ReportBuilder6SetIsProactiveCallbackData,
+    ReportBuilder7SetIsPaidCallbackData,
+    ReportBuilderChooseItemListCallbackData,
+)
+from lessons_reporter_bot.models import Student, Topic
+from lessons_reporter_bot.settings import Settings
+from lessons_reporter_bot.telegram_transport import (
+    StubTelegramTransport,
+    install_transport,
+)
+
+TEACHER_ID = 100
+
+
+# Runs the bot's handlers against a fresh SQLite database and a stubbed
+# Telegram
+class BotTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.app = Application(
+            Settings(
+                bot_token='0:test',
+                superusers=[TEACHER_ID],
+                database_url=f'sqlite:///{directory.name}/bot.sqlite3',
+                spool_dir=os.path.join(directory.name, 'spool'),
+                attachment_dir=os.path.join(directory.name, 'attachments'),
+                chart_dir=os.path.join(directory.name, 'charts'),
+                backup_dir=os.path.join(directory.name, 'backups'),
+                shared_state_dir=None,
+                update_log_dir=None,
+            )
+        )
+        self.stub = StubTelegramTransport()
+        self.app.telegram_transport = self.stub
+        install_transport(self.stub, connect_timeout=1, read_timeout=1)
+        self.app.prepare_database()
+
+        previous_app = bot_main.app
+        bot_main.app = self.app
+        bot_main.get_bulk_sender.cache_clear()
+        self.addCleanup(setattr, bot_main, 'app', previous_app)
+        self.addCleanup(bot_main.get_bulk_sender.cache_clear)
+        self.addCleanup(self.app.engine.dispose)
+        self._callback_ids = iter(range(1, 1_000_000))
+
+    def add_student(
+        self, name: str, parent_id: int | None, teacher_id: int = TEACHER_ID
+    ) -> tuple[int, int]:
+        with self.app.unit_of_work(teacher_id) as session:
+            topic = Topic(topic='Алгебра')
+            student = Student(name=name, parent_id=parent_id)
+            session.add_all([topic, student])
+            session.flush()
+            return topic.topic_id, student.student_id
+
+    def press(
+        self,
+        data: AnyCallbackData,
+        user_id: int = TEACHER_ID,
+        message_id: int | None = None,
+    ) -> None:
+        callback_id = next(self._callback_ids)
+        bot_main.catchall_callback_handler(
+            types.SimpleNamespace(
+                id=str(callback_id),
+                data=data.model_dump_json(),
+                from_user=types.SimpleNamespace(id=user_id),
+                message=types.SimpleNamespace(message_id=message_id or callback_id),
+            )
+        )
+
+    # Fills in every step of a new report up to the preview
+    def fill_report(self, topic_id: int, student_id: int) -> None:
+        for data in (
+            ReportBuilder1CallbackData(),
+            ReportBuilder1SetValueFromButtonCallbackData(lesson_day='today'),
+            ReportBuilderChooseItemListCallbackData(i_t='T', i_id=topic_id),
+            ReportBuilderChooseItemListCallbackData(i_t='S', i_id=student_id),
+            ReportBuilder5SetHomeworkStatusCallbackData(homework_status=2),
+            ReportBuilder6SetIsProactiveCallbackData(is_active=1),
+            ReportBuilder7SetIsPaidCallbackData(payment_status=0),
+        ):
+            self.press(data)
+
+    def sent_texts(self, chat_id: int) -> list[str]:
+        return [
+            call.params['text']
+            for call in self.stub.calls
+            if call.method_name == 'sendMessage'
+            and str(call.params.get('chat_id')) == str(chat_id)
+        ]
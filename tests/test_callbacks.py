@@ -0,0 +1,46 @@
+import unittest
+
+from sqlmodel import func, select
+
+from lessons_reporter_bot.callback_data import (
+    GoBackToAdminPanelCallbackData,
+    SaveConfirmedReportCallbackData,
+)
+from lessons_reporter_bot.models import ProcessedCallback, Report
+from tests.helpers import TEACHER_ID, BotTestCase
+
+PARENT_ID = 555
+
+
+class CallbackDeduplicationTest(BotTestCase):
+    def test_double_tap_on_save_sends_one_report(self) -> None:
+        topic_id, student_id = self.add_student('Иванова Мария', PARENT_ID)
+        self.fill_report(topic_id, student_id)
+
+        save = SaveConfirmedReportCallbackData(parent_id=PARENT_ID)
+        self.press(save, message_id=42)
+        self.press(save, message_id=42)
+
+        with self.app.unit_of_work(TEACHER_ID) as session:
+            self.assertEqual(
+                session.exec(select(func.count(Report.report_id))).one(), 1
+            )
+        self.assertEqual(len(self.sent_texts(PARENT_ID)), 1)
+        self.assertTrue(
+            self.sent_texts(TEACHER_ID)[-1].startswith('Отчёт успешно отправлен')
+        )
+
+    def test_navigation_is_handled_on_every_tap_and_not_stored(self) -> None:
+        for _ in range(3):
+            self.press(GoBackToAdminPanelCallbackData(), message_id=7)
+
+        self.assertEqual(len(self.sent_texts(TEACHER_ID)), 3)
+        with self.app.unit_of_work() as session:
+            self.assertEqual(
+                session.exec(select(func.count()).select_from(ProcessedCallback)).one(),
+                0,
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
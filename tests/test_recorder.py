@@ -0,0 +1,60 @@
+import gzip
+import tempfile
+import unittest
+
+from lessons_reporter_bot.recorder import UpdateRecorder, read_update_log
+
+STUDENT_NAME = 'Иванова Мария'
+
+
+def build_text_update(update_id: int, text: str) -> dict:
+    user = {'id': 100, 'is_bot': False, 'first_name': 'Анна', 'username': 'anna'}
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': 100, 'type': 'private', 'first_name': 'Анна'},
+            'from': user,
+            'text': text,
+        },
+    }
+
+
+class UpdateRecorderTest(unittest.TestCase):
+    def record(self, updates: list[dict]) -> tuple[str, list[dict]]:
+        with tempfile.TemporaryDirectory() as directory:
+            recorder = UpdateRecorder(directory, name='test', clock=lambda: 0)
+            recorder.record_updates(updates)
+            recorder.close()
+            with gzip.open(recorder.path, 'rt', encoding='utf-8') as file:
+                raw = file.read()
+            recorded = [update for _, update in read_update_log(recorder.path)]
+        return raw, recorded
+
+    def test_typed_student_name_is_not_recorded(self) -> None:
+        raw, [recorded] = self.record([build_text_update(1, STUDENT_NAME)])
+
+        for word in STUDENT_NAME.split():
+            self.assertNotIn(word, raw)
+        self.assertNotIn('Анна', raw)
+        self.assertEqual(len(recorded['message']['text']), len(STUDENT_NAME))
+        self.assertEqual(recorded['message']['chat']['id'], 100)
+
+    def test_commands_ids_and_dates_still_parse(self) -> None:
+        _, recorded = self.record(
+            [
+                build_text_update(1, '/start'),
+                build_text_update(2, '123456789'),
+                build_text_update(3, '01-09-2024'),
+            ]
+        )
+
+        self.assertEqual(
+            [update['message']['text'] for update in recorded],
+            ['/start', '123456789', '01-09-2024'],
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+import requests
+
+from lessons_reporter_bot import main as bot_main
+from lessons_reporter_bot.models import (
+    AttachmentData,
+    AttachmentKind,
+    BotServiceMessage,
+)
+from tests.helpers import TEACHER_ID, BotTestCase
+
+PARENT_ID = 555
+
+
+class PartialSendTest(BotTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        with self.app.unit_of_work(TEACHER_ID):
+            (attachment_id,) = self.app.attachment_storage.add_attachments(
+                report_id=1,
+                attachments=[
+                    AttachmentData(
+                        kind=AttachmentKind.PHOTO,
+                        sha256='0' * 64,
+                        size_bytes=3,
+                        telegram_file_id='photo-1',
+                    )
+                ],
+            )
+        self.message = BotServiceMessage(text='Отчёт', attachment_ids=[attachment_id])
+
+    def fail_once(self, method_name: str) -> None:
+        def fail(params: dict) -> None:
+            del self.stub.results[method_name]
+            raise requests.ConnectionError('Telegram is unreachable')
+
+        self.stub.results[method_name] = fail
+
+    def test_file_failing_after_the_text_is_spooled_alone(self) -> None:
+        self.fail_once('sendPhoto')
+
+        self.assertIsNotNone(bot_main.send_or_spool(PARENT_ID, self.message))
+        self.assertEqual(bot_main.get_bulk_sender().drain(), 1)
+
+        self.assertEqual(self.sent_texts(PARENT_ID), ['Отчёт'])
+        self.assertEqual(self.stub.count('sendPhoto'), 2)
+
+    def test_spool_retries_only_the_file_that_failed(self) -> None:
+        bulk_sender = bot_main.get_bulk_sender()
+        bulk_sender.enqueue(PARENT_ID, self.message)
+        self.fail_once('sendPhoto')
+
+        self.assertEqual(bulk_sender.drain(), 0)
+        self.assertEqual(bulk_sender.drain(), 1)
+
+        self.assertEqual(self.sent_texts(PARENT_ID), ['Отчёт'])
+        self.assertEqual(self.stub.count('sendPhoto'), 2)
+        self.assertEqual(bulk_sender.pending_count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
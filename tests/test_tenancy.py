@@ -0,0 +1,64 @@
+import unittest
+
+from lessons_reporter_bot.callback_data import (
+    DeleteConfirmedItemCallbackData,
+    ShowParentReportsCallbackData,
+)
+from lessons_reporter_bot.models import Student
+from tests.helpers import TEACHER_ID, BotTestCase
+
+PARENT_ID = 555
+OTHER_TEACHER_ID = 200
+
+
+class TenancyTest(BotTestCase):
+    def test_parent_cannot_delete_a_student(self) -> None:
+        _, student_id = self.add_student('Иванова Мария', PARENT_ID)
+
+        self.press(
+            DeleteConfirmedItemCallbackData(i_t='S', page=0, i_id=student_id),
+            user_id=PARENT_ID,
+        )
+
+        with self.app.unit_of_work() as session:
+            self.assertIsNone(session.get(Student, student_id).deleted_at)
+        self.assertEqual(
+            [
+                call
+                for call in self.stub.calls
+                if str(call.params.get('chat_id')) == str(PARENT_ID)
+            ],
+            [],
+        )
+
+    def test_parent_still_sees_own_child_reports(self) -> None:
+        _, student_id = self.add_student('Иванова Мария', PARENT_ID)
+
+        self.press(
+            ShowParentReportsCallbackData(student_id=student_id, page=0),
+            user_id=PARENT_ID,
+        )
+
+        self.assertEqual(
+            [
+                call.method_name
+                for call in self.stub.calls
+                if str(call.params.get('chat_id')) == str(PARENT_ID)
+            ],
+            ['editMessageText'],
+        )
+
+    def test_teacher_cannot_pay_for_another_teachers_student(self) -> None:
+        _, student_id = self.add_student('Иванова Мария', PARENT_ID)
+        self.app.teacher_storage.add_teacher(OTHER_TEACHER_ID)
+        self.app.authorization_service.invalidate()
+
+        with self.app.unit_of_work(OTHER_TEACHER_ID):
+            self.assertIsNone(self.app.payment_storage.add_payment(student_id, 4))
+            self.assertIsNone(self.app.payment_storage.get_balance(student_id))
+        with self.app.unit_of_work(TEACHER_ID):
+            self.assertIsNone(self.app.payment_storage.get_balance(student_id))
+
+
+if __name__ == '__main__':
+    unittest.main()